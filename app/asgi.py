@@ -0,0 +1,113 @@
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import text
+from fastapi.security import OAuth2PasswordBearer
+from app.environments.routes.views import router as environments_router
+from app.users.routers.views import router as users_router
+from app.core.settings import init_db, engine, async_engine, settings
+from app.core.dependencies import principal_cache
+from app.core.instrumentation import InstrumentationMiddleware, instrument_engine
+from app.core.limits import AdmissionMiddleware, rate_limiter
+from app.core.metrics import MetricsMiddleware, registry, register_cache_metrics, register_pool_metrics
+from app.environments.repository import environment_ids
+from app.environments.revisions import render_cache
+from app.environments.watch import change_hub
+from app.variables.encryption import data_keys, encryption_enabled, master_key
+from app.variables.routers.views import router as variables_router
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if encryption_enabled():
+        # Una clave maestra mal formada falla al arrancar, no en la primera variable sensible
+        master_key()
+    init_db()
+    await change_hub.start()
+    yield
+    await change_hub.stop()
+    print("App shutting down...")
+
+app = FastAPI(
+    title="Config Service API",
+    description="A configuration management service API for managing environments and variables",
+    version="1.0.0",
+    swagger_ui_parameters={"syntaxHighlight": False},
+    lifespan=lifespan,
+    # orjson para todas las respuestas JSON
+    default_response_class=ORJSONResponse,
+)
+
+security = OAuth2PasswordBearer(tokenUrl="users/auth/login")
+
+# Metrics por fuera para que cuente tambien los 429 de la admision; la instrumentacion
+# por dentro, donde solo llegan las peticiones admitidas
+app.add_middleware(InstrumentationMiddleware)
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(MetricsMiddleware)
+register_pool_metrics({"sync": engine, "async": async_engine})
+for _engine in (engine, async_engine.sync_engine):
+    instrument_engine(_engine)
+register_cache_metrics({
+    "principals": principal_cache, "renders": render_cache, "environment_ids": environment_ids,
+    "rate_limit_buckets": rate_limiter.buckets, "data_keys": data_keys,
+})
+
+@app.get("/status/", tags=["Health"], summary="Health Check",
+         description="Simple health check endpoint that responds with 'pong'")
+def status():
+    return {"message": "pong"}
+
+@app.get("/health/live", tags=["Health"], summary="Liveness Probe",
+         description="The process is up and serving requests; does not touch the database")
+async def liveness():
+    return {"status": "alive"}
+
+def pool_saturation(pool, max_overflow: int) -> float:
+    """Checked out connections over the capacity of a pool created with `max_overflow`."""
+    capacity = pool.size() + max(max_overflow, 0)
+    return pool.checkedout() / capacity if capacity else 0.0
+
+@app.get("/health/ready", tags=["Health"], summary="Readiness Probe",
+         description="503 when the database is unreachable within READINESS_TIMEOUT "
+                     "or the connection pool is saturated")
+async def readiness():
+    # Solo el pool de PostgreSQL sale de DB_POOL_SIZE / DB_MAX_OVERFLOW; los demas no tienen limite configurado
+    saturation = 0.0
+    if async_engine.dialect.name == "postgresql":
+        saturation = round(pool_saturation(async_engine.pool, settings.DB_MAX_OVERFLOW), 3)
+    body = {"status": "ready", "database": "ok", "pool_saturation": saturation}
+    # Con el pool saturado no se intenta el ping: esperaria un checkout
+    if saturation >= settings.READINESS_MAX_POOL_SATURATION:
+        body.update(status="unavailable", database="skipped")
+        return ORJSONResponse(body, status_code=503)
+    try:
+        async def ping():
+            async with async_engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+        await asyncio.wait_for(ping(), settings.READINESS_TIMEOUT)
+    except Exception as e:
+        body.update(status="unavailable", database=f"error: {e.__class__.__name__}")
+        return ORJSONResponse(body, status_code=503)
+    return body
+
+@app.get("/status/caches", tags=["Health"], summary="Cache Stats",
+         description="Size and hit ratio of the in-process caches")
+def cache_stats():
+    return {
+        "principals": principal_cache.stats(),
+        "renders": render_cache.stats(),
+        "environment_ids": environment_ids.stats(),
+        "data_keys": data_keys.stats(),
+    }
+
+@app.get("/metrics", tags=["Health"], summary="Prometheus Metrics",
+         description="Request, latency, connection pool and cache metrics in Prometheus text format")
+def metrics():
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+app.include_router(environments_router, prefix="/environments", tags=["Environments"])
+app.include_router(variables_router, prefix="/environments/{env_name}/variables", tags=["Variables"])
+app.include_router(users_router, prefix="/users", tags=["Users"])
@@ -0,0 +1,96 @@
+"""Command line client for bulk operations against a running config service.
+
+    python -m app.cli --url http://localhost:8000 --username admin --password secret export -o backup.ndjson
+    python -m app.cli --url http://localhost:8000 --token "$TOKEN" import backup.ndjson
+
+Both directions stream: memory use does not depend on the size of the dump.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+BLOCK_SIZE = 64 * 1024
+
+
+def login(url: str, username: str, password: str) -> str:
+    request = Request(
+        f"{url}/users/auth/login",
+        data=json.dumps({"username": username, "password": password}).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urlopen(request) as response:
+        return json.load(response)["access_token"]
+
+
+def export(url: str, token: str, output, environments: list[str]):
+    query = urlencode([("name", name) for name in environments])
+    request = Request(f"{url}/environments/export" + (f"?{query}" if query else ""),
+                      headers={"Authorization": f"Bearer {token}"})
+    with urlopen(request) as response:
+        shutil.copyfileobj(response, output, BLOCK_SIZE)
+
+
+def import_(url: str, token: str, source) -> dict:
+    # Sin Content-Length urllib envia el fichero con Transfer-Encoding: chunked
+    request = Request(f"{url}/environments/import", data=source, method="POST", headers={
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/x-ndjson",
+    })
+    with urlopen(request) as response:
+        return json.load(response)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export and import environments as NDJSON.")
+    parser.add_argument("--url", default=os.environ.get("CONFIG_SERVICE_URL", "http://localhost:8000"))
+    parser.add_argument("--token", default=os.environ.get("CONFIG_SERVICE_TOKEN"),
+                        help="Bearer token; otherwise --username / --password are used to log in")
+    parser.add_argument("--username", default=os.environ.get("CONFIG_SERVICE_USERNAME"))
+    parser.add_argument("--password", default=os.environ.get("CONFIG_SERVICE_PASSWORD"))
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Write every environment and its variables as NDJSON")
+    export_parser.add_argument("-o", "--output", default="-", help="Output file (default: stdout)")
+    export_parser.add_argument("-e", "--environment", action="append", default=[],
+                               help="Only export this environment (repeatable)")
+
+    import_parser = commands.add_parser("import", help="Create or update environments from an NDJSON dump")
+    import_parser.add_argument("input", nargs="?", default="-", help="Input file (default: stdin)")
+
+    args = parser.parse_args(argv)
+    url = args.url.rstrip("/")
+    try:
+        token = args.token
+        if not token:
+            if not (args.username and args.password):
+                parser.error("either --token or --username and --password are required")
+            token = login(url, args.username, args.password)
+
+        if args.command == "export":
+            if args.output == "-":
+                export(url, token, sys.stdout.buffer, args.environment)
+            else:
+                with open(args.output, "wb") as output:
+                    export(url, token, output, args.environment)
+        else:
+            if args.input == "-":
+                summary = import_(url, token, sys.stdin.buffer)
+            else:
+                with open(args.input, "rb") as source:
+                    summary = import_(url, token, source)
+            print(json.dumps(summary), file=sys.stderr)
+    except HTTPError as e:
+        print(f"{e.code} {e.reason}: {e.read().decode(errors='replace')}", file=sys.stderr)
+        sys.exit(1)
+    except URLError as e:
+        print(f"Cannot reach {url}: {e.reason}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
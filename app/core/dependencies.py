@@ -1,7 +1,11 @@
-from fastapi import Depends, HTTPException, status
+import time
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlmodel import Session, select
-from app.core.settings import engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.cache import TTLCache
+from app.core.limits import enforce_rate_limit
+from app.core.settings import engine, async_engine, settings
 from app.core.jwt import verify_token
 from app.users.models.user import User
 from app.users.models.auth import TokenData
@@ -9,18 +13,29 @@ from app.users.models.auth import TokenData
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/auth/login")
 
+# Usuarios ya resueltos, por `sub` del token; nunca viven más allá del `exp`
+principal_cache = TTLCache(maxsize=settings.PRINCIPAL_CACHE_SIZE, ttl=settings.PRINCIPAL_CACHE_TTL)
+
+def invalidate_principal(username: str):
+    principal_cache.invalidate(username)
+
 def get_session():
     with Session(engine) as session:
         yield session
 
-#Obtener usuario actual
-def get_current_user(token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)):
+async def get_async_session():
+    # expire_on_commit=False evita lazy loads (no permitidos en async) tras el commit
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+async def authenticate(token: str, session: AsyncSession) -> User:
+    """User behind a bearer token, from the principal cache or the database; 401 otherwise."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
     try:
         payload = verify_token(token)
         username: str = payload.get("sub")
@@ -29,13 +44,30 @@ def get_current_user(token: str = Depends(oauth2_scheme), session: Session = Dep
         token_data = TokenData(username=username)
     except Exception:
         raise credentials_exception
-    
+
+    user = principal_cache.get(token_data.username)
+    if user is not None:
+        return user
+
     statement = select(User).where(User.username == token_data.username)
-    user = session.exec(statement).first()
+    user = (await session.exec(statement)).first()
     if user is None:
         raise credentials_exception
+    principal_cache.set(token_data.username, user, ttl=payload.get("exp", 0) - time.time())
     return user
 
+#Obtener usuario actual
+async def get_current_user(token: str = Depends(oauth2_scheme), session: AsyncSession = Depends(get_async_session)):
+    return await authenticate(token, session)
+
 #Obtener usuario activo
-def get_current_active_user(current_user: User = Depends(get_current_user)):
-    return current_user
\ No newline at end of file
+async def get_current_active_user(request: Request, current_user: User = Depends(get_current_user)):
+    # Un cubo de lecturas y otro de escrituras por usuario; 429 con Retry-After al agotarse
+    enforce_rate_limit(current_user.username, request.method)
+    return current_user
+
+#Obtener usuario administrador
+async def get_current_admin_user(current_user: User = Depends(get_current_active_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    return current_user
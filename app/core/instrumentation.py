@@ -0,0 +1,296 @@
+"""Per-request SQL instrumentation, slow query log and on-demand profiling.
+
+Every statement run by the instrumented engines adds to the counters of the
+request that issued it, reported in the response headers:
+
+    Server-Timing: db;dur=3.10;desc="4 queries", app;dur=11.52
+    X-DB-Queries: 4
+
+The headers go out with the first response byte, so statements issued while a
+streamed body (export, watch events) is being sent are not included. Statements
+slower than SLOW_QUERY_THRESHOLD_MS are logged with the route, never with their
+parameters.
+
+An admin can add `?profile=1` to a request to get its sampled call tree
+instead of the response; PROFILE_SAMPLE_RATE decides which of those requests
+are profiled.
+"""
+import asyncio
+import logging
+import random
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Optional
+from urllib.parse import parse_qs
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.datastructures import Headers
+from app.core.dependencies import authenticate
+from app.core.settings import async_engine, settings
+
+logger = logging.getLogger(__name__)
+
+# Intervalo de cambio de hilo del proceso, el que se restaura al acabar cada perfil
+SWITCH_INTERVAL = sys.getswitchinterval()
+
+
+class QueryStats:
+    """Statements run on behalf of one request."""
+
+    __slots__ = ("scope", "count", "seconds")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.count = 0
+        self.seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        # El router rellena scope["route"] en el mismo dict que ve el middleware
+        return f"{self.scope['method']} {getattr(self.scope.get('route'), 'path', self.scope['path'])}"
+
+
+# Mutable y compartido: los hilos del threadpool y los greenlets del engine async ven el mismo objeto
+request_queries: ContextVar[Optional[QueryStats]] = ContextVar("request_queries", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = request_queries.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+    if settings.SLOW_QUERY_THRESHOLD_MS and elapsed * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS:
+        # Sin parametros: pueden llevar valores de variables sensibles
+        logger.warning("Slow query (%.0f ms) in %s: %s", elapsed * 1000,
+                       stats.route if stats else "no request", " ".join(statement.split())[:1000])
+
+def _handle_error(context):
+    # Una sentencia que falla no llega a after_cursor_execute
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+def instrument_engine(engine: Engine):
+    """Count and time every statement of `engine` (the sync_engine of an async one)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def timing_headers(stats: QueryStats, started: float) -> list[tuple[bytes, bytes]]:
+    elapsed = time.perf_counter() - started
+    server_timing = f'db;dur={stats.seconds * 1000:.2f};desc="{stats.count} queries", app;dur={elapsed * 1000:.2f}'
+    return [(b"server-timing", server_timing.encode()), (b"x-db-queries", str(stats.count).encode())]
+
+
+@lru_cache(maxsize=None)
+def _short_path(filename: str) -> str:
+    prefixes = sorted((path for path in sys.path if path and filename.startswith(path)), key=len, reverse=True)
+    return filename[len(prefixes[0]):].lstrip("/") if prefixes else filename
+
+def _label(code) -> str:
+    return f"{code.co_qualname} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+
+
+class CallNode:
+    __slots__ = ("code", "seconds", "own", "children")
+
+    def __init__(self, code=None):
+        self.code = code
+        self.seconds = 0.0
+        self.own = 0.0
+        self.children = {}
+
+
+class SamplingProfiler:
+    """Call tree of the current task, sampled from another thread.
+
+    Every `interval` seconds the sampler reads the event loop thread's stack
+    and charges the time since the previous sample to it, but only while this
+    request's task is the one running; the rest of the time the request is
+    waiting (I/O, the pool, other requests). Samples cut the stack at the frame
+    that started the profiler, and code run in the thread pool (sync routes) is
+    not seen.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.loop = asyncio.get_running_loop()
+        self.task = asyncio.current_task()
+        self.thread_id = threading.get_ident()
+        self.root = CallNode()
+        self.waiting = 0.0
+        self.ancestors = set()
+        self.stopped = threading.Event()
+        self.started = 0.0
+        self.seconds = 0.0
+
+    def sample(self, seconds: float):
+        if asyncio.current_task(self.loop) is not self.task:
+            self.waiting += seconds
+            return
+        codes = []
+        frame = sys._current_frames().get(self.thread_id)
+        # Los greenlets del engine async no enlazan con el resto de la pila: cuelgan de la raiz
+        while frame is not None and frame not in self.ancestors:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        node = self.root
+        node.seconds += seconds
+        for code in reversed(codes):
+            child = node.children.get(code)
+            if child is None:
+                child = node.children[code] = CallNode(code)
+            child.seconds += seconds
+            node = child
+        node.own += seconds
+
+    def run(self):
+        # Cada muestra pesa lo que ha pasado desde la anterior: el hilo no siempre despierta a tiempo
+        last = self.started
+        while not self.stopped.wait(self.interval):
+            now = time.perf_counter()
+            self.sample(now - last)
+            last = now
+
+    def start(self):
+        frame = sys._getframe(1)
+        while frame is not None:
+            self.ancestors.add(frame)
+            frame = frame.f_back
+        # Con el intervalo de cambio de hilo por defecto (5 ms) el muestreador no tendria el GIL a tiempo
+        sys.setswitchinterval(min(SWITCH_INTERVAL, self.interval))
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(target=self.run, name="request-profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        sys.setswitchinterval(SWITCH_INTERVAL)
+        self.seconds = time.perf_counter() - self.started
+        self.ancestors.clear()
+
+    def render(self, min_seconds: float) -> list[str]:
+        lines = [f"{'total ms':>10} {'own ms':>10}  function"]
+
+        def walk(node: CallNode, depth: int):
+            for child in sorted(node.children.values(), key=lambda child: child.seconds, reverse=True):
+                if child.seconds < min_seconds:
+                    continue
+                lines.append(f"{child.seconds * 1000:10.1f} {child.own * 1000:10.1f}  {'  ' * depth}{_label(child.code)}")
+                walk(child, depth + 1)
+
+        walk(self.root, 0)
+        return lines
+
+
+def profile_requested(scope: dict) -> bool:
+    values = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("profile", [])
+    return bool(values) and values[-1].lower() in ("1", "true", "yes")
+
+async def profiling_allowed(scope: dict) -> bool:
+    scheme, _, token = Headers(scope=scope).get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            user = await authenticate(token, session)
+    except HTTPException:
+        return False
+    return bool(user.is_admin)
+
+
+class InstrumentationMiddleware:
+    """ASGI middleware adding the SQL counters of each request to its response headers.
+
+    With `?profile=1` from an admin, and if the request is sampled, the response
+    is replaced by the sampled call tree of the request as text; the original status goes
+    in X-Profiled-Status. Only one request per worker is profiled at a time.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.profiling = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = profile_requested(scope) and settings.PROFILE_SAMPLE_RATE > 0
+        extra_headers = []
+        if profile and (self.profiling or random.random() >= settings.PROFILE_SAMPLE_RATE):
+            profile = False
+            extra_headers.append((b"x-profile", b"skipped"))
+        if profile:
+            # Se reserva antes del await: con la cache de usuarios fria todas las concurrentes pasarian
+            self.profiling = True
+            allowed = False
+            try:
+                # La consulta del usuario admin no cuenta en las cabeceras de la peticion
+                allowed = await profiling_allowed(scope)
+            finally:
+                if not allowed:
+                    self.profiling = False
+            profile = allowed
+
+        stats = QueryStats(scope)
+        token = request_queries.set(stats)
+        started = time.perf_counter()
+        try:
+            if profile:
+                await self.profile(scope, receive, send, stats, started)
+                return
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    message["headers"] = list(message.get("headers", [])) + timing_headers(stats, started) + extra_headers
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_queries.reset(token)
+            if profile:
+                self.profiling = False
+
+    async def profile(self, scope, receive, send, stats: QueryStats, started: float):
+        status_code = 500
+
+        async def discard(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+
+        profiler = SamplingProfiler(settings.PROFILE_INTERVAL_MS / 1000)
+        profiler.start()
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            profiler.stop()
+
+        headers = timing_headers(stats, started)
+        lines = [
+            f"{stats.route} -> {status_code}",
+            f"{profiler.seconds * 1000:.1f} ms wall: {profiler.root.seconds * 1000:.1f} ms running, "
+            f"{profiler.waiting * 1000:.1f} ms waiting (sampled every {settings.PROFILE_INTERVAL_MS:g} ms); "
+            f"{stats.count} queries / {stats.seconds * 1000:.2f} ms in the database",
+            "",
+            *profiler.render(settings.PROFILE_MIN_MS / 1000),
+        ]
+        body = ("\n".join(lines) + "\n").encode()
+        await send({"type": "http.response.start", "status": 200, "headers": headers + [
+            (b"content-type", b"text/plain; charset=utf-8"),
+            (b"content-length", str(len(body)).encode()),
+            (b"x-profiled-status", str(status_code).encode()),
+        ]})
+        await send({"type": "http.response.body", "body": body})
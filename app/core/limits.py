@@ -0,0 +1,112 @@
+import math
+import time
+from fastapi import HTTPException, status
+from fastapi.responses import ORJSONResponse
+from app.core.cache import TTLCache
+from app.core.metrics import Counter, Gauge, registry
+from app.core.settings import settings
+
+# Rutas que no cuentan para la admision: sondas, metricas y watches (esperan sin conexion a la BD)
+ADMISSION_EXEMPT_PREFIXES = ("/health", "/metrics", "/status")
+ADMISSION_EXEMPT_SUFFIXES = ("/watch", "/watch/events")
+
+rate_limit_requests = registry.register(Counter(
+    "rate_limit_requests_total", "Authenticated requests checked by the per-user rate limiter.", ("route_class", "outcome")
+))
+admission_rejected = registry.register(Counter(
+    "admission_rejected_total", "Requests shed with 429 because too many were already in flight."
+))
+admission_in_flight = registry.register(Gauge(
+    "admission_in_flight", "Requests in flight counted by admission control."
+))
+
+
+class RateLimiter:
+    """Token buckets per (user, route class).
+
+    Buckets live in a TTL cache whose entries expire when they would be full
+    again, so an evicted or expired bucket is the same as a fresh one and memory
+    stays bounded by RATE_LIMIT_MAX_BUCKETS.
+    """
+
+    def __init__(self, limits: dict[str, tuple[float, int]], maxsize: int):
+        # Tipo de ruta -> (tokens por segundo, rafaga); rate <= 0 lo desactiva
+        self.limits = limits
+        refill = [burst / rate for rate, burst in limits.values() if rate > 0]
+        self.buckets = TTLCache(maxsize=maxsize, ttl=max(refill, default=0))
+
+    def acquire(self, key: str, route_class: str) -> float:
+        """Take a token; 0 when the request may go on, otherwise seconds until a token is available."""
+        rate, burst = self.limits[route_class]
+        if rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        bucket = self.buckets.get((key, route_class))
+        tokens = burst if bucket is None else min(burst, bucket[0] + (now - bucket[1]) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        self.buckets.set((key, route_class), (tokens, now), ttl=(burst - tokens) / rate)
+        rate_limit_requests.inc(route_class, "limited" if wait else "allowed")
+        return wait
+
+
+rate_limiter = RateLimiter({
+    "read": (settings.RATE_LIMIT_READ_RATE, settings.RATE_LIMIT_READ_BURST),
+    "write": (settings.RATE_LIMIT_WRITE_RATE, settings.RATE_LIMIT_WRITE_BURST),
+}, maxsize=settings.RATE_LIMIT_MAX_BUCKETS)
+
+def route_class(method: str) -> str:
+    return "read" if method in ("GET", "HEAD") else "write"
+
+def enforce_rate_limit(username: str, method: str):
+    wait = rate_limiter.acquire(username, route_class(method))
+    if wait:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": str(max(1, math.ceil(wait)))},
+        )
+
+
+def max_in_flight() -> int:
+    if settings.ADMISSION_MAX_IN_FLIGHT:
+        return settings.ADMISSION_MAX_IN_FLIGHT
+    # Por encima de esto las peticiones solo harian cola esperando una conexion del pool
+    return 2 * (settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW)
+
+
+class AdmissionMiddleware:
+    """ASGI middleware capping the requests in flight per worker; the rest get 429 at once."""
+
+    def __init__(self, app, limit: int = None):
+        self.app = app
+        self.limit = max_in_flight() if limit is None else limit
+        self.in_flight = 0
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if (scope["type"] != "http" or self.limit < 0
+                or path.startswith(ADMISSION_EXEMPT_PREFIXES) or path.rstrip("/").endswith(ADMISSION_EXEMPT_SUFFIXES)):
+            await self.app(scope, receive, send)
+            return
+
+        if self.in_flight >= self.limit:
+            admission_rejected.inc()
+            response = ORJSONResponse(
+                {"detail": "Server busy, retry later"},
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER)},
+            )
+            await response(scope, receive, send)
+            return
+
+        self.in_flight += 1
+        admission_in_flight.inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+            admission_in_flight.dec()
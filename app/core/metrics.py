@@ -0,0 +1,224 @@
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from threading import Lock
+from typing import Callable, Iterable
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Buckets por defecto de los clientes oficiales de Prometheus (segundos)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = Lock()
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = defaultdict(float)
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def render(self) -> list[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labels, key)} {value}" for key, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, *label_values, value: float):
+        with self._lock:
+            self._values[label_values] = value
+
+    def dec(self, *label_values, amount: float = 1):
+        self.inc(*label_values, amount=-amount)
+
+
+class CallbackMetric(Metric):
+    """Gauge or counter whose samples are collected when /metrics is scraped."""
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str],
+                 collect: Callable[[], Iterable[tuple]], type: str = "gauge"):
+        super().__init__(name, documentation, labels)
+        self.collect = collect
+        self.type = type
+
+    def render(self) -> list[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labels, sample[:-1])} {sample[-1]}" for sample in self.collect()
+        ]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        self._counts = {}
+        self._sums = defaultdict(float)
+
+    def observe(self, *label_values, value: float):
+        with self._lock:
+            counts = self._counts.get(label_values)
+            if counts is None:
+                counts = self._counts[label_values] = [0] * (len(self.buckets) + 1)
+            counts[bisect_left(self.buckets, value)] += 1
+            self._sums[label_values] += value
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        for key, counts in sorted(self._counts.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labels, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {self._sums[key]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[Metric] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route template, method and status code.", ("method", "route", "status")
+))
+http_latency = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template, until the last body byte.", ("method", "route")
+))
+http_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served.", ("method",)
+))
+db_pool_wait = registry.register(Histogram(
+    "db_pool_wait_seconds", "Time spent waiting to check a connection out of the pool.", ("engine",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+))
+
+
+class TimedQueuePoolMixin:
+    """Records in db_pool_wait_seconds how long each checkout waited."""
+
+    metrics_label = "sync"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_wait.observe(self.metrics_label, value=time.perf_counter() - started)
+
+
+class TimedQueuePool(TimedQueuePoolMixin, QueuePool):
+    metrics_label = "sync"
+
+
+class TimedAsyncQueuePool(TimedQueuePoolMixin, AsyncAdaptedQueuePool):
+    metrics_label = "async"
+
+
+def register_pool_metrics(engines: dict):
+    """Export size / checked out / overflow of each `{label: engine}` pool."""
+
+    def collect(attribute: str):
+        def samples():
+            for label, engine in engines.items():
+                pool = engine.pool
+                if hasattr(pool, attribute):
+                    yield label, getattr(pool, attribute)()
+        return samples
+
+    for attribute, documentation in (
+        ("size", "Configured size of the connection pool."),
+        ("checkedout", "Connections currently checked out of the pool."),
+        ("checkedin", "Idle connections available in the pool."),
+        ("overflow", "Connections opened beyond the pool size (negative while the pool is not full)."),
+    ):
+        registry.register(CallbackMetric(f"db_pool_{attribute}", documentation, ("engine",), collect(attribute)))
+
+
+def register_cache_metrics(caches: dict):
+    """Export hits / misses / size of each `{label: TTLCache}`."""
+    for attribute, kind, documentation in (
+        ("hits", "counter", "Cache lookups answered from memory."),
+        ("misses", "counter", "Cache lookups that fell through to the source."),
+        ("size", "gauge", "Entries currently cached."),
+    ):
+        name = f"cache_{attribute}_total" if kind == "counter" else f"cache_{attribute}"
+        registry.register(CallbackMetric(name, documentation, ("cache",), lambda attribute=attribute: (
+            (label, cache.stats()[attribute]) for label, cache in caches.items()
+        ), type=kind))
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts, latencies and in-flight requests."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_in_flight.inc(method)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.dec(method)
+            # Plantilla de la ruta (p. ej. /environments/{env_name}/.json) para acotar la cardinalidad
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_requests.inc(method, route, status_code)
+            http_latency.observe(method, route, value=time.perf_counter() - started)
@@ -0,0 +1,140 @@
+"""Versioned schema changes, applied once per database at startup.
+
+Every replica calls `migrate` on boot. With the schema up to date that is a
+catalog lookup and one SELECT; otherwise the replica that takes the advisory
+lock applies the pending steps in a single transaction, and the rest wait on
+the lock and then find nothing left to do. Steps, backfills included, run on
+that transaction's connection and never commit or roll back themselves: if one
+fails, none of the pending steps is applied.
+
+Steps only ever get appended. Each one checks the catalog before changing
+anything, so it also works on databases created by `create_all` before the
+versioning existed.
+"""
+import logging
+import time
+from datetime import datetime
+from typing import Callable
+from sqlalchemy import delete, insert, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlmodel import SQLModel
+from app.core.models import SchemaVersion
+from app.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Clave del advisory lock que serializa las migraciones entre replicas
+MIGRATION_LOCK_KEY = 7_236_983
+
+
+def wait_for_database(engine: Engine):
+    """Retry the first connection with exponential backoff until DB_CONNECT_TIMEOUT runs out."""
+    deadline = time.monotonic() + settings.DB_CONNECT_TIMEOUT
+    delay = settings.DB_CONNECT_RETRY_INITIAL
+    while True:
+        try:
+            with engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+            return
+        except (OperationalError, InterfaceError) as e:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise
+            logger.warning("Database not available (%s), retrying in %.1fs", e.orig or e, min(delay, remaining))
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, settings.DB_CONNECT_RETRY_MAX)
+
+
+def _columns(connection: Connection, table: str) -> set[str]:
+    return {column["name"] for column in inspect(connection).get_columns(table)}
+
+def _indexes(connection: Connection, table: str) -> dict[str, dict]:
+    inspector = inspect(connection)
+    # Las restricciones UNIQUE de create_all no siempre aparecen como indices
+    indexes = {index["name"]: index for index in inspector.get_indexes(table)}
+    indexes.update({constraint["name"]: {**constraint, "unique": True} for constraint in inspector.get_unique_constraints(table)})
+    return indexes
+
+def _add_column(connection: Connection, table: str, column: str, definition: str):
+    if column not in _columns(connection, table):
+        connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {definition}"))
+
+def _create_index(connection: Connection, table: str, name: str, columns: list[str], unique: bool = False):
+    if name not in _indexes(connection, table):
+        connection.execute(text(f"CREATE {'UNIQUE ' if unique else ''}INDEX {name} ON {table} ({', '.join(columns)})"))
+
+
+def create_tables(connection: Connection):
+    """Tables added after the first release: resolved views, history, snapshots, data keys."""
+    SQLModel.metadata.create_all(connection)
+
+def environment_revisions_and_parents(connection: Connection):
+    _add_column(connection, "environments", "revision", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(connection, "environments", "parent_id", "INTEGER REFERENCES environments (id)")
+    _create_index(connection, "environments", "ix_environments_parent_id", ["parent_id"])
+
+def variable_names_per_environment(connection: Connection):
+    """Variable names were unique across environments; now only within each one."""
+    if _indexes(connection, "variable").get("ix_variable_name", {}).get("unique"):
+        connection.execute(text("DROP INDEX ix_variable_name"))
+        connection.execute(text("CREATE INDEX ix_variable_name ON variable (name)"))
+    _create_index(connection, "variable", "uq_variable_environment_name", ["environment_id", "name"], unique=True)
+
+def resolved_variable_revisions(connection: Connection):
+    """Delta sync columns, for databases that got resolved_variable before them."""
+    _add_column(connection, "resolved_variable", "revision", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(connection, "resolved_variable", "deleted", "BOOLEAN NOT NULL DEFAULT FALSE")
+    _create_index(
+        connection, "resolved_variable", "ix_resolved_variable_environment_revision", ["environment_id", "revision"]
+    )
+
+def backfill_derived_tables(connection: Connection):
+    from app.environments.inheritance import backfill_resolved_variables
+    from app.variables.history import backfill_snapshots
+    backfill_resolved_variables(connection)
+    backfill_snapshots(connection)
+
+
+# Solo se anaden pasos al final: la version guardada es el numero de pasos aplicados
+MIGRATIONS: list[tuple[str, Callable[[Connection], None]]] = [
+    ("create missing tables", create_tables),
+    ("environment revisions and parents", environment_revisions_and_parents),
+    ("variable names unique per environment", variable_names_per_environment),
+    ("resolved variable revisions and tombstones", resolved_variable_revisions),
+    ("backfill resolved variables and snapshots", backfill_derived_tables),
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def current_version(connection: Connection) -> int:
+    if not inspect(connection).has_table(SchemaVersion.__tablename__):
+        return 0
+    return connection.execute(select(SchemaVersion.version)).scalar() or 0
+
+def migrate(engine: Engine):
+    """Apply the pending migrations, if any, holding the migration lock."""
+    with engine.connect() as connection:
+        if current_version(connection) >= SCHEMA_VERSION:
+            return
+
+    with engine.begin() as connection:
+        if connection.dialect.name == "postgresql":
+            # El DDL de PostgreSQL es transaccional: el lock se suelta con el commit, ya migrado
+            connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        version = current_version(connection)
+        if version >= SCHEMA_VERSION:
+            return
+        started = time.perf_counter()
+        for number, (description, step) in enumerate(MIGRATIONS[version:], start=version + 1):
+            logger.info("Applying schema migration %s: %s", number, description)
+            try:
+                step(connection)
+            except Exception:
+                # Todos los pasos van en la misma transaccion: no queda ninguno a medias
+                logger.error("Schema migration %s (%s) failed; rolling back every pending step, "
+                             "the schema stays at version %s", number, description, version)
+                raise
+        connection.execute(delete(SchemaVersion))
+        connection.execute(insert(SchemaVersion).values(version=SCHEMA_VERSION, applied_at=datetime.utcnow()))
+        logger.info("Schema at version %s (%.0f ms)", SCHEMA_VERSION, (time.perf_counter() - started) * 1000)
@@ -0,0 +1,13 @@
+from datetime import datetime
+from typing import Optional
+from sqlmodel import SQLModel, Field
+
+
+class SchemaVersion(SQLModel, table=True):
+    """Number of schema migrations applied to the database; a single row (see app/core/migrations.py)."""
+
+    __tablename__ = "schema_version"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    version: int = Field(nullable=False, description="Migrations applied, in order")
+    applied_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
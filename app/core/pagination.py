@@ -0,0 +1,73 @@
+import base64
+from typing import Literal, Optional
+from fastapi import HTTPException, status
+from sqlalchemy import func, text
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+CountMode = Literal["exact", "estimate", "none"]
+
+
+def encode_cursor(direction: str, last_id: int) -> str:
+    """Opaque cursor: `a` pages after the id, `b` pages before it."""
+    return base64.urlsafe_b64encode(f"{direction}:{last_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[str, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        direction, _, last_id = raw.partition(":")
+        if direction not in ("a", "b"):
+            raise ValueError(direction)
+        return direction, int(last_id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+async def count_rows(session: AsyncSession, model, mode: CountMode) -> Optional[int]:
+    """Total rows of `model`; `estimate` uses the PostgreSQL planner statistics."""
+    if mode == "none":
+        return None
+    if mode == "estimate" and session.bind.dialect.name == "postgresql":
+        estimate = (await session.exec(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)").bindparams(
+                table=model.__tablename__
+            )
+        )).scalar()
+        # -1 / NULL: la tabla nunca fue analizada
+        if estimate is not None and estimate >= 0:
+            return int(estimate)
+    return (await session.exec(select(func.count()).select_from(model))).one()
+
+def schema_columns(model, schema) -> list:
+    """Columns of `model` backing the fields of a read schema."""
+    return [getattr(model, field) for field in schema.model_fields]
+
+async def keyset_page(session: AsyncSession, model, cursor: Optional[str], page_size: int, columns: Optional[list] = None):
+    """One page ordered by id, plus the cursors of the neighbouring pages (or None).
+
+    With `columns` the page holds plain rows instead of ORM objects.
+    """
+    statement = select(*columns) if columns else select(model)
+    direction, last_id = decode_cursor(cursor) if cursor else ("a", None)
+    if direction == "a":
+        if last_id is not None:
+            statement = statement.where(model.id > last_id)
+        statement = statement.order_by(model.id)
+    else:
+        statement = statement.where(model.id < last_id).order_by(model.id.desc())
+
+    # Un elemento extra indica si hay mas paginas en esa direccion
+    rows = list((await session.exec(statement.limit(page_size + 1))).all())
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if direction == "b":
+        rows.reverse()
+
+    if not rows:
+        return rows, None, None
+    if direction == "a":
+        has_next, has_previous = has_more, last_id is not None
+    else:
+        has_next, has_previous = True, has_more
+    next_cursor = encode_cursor("a", rows[-1].id) if has_next else None
+    previous_cursor = encode_cursor("b", rows[0].id) if has_previous else None
+    return rows, next_cursor, previous_cursor
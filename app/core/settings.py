@@ -1,15 +1,101 @@
+from typing import Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from sqlmodel import SQLModel, create_engine
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import create_engine
+from app.core.metrics import TimedAsyncQueuePool, TimedQueuePool
 from app.variables.models.variable import Variable
+from app.variables.models.resolved_variable import ResolvedVariable
+from app.variables.models.variable_history import VariableHistory
 from app.environments.models.environment import Environment
+from app.environments.models.snapshot import EnvironmentSnapshot
+from app.environments.models.data_key import EnvironmentKey
 from app.users.models.user import User
+from app.core.models import SchemaVersion
 
 
 class Settings(BaseSettings):
     DATABASE_URL: str
+    # URL del engine async; si no se define se deriva de DATABASE_URL
+    ASYNC_DATABASE_URL: Optional[str] = None
     DEBUG: bool = False
     ENV: str = "development"
     JWT_SECRET: str
+    # Cache en memoria de usuarios autenticados (por proceso). Los cambios y bajas de usuarios llegan al
+    # resto de procesos por el canal de WATCH_CHANNEL; sin PostgreSQL, tras PRINCIPAL_CACHE_TTL como mucho
+    PRINCIPAL_CACHE_SIZE: int = 1024
+    PRINCIPAL_CACHE_TTL: int = 60
+    # Cache de respuestas renderizadas (.json, .env, ...), por revision, formato y codificacion
+    RENDER_CACHE_SIZE: int = 512
+    RENDER_CACHE_TTL: int = 3600
+    # Cache nombre -> id de entorno
+    ENVIRONMENT_ID_CACHE_SIZE: int = 4096
+    ENVIRONMENT_ID_CACHE_TTL: int = 300
+    # Maximo de operaciones por peticion en /variables/batch
+    BATCH_MAX_OPERATIONS: int = 1000
+    # Entornos por peticion en GET /environments/resolve
+    RESOLVE_MAX_ENVIRONMENTS: int = 50
+    # Export / import NDJSON: filas por lote del cursor y registros por commit
+    EXPORT_BATCH_SIZE: int = 1000
+    IMPORT_BATCH_SIZE: int = 1000
+    # Profundidad maxima de la cadena de herencia entre entornos
+    INHERITANCE_MAX_DEPTH: int = 32
+    # Historial: una instantanea del entorno cada N revisiones acota las lecturas en el pasado
+    HISTORY_SNAPSHOT_INTERVAL: int = 100
+    # Delta sync (?since=): revisiones durante las que se conservan las bajas; mas atras, respuesta completa
+    DELTA_MAX_REVISIONS: int = 1000
+    # Cifrado en reposo de las variables sensibles: clave maestra AES-256 en base64 (vacia lo desactiva)
+    # y cache de las claves de datos de cada entorno ya desenvueltas
+    ENCRYPTION_MASTER_KEY: str = ""
+    ENCRYPTION_KEY_CACHE_SIZE: int = 1024
+    ENCRYPTION_KEY_CACHE_TTL: int = 300
+    # Rate limit por usuario y tipo de ruta (lecturas GET/HEAD, escrituras el resto), por worker.
+    # RATE en peticiones por segundo, BURST el maximo acumulable; RATE=0 lo desactiva
+    RATE_LIMIT_READ_RATE: float = 50.0
+    RATE_LIMIT_READ_BURST: int = 100
+    RATE_LIMIT_WRITE_RATE: float = 10.0
+    RATE_LIMIT_WRITE_BURST: int = 20
+    RATE_LIMIT_MAX_BUCKETS: int = 10000
+    # Control de admision: peticiones en curso por worker antes de responder 429 con Retry-After.
+    # 0 usa 2 x (DB_POOL_SIZE + DB_MAX_OVERFLOW); un valor negativo lo desactiva
+    ADMISSION_MAX_IN_FLIGHT: int = 0
+    ADMISSION_RETRY_AFTER: int = 1
+    # Watch (long-poll / SSE) de cambios de configuracion
+    WATCH_CHANNEL: str = "config_changes"
+    WATCH_MAX_TIMEOUT: int = 300
+    WATCH_HEARTBEAT_SECONDS: int = 15
+    # Arranque: reintentos de la primera conexion a la BD con backoff exponencial (segundos)
+    DB_CONNECT_TIMEOUT: float = 60.0
+    DB_CONNECT_RETRY_INITIAL: float = 0.1
+    DB_CONNECT_RETRY_MAX: float = 5.0
+    # Pool de conexiones (solo PostgreSQL); DB_STATEMENT_TIMEOUT_MS=0 lo desactiva
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: int = 30000
+    # Sentencias SQL mas lentas que esto (ms) se registran con su ruta; 0 lo desactiva
+    SLOW_QUERY_THRESHOLD_MS: float = 200.0
+    # Perfil de una peticion con ?profile=1 (solo admins): fraccion de esas peticiones que se perfilan
+    # (0 lo desactiva), cada cuanto se muestrea la pila y ramas por debajo de PROFILE_MIN_MS que no se muestran
+    PROFILE_SAMPLE_RATE: float = 0.1
+    PROFILE_INTERVAL_MS: float = 1.0
+    PROFILE_MIN_MS: float = 2.0
+    # Readiness: timeout del ping a la BD y saturacion maxima del pool
+    READINESS_TIMEOUT: float = 2.0
+    READINESS_MAX_POOL_SATURATION: float = 0.9
+    # Servidor (python main.py); WEB_WORKERS=0 usa un worker por CPU disponible.
+    # Cada worker tiene su propio pool: conexiones = workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    WEB_WORKERS: int = 0
+    KEEP_ALIVE_TIMEOUT: int = 5
+    LIMIT_CONCURRENCY: Optional[int] = 1000
+    LIMIT_MAX_REQUESTS: Optional[int] = None
+    BACKLOG: int = 2048
+    GRACEFUL_SHUTDOWN_TIMEOUT: int = 30
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -19,7 +105,87 @@ class Settings(BaseSettings):
 
 settings = Settings()
 
-engine = create_engine(settings.DATABASE_URL, echo=settings.DEBUG)
+# Drivers async equivalentes a los drivers sync soportados
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+def build_async_engine_args(database_url: str) -> tuple[str, dict]:
+    """Derive the async URL and connect args from a sync DATABASE_URL."""
+    url = make_url(database_url)
+    url = url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+    connect_args = {}
+    # asyncpg no acepta `options`; los `-c clave=valor` pasan a server_settings
+    if url.drivername == "postgresql+asyncpg" and "options" in url.query:
+        server_settings = {}
+        for option in url.query["options"].split():
+            if option == "-c":
+                continue
+            key, _, value = option.removeprefix("-c").partition("=")
+            server_settings[key] = value
+        url = url.difference_update_query(["options"])
+        connect_args["server_settings"] = server_settings
+    return url.render_as_string(hide_password=False), connect_args
+
+def pool_args(database_url: str, pool_class) -> dict:
+    """Pool settings from Settings; SQLite keeps its default pool."""
+    if make_url(database_url).get_backend_name() != "postgresql":
+        return {"pool_pre_ping": settings.DB_POOL_PRE_PING}
+    # pool_class registra el tiempo de espera de cada checkout
+    return {
+        "poolclass": pool_class,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+def sync_connect_args(database_url: str) -> dict:
+    url = make_url(database_url)
+    if url.get_backend_name() != "postgresql" or not settings.DB_STATEMENT_TIMEOUT_MS:
+        return {}
+    # connect_args reemplaza el `options` de la URL, asi que se conserva lo que traia
+    options = f"{url.query.get('options', '')} -c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"
+    return {"options": options.strip()}
+
+engine = create_engine(
+    settings.DATABASE_URL,
+    echo=settings.DEBUG,
+    connect_args=sync_connect_args(settings.DATABASE_URL),
+    **pool_args(settings.DATABASE_URL, TimedQueuePool),
+)
+
+if settings.ASYNC_DATABASE_URL:
+    async_database_url, async_connect_args = settings.ASYNC_DATABASE_URL, {}
+else:
+    async_database_url, async_connect_args = build_async_engine_args(settings.DATABASE_URL)
+
+if make_url(async_database_url).get_backend_name() == "postgresql" and settings.DB_STATEMENT_TIMEOUT_MS:
+    async_connect_args.setdefault("server_settings", {})["statement_timeout"] = str(settings.DB_STATEMENT_TIMEOUT_MS)
+
+async_engine = create_async_engine(
+    async_database_url,
+    echo=settings.DEBUG,
+    connect_args=async_connect_args,
+    **pool_args(async_database_url, TimedAsyncQueuePool),
+)
+
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite no aplica ON DELETE CASCADE salvo que se active en cada conexion
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+for _engine in (engine, async_engine.sync_engine):
+    if _engine.dialect.name == "sqlite":
+        event.listen(_engine, "connect", _enable_sqlite_foreign_keys)
 
 def init_db():
-    SQLModel.metadata.create_all(engine)
\ No newline at end of file
+    # Espera a la BD y aplica solo las migraciones pendientes; con el esquema al dia son dos SELECT
+    from app.core.migrations import migrate, wait_for_database
+    wait_for_database(engine)
+    migrate(engine)
@@ -0,0 +1,196 @@
+from collections import defaultdict
+from typing import Iterable, Optional
+from fastapi import HTTPException, status
+from sqlalchemy import delete, insert, literal_column, text, update
+from sqlalchemy.engine import Connection
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.settings import settings
+from app.environments.models.environment import Environment
+from app.environments.watch import change_hub
+from app.variables.models.resolved_variable import ResolvedVariable
+from app.variables.models.variable import Variable
+from app.variables.repository import UPSERT_DIALECTS
+
+# Clave del advisory lock que serializa los cambios de padre en PostgreSQL
+HIERARCHY_LOCK_KEY = 7_236_982
+INSERT_CHUNK_SIZE = 1000
+
+
+def ancestors_cte(environment_id: int):
+    """The environment and its ancestors as (id, parent_id, depth), depth 0 being the environment."""
+    chain = select(Environment.id, Environment.parent_id, literal_column("0").label("depth")).where(
+        Environment.id == environment_id
+    ).cte("ancestors", recursive=True)
+    return chain.union_all(
+        select(Environment.id, Environment.parent_id, chain.c.depth + 1)
+        .join(chain, Environment.id == chain.c.parent_id)
+        .where(chain.c.depth < settings.INHERITANCE_MAX_DEPTH)
+    )
+
+def descendants_cte(environment_id: Optional[int] = None):
+    """The subtree under `environment_id` (or every tree, from the roots) as (id, parent_id, depth)."""
+    roots = Environment.id == environment_id if environment_id is not None else Environment.parent_id.is_(None)
+    tree = select(Environment.id, Environment.parent_id, literal_column("0").label("depth")).where(
+        roots
+    ).cte("descendants", recursive=True)
+    return tree.union_all(
+        select(Environment.id, Environment.parent_id, tree.c.depth + 1)
+        .join(tree, Environment.parent_id == tree.c.id)
+        .where(tree.c.depth < settings.INHERITANCE_MAX_DEPTH)
+    )
+
+
+def merge_chains(parents: dict, variables: dict, targets: Iterable[int]) -> list[dict]:
+    """Resolved rows of each target: the nearest environment of its chain defining a name wins."""
+    rows = []
+    for environment_id in targets:
+        chain, current = [], environment_id
+        while current is not None and current in parents and len(chain) <= settings.INHERITANCE_MAX_DEPTH:
+            chain.append(current)
+            current = parents[current]
+        merged = {}
+        for source_id in reversed(chain):
+            for name, value in variables.get(source_id, {}).items():
+                merged[name] = (value, source_id)
+        rows.extend(
+            {"environment_id": environment_id, "name": name, "value": value, "source_environment_id": source_id}
+            for name, (value, source_id) in merged.items()
+        )
+    return rows
+
+
+async def resolve_parent(session: AsyncSession, environment_id: Optional[int], parent_name: Optional[str]) -> Optional[int]:
+    """Id of the requested parent; rejects unknown parents, cycles and chains over INHERITANCE_MAX_DEPTH."""
+    if parent_name is None:
+        return None
+    if session.bind.dialect.name == "postgresql":
+        # Dos cambios de padre concurrentes podrian cerrar un ciclo entre ellos
+        await session.exec(text("SELECT pg_advisory_xact_lock(:key)").bindparams(key=HIERARCHY_LOCK_KEY))
+
+    parent_id = (await session.exec(select(Environment.id).where(Environment.name == parent_name))).first()
+    if parent_id is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Parent environment '{parent_name}' not found")
+
+    chain = ancestors_cte(parent_id)
+    chain_ids = (await session.exec(select(chain.c.id))).all()
+    if environment_id is not None and environment_id in chain_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Setting '{parent_name}' as parent would create an inheritance cycle",
+        )
+
+    height = 0
+    if environment_id is not None:
+        tree = descendants_cte(environment_id)
+        height = max((await session.exec(select(tree.c.depth))).all())
+    if len(chain_ids) + height + 1 > settings.INHERITANCE_MAX_DEPTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Inheritance chains are limited to {settings.INHERITANCE_MAX_DEPTH} environments",
+        )
+    return parent_id
+
+
+async def refresh_resolved(session: AsyncSession, environment_id: int, names: Optional[Iterable[str]] = None):
+    """Recompute the materialized variables of an environment and its descendants.
+
+    With `names` only those variables are recomputed (a write in the environment);
+    without them the views are rebuilt (a new parent). Every descendant gets a new
+    revision, so their caches and watchers see the change. Only rows whose effective
+    value changed are written, stamped with the new revision; names that no longer
+    resolve are kept as tombstones for delta sync. Runs in the caller's transaction,
+    after `bump_revision` locked the environment itself.
+    """
+    names = None if names is None else set(names)
+    if names is not None and not names:
+        return
+
+    tree = descendants_cte(environment_id)
+    subtree = (await session.exec(select(tree.c.id, tree.c.parent_id, tree.c.depth).order_by(tree.c.depth))).all()
+
+    # Nivel a nivel y de arriba abajo: el mismo orden de bloqueo que las escrituras en los hijos
+    for depth in sorted({depth for _, _, depth in subtree if depth > 0}):
+        level = [node for node, _, node_depth in subtree if node_depth == depth]
+        bumped = (await session.exec(
+            update(Environment)
+            .where(Environment.id.in_(level))
+            .values(revision=Environment.revision + 1)
+            .returning(Environment.name, Environment.revision)
+            .execution_options(synchronize_session=False)
+        )).all()
+        for env_name, revision in bumped:
+            await change_hub.publish(session, env_name, revision)
+
+    chain = ancestors_cte(environment_id)
+    parents = dict((await session.exec(select(chain.c.id, chain.c.parent_id))).all())
+    parents.update({node: parent for node, parent, _ in subtree})
+
+    statement = select(Variable.environment_id, Variable.name, Variable.value).where(
+        Variable.environment_id.in_(list(parents))
+    )
+    if names is not None:
+        statement = statement.where(Variable.name.in_(names))
+    variables = defaultdict(dict)
+    for source_id, name, value in (await session.exec(statement)).all():
+        variables[source_id][name] = value
+
+    targets = [node for node, _, _ in subtree]
+    revisions = dict((await session.exec(
+        select(Environment.id, Environment.revision).where(Environment.id.in_(targets))
+    )).all())
+    current = select(
+        ResolvedVariable.environment_id, ResolvedVariable.name, ResolvedVariable.value,
+        ResolvedVariable.source_environment_id, ResolvedVariable.deleted,
+    ).where(ResolvedVariable.environment_id.in_(targets))
+    if names is not None:
+        current = current.where(ResolvedVariable.name.in_(names))
+    existing = {(node, name): (value, source_id, deleted) for node, name, value, source_id, deleted in (await session.exec(current)).all()}
+
+    rows = []
+    for row in merge_chains(parents, variables, targets):
+        key = (row["environment_id"], row["name"])
+        if existing.pop(key, None) != (row["value"], row["source_environment_id"], False):
+            rows.append({**row, "revision": revisions[key[0]], "deleted": False})
+    # Lo que ya no se resuelve queda como tombstone para el delta sync
+    rows.extend(
+        {"environment_id": node, "name": name, "value": "", "source_environment_id": source_id,
+         "revision": revisions[node], "deleted": True}
+        for (node, name), (_, source_id, deleted) in existing.items() if not deleted
+    )
+    upsert = UPSERT_DIALECTS[session.bind.dialect.name]
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        statement = upsert(ResolvedVariable).values(rows[start:start + INSERT_CHUNK_SIZE])
+        await session.exec(statement.on_conflict_do_update(
+            index_elements=[ResolvedVariable.environment_id, ResolvedVariable.name],
+            set_={column: statement.excluded[column] for column in ("value", "source_environment_id", "revision", "deleted")},
+        ))
+
+    # Tombstones que ningun cliente al dia puede necesitar ya
+    await session.exec(delete(ResolvedVariable).where(
+        ResolvedVariable.environment_id == environment_id,
+        ResolvedVariable.deleted.is_(True),
+        ResolvedVariable.revision <= revisions[environment_id] - settings.DELTA_MAX_REVISIONS,
+    ))
+
+
+def backfill_resolved_variables(connection: Connection):
+    """Build the resolved views once for databases created before inheritance existed.
+
+    Runs inside the caller's transaction (the migration one); a failure rolls all of it back.
+    """
+    if connection.execute(select(ResolvedVariable.id).limit(1)).first() is not None:
+        return
+    if connection.execute(select(Variable.id).limit(1)).first() is None:
+        return
+    parents, revisions = {}, {}
+    for environment_id, parent_id, revision in connection.execute(
+        select(Environment.id, Environment.parent_id, Environment.revision)
+    ):
+        parents[environment_id], revisions[environment_id] = parent_id, revision
+    variables = defaultdict(dict)
+    for source_id, name, value in connection.execute(select(Variable.environment_id, Variable.name, Variable.value)):
+        variables[source_id][name] = value
+    rows = [{**row, "revision": revisions[row["environment_id"]]} for row in merge_chains(parents, variables, list(parents))]
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        connection.execute(insert(ResolvedVariable).values(rows[start:start + INSERT_CHUNK_SIZE]))
@@ -0,0 +1,16 @@
+from datetime import datetime
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Column, ForeignKey, Integer
+
+
+class EnvironmentKey(SQLModel, table=True):
+    """Data key of an environment, wrapped with the master key (ENCRYPTION_MASTER_KEY)."""
+
+    __tablename__ = "environment_key"
+
+    environment_id: int = Field(
+        sa_column=Column(Integer, ForeignKey("environments.id", ondelete="CASCADE"), primary_key=True),
+        description="Environment whose sensitive values are sealed with this key"
+    )
+    wrapped_key: str = Field(nullable=False, description="AES-256-GCM data key sealed with the master key, base64")
+    created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
@@ -1,5 +1,6 @@
 from datetime import datetime
 from typing import Optional, TYPE_CHECKING, List
+from sqlalchemy import Column, ForeignKey, Integer
 from sqlmodel import SQLModel, Field, Relationship
 
 if TYPE_CHECKING:
@@ -21,6 +22,16 @@ class Environment(SQLModel, table=True):
         default=None,
         description="Brief description of the environment's purpose"
     )
+    parent_id: Optional[int] = Field(
+        default=None,
+        sa_column=Column(Integer, ForeignKey("environments.id"), nullable=True, index=True),
+        description="Environment whose variables this one inherits and may override"
+    )
+    revision: int = Field(
+        default=0,
+        nullable=False,
+        description="Monotonic revision, bumped whenever the environment's variables are written"
+    )
     created_at: datetime = Field(
         default_factory=datetime.utcnow,
         nullable=False,
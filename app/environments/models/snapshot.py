@@ -0,0 +1,27 @@
+from datetime import datetime
+from typing import Optional
+from sqlmodel import SQLModel, Field
+from sqlalchemy import JSON, Column, ForeignKey, Integer, UniqueConstraint
+
+
+class EnvironmentSnapshot(SQLModel, table=True):
+    """Variables of an environment at a revision, so point-in-time reads replay a bounded history."""
+
+    __tablename__ = "environment_snapshot"
+    __table_args__ = (UniqueConstraint("environment_id", "revision", name="uq_environment_snapshot_revision"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    environment_id: int = Field(
+        sa_column=Column(Integer, ForeignKey("environments.id", ondelete="CASCADE"), nullable=False),
+        description="Environment the snapshot belongs to"
+    )
+    revision: int = Field(nullable=False, description="Environment revision captured by the snapshot")
+    variables: dict = Field(
+        sa_column=Column(JSON, nullable=False),
+        description="Variable name -> value at that revision"
+    )
+    created_at: datetime = Field(
+        default_factory=datetime.utcnow,
+        nullable=False,
+        description="Timestamp of the revision captured by the snapshot"
+    )
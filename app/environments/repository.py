@@ -0,0 +1,57 @@
+from typing import Optional
+from sqlalchemy import update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.cache import TTLCache
+from app.core.settings import settings
+from app.environments.models.environment import Environment
+from app.environments.watch import change_hub
+
+
+# Nombre -> id de entorno; delete_environment (local o de otra replica) lo invalida
+environment_ids = TTLCache(maxsize=settings.ENVIRONMENT_ID_CACHE_SIZE, ttl=settings.ENVIRONMENT_ID_CACHE_TTL)
+
+def forget_environment(env_name: str):
+    environment_ids.invalidate(env_name)
+
+def _forget_deleted(change: dict):
+    if change["deleted"]:
+        forget_environment(change["environment"])
+
+change_hub.subscribe(_forget_deleted)
+
+async def get_environment_id(session: AsyncSession, env_name: str) -> Optional[int]:
+    environment_id = environment_ids.get(env_name)
+    if environment_id is None:
+        environment_id = (await session.exec(
+            select(Environment.id).where(Environment.name == env_name)
+        )).first()
+        if environment_id is not None:
+            environment_ids.set(env_name, environment_id)
+    return environment_id
+
+async def bump_revision(session: AsyncSession, env_name: str) -> Optional[tuple[int, int]]:
+    """Increment the revision and notify watchers, inside the caller's transaction.
+
+    Returns (environment id, new revision), or None when the environment does not
+    exist. Called first in every write, it doubles as the existence check and
+    holds the environment row lock until commit, so revisions follow commit order.
+    """
+    statement = update(Environment).values(revision=Environment.revision + 1).returning(
+        Environment.id, Environment.revision
+    )
+    row = None
+    environment_id = environment_ids.get(env_name)
+    if environment_id is not None:
+        # Filtrar tambien por nombre detecta un id obsoleto (entorno borrado y recreado)
+        row = (await session.exec(
+            statement.where(Environment.id == environment_id, Environment.name == env_name)
+        )).first()
+    if row is None:
+        row = (await session.exec(statement.where(Environment.name == env_name))).first()
+        if row is None:
+            forget_environment(env_name)
+            return None
+        environment_ids.set(env_name, row[0])
+    await change_hub.publish(session, env_name, row[1])
+    return row[0], row[1]
@@ -0,0 +1,17 @@
+from typing import Optional
+from app.core.cache import TTLCache
+from app.core.settings import settings
+
+
+# Respuestas ya renderizadas, por (id de entorno, revision, formato[, codificacion])
+render_cache = TTLCache(maxsize=settings.RENDER_CACHE_SIZE, ttl=settings.RENDER_CACHE_TTL)
+
+def make_etag(environment_id: int, revision: int, *variant: Optional[str]) -> str:
+    """Strong ETag of one representation: format and content coding are part of it."""
+    return '"' + "-".join([str(environment_id), str(revision), *filter(None, variant)]) + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
@@ -1,36 +1,95 @@
-from datetime import datetime
+import asyncio
+import json
+import orjson
+from datetime import datetime, timezone
 from typing import List, Optional
-from fastapi import APIRouter, HTTPException, Query, Path, Depends, status, Body
-from sqlalchemy import func
-from sqlmodel import SQLModel, Session, select
-from pydantic import ConfigDict
+from fastapi import APIRouter, HTTPException, Query, Path, Depends, status, Body, Header, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy import and_, delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.environments.inheritance import refresh_resolved, resolve_parent
 from app.environments.models.environment import Environment
-from app.core.dependencies import get_session, get_current_active_user
+from app.environments.repository import bump_revision, forget_environment
+from app.environments.revisions import render_cache, make_etag, etag_matches
+from app.environments.serializers.environment import EnvironmentRead
+from app.environments.serializers.formats import (
+    COMPRESS_MIN_SIZE, EXTENSIONS, FORMATS, compress, negotiate_encoding, negotiate_format,
+)
+from app.environments.transfer import ImportSummary, export_lines, import_records
+from app.environments.watch import change_hub
+from app.core.settings import settings
+from app.core.dependencies import get_async_session, get_current_active_user
+from app.core.pagination import CountMode, count_rows, keyset_page, schema_columns
 from app.users.models.user import User
-from app.variables.models.variable import Variable
+from app.variables.encryption import unseal_values
+from app.variables.history import revision_at, variables_as_of
+from app.variables.models.resolved_variable import ResolvedVariable
 
 router = APIRouter()
 
-class EnvironmentResponse(SQLModel):
-    id: int
-    name: str
-    description: Optional[str] = None
-    created_at: datetime
-    updated_at: datetime
-    model_config = ConfigDict(from_attributes=True)
-
 class EnvironmentCreate(SQLModel):
     name: str
     description: Optional[str] = None
+    parent: Optional[str] = None
 
 class EnvironmentUpdate(SQLModel):
     description: Optional[str] = None
+    parent: Optional[str] = None
 
 class PaginatedEnvironmentResponse(SQLModel):
-    count: int
+    count: Optional[int]
     next: Optional[str]
     previous: Optional[str]
-    results: List[EnvironmentResponse]
+    results: List[EnvironmentRead]
+
+class EnvironmentChange(SQLModel):
+    environment: str
+    revision: int
+    changed: bool
+
+ENVIRONMENT_COLUMNS = schema_columns(Environment, EnvironmentRead)
+
+
+async def update_environment_by_name(session: AsyncSession, env_name: str, payload: EnvironmentUpdate) -> Optional[Environment]:
+    """Single UPDATE ... RETURNING shared by PUT and PATCH; a new parent also rebuilds the resolved views."""
+    values = {"updated_at": datetime.utcnow()}
+    data = payload.model_dump(exclude_unset=True)
+    if "description" in data:
+        values["description"] = data["description"]
+    if "parent" in data:
+        # Cambiar el padre cambia las variables efectivas: nueva revision y fila bloqueada
+        current = await bump_revision(session, env_name)
+        if current is None:
+            return None
+        values["parent_id"] = await resolve_parent(session, current[0], data["parent"])
+    environment = (await session.exec(
+        update(Environment)
+        .where(Environment.name == env_name)
+        .values(**values)
+        .returning(Environment)
+        .execution_options(synchronize_session=False)
+    )).scalar_one_or_none()
+    if environment is not None and "parent" in data:
+        await refresh_resolved(session, environment.id)
+    return environment
+
+
+async def read_revision_and_release(session: AsyncSession, env_name: str) -> Optional[int]:
+    """Read the current revision and hand the connection back to the pool before waiting."""
+    revision = (await session.exec(
+        select(Environment.revision).where(Environment.name == env_name)
+    )).first()
+    await session.close()
+    return revision
+
+async def get_revision_and_release(session: AsyncSession, env_name: str) -> int:
+    """Like `read_revision_and_release`, 404 if the environment does not exist."""
+    revision = await read_revision_and_release(session, env_name)
+    if revision is None:
+        raise HTTPException(status_code=404, detail="Environment not found")
+    return revision
 
 
 @router.get(
@@ -39,37 +98,48 @@ class PaginatedEnvironmentResponse(SQLModel):
     summary="List Environments",
     description="Retrieve a paginated list of all environments."
 )
-def list_environments(
-    page: int = Query(1, ge=1, description="Page number (starting from 1)"),
+async def list_environments(
+    page: int = Query(1, ge=1, description="Page number (starting from 1), ignored when a cursor is given"),
     page_size: int = Query(10, ge=1, le=100, description="Number of environments per page (1-100)"),
-    session: Session = Depends(get_session),
+    cursor: Optional[str] = Query(None, description="Opaque cursor taken from `next` / `previous`"),
+    count: CountMode = Query("exact", description="Total count: exact, estimate (planner statistics) or none"),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_active_user),
 ):
     try:
-        offset = (page - 1) * page_size
-        res = session.exec(select(func.count()).select_from(Environment)).first()
-        total_count = (res[0] if isinstance(res, tuple) else int(res or 0))
-
-        environments = session.exec(
-            select(Environment)
-            .order_by(Environment.id)  
-            .offset(offset)
-            .limit(page_size)
-        ).all()
-
-        next_url = None
-        previous_url = None
-        if page * page_size < total_count:
-            next_url = f"/environments/?page={page + 1}&page_size={page_size}"
-        if page > 1:
+        total_count = await count_rows(session, Environment, count)
+
+        # Paginas numeradas (OFFSET) solo para clientes que las piden explicitamente
+        if cursor is None and page > 1:
+            offset = (page - 1) * page_size
+            environments = (await session.exec(
+                select(*ENVIRONMENT_COLUMNS)
+                .order_by(Environment.id)
+                .offset(offset)
+                .limit(page_size + 1)
+            )).all()
+
+            next_url = None
             previous_url = f"/environments/?page={page - 1}&page_size={page_size}"
+            if len(environments) > page_size:
+                next_url = f"/environments/?page={page + 1}&page_size={page_size}"
+            environments = environments[:page_size]
+        else:
+            environments, next_cursor, previous_cursor = await keyset_page(
+                session, Environment, cursor, page_size, ENVIRONMENT_COLUMNS
+            )
+            next_url = next_cursor and f"/environments/?cursor={next_cursor}&page_size={page_size}"
+            previous_url = previous_cursor and f"/environments/?cursor={previous_cursor}&page_size={page_size}"
 
-        return PaginatedEnvironmentResponse(
-            count=total_count,
-            next=next_url,
-            previous=previous_url,
-            results=environments,
-        )
+        # Filas planas serializadas por orjson, sin objetos ORM ni revalidacion por elemento
+        return ORJSONResponse({
+            "count": total_count,
+            "next": next_url,
+            "previous": previous_url,
+            "results": [row._asdict() for row in environments],
+        })
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -79,28 +149,30 @@ def list_environments(
 
 @router.post(
     "/",
-    response_model=EnvironmentResponse,
+    response_model=EnvironmentRead,
     summary="Create Environment",
     description="Create a new environment with the provided details.",
     status_code=status.HTTP_201_CREATED
 )
-def create_environment(
+async def create_environment(
     payload: EnvironmentCreate,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_active_user),
 ):
     try:
-        existing_env = session.exec(
-            select(Environment).where(Environment.name == payload.name)
-        ).first()
-        if existing_env:
-            raise HTTPException(status_code=400, detail="Environment with this name already exists")
-
-        env = Environment(**payload.model_dump())
-        env.updated_at = env.created_at 
+        env = Environment(**payload.model_dump(exclude={"parent"}))
+        env.updated_at = env.created_at
+        env.parent_id = await resolve_parent(session, None, payload.parent)
         session.add(env)
-        session.commit()
-        session.refresh(env)
+        # La restricción única sobre `name` detecta los duplicados
+        try:
+            await session.flush()
+        except IntegrityError:
+            await session.rollback()
+            raise HTTPException(status_code=400, detail="Environment with this name already exists")
+        if env.parent_id is not None:
+            await refresh_resolved(session, env.id)
+        await session.commit()
         return env
     except HTTPException:
         raise
@@ -110,22 +182,124 @@ def create_environment(
             detail=f"Internal server error: {str(e)}"
         )
 
+@router.get(
+    "/export",
+    summary="Export Environments",
+    description="Stream environments and their variables as NDJSON: one `environment` line "
+                "followed by one `variable` line per variable.",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+)
+async def export_environments(
+    name: Optional[List[str]] = Query(None, description="Only export these environments (repeatable)"),
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_active_user),
+):
+    # Se lee con un cursor del servidor y se envia por lotes: memoria constante
+    return StreamingResponse(
+        export_lines(session, name),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="environments.ndjson"'},
+    )
+
+@router.post(
+    "/import",
+    response_model=ImportSummary,
+    summary="Import Environments",
+    description="Create or update environments and variables from an NDJSON stream in the export format. "
+                "Records are written IMPORT_BATCH_SIZE at a time with one commit per chunk; on an invalid "
+                "line the chunks already committed are kept and reported.",
+    openapi_extra={"requestBody": {"required": True, "content": {"application/x-ndjson": {"schema": {"type": "string"}}}}},
+)
+async def import_environments(
+    request: Request,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_active_user),
+):
+    try:
+        return await import_records(session, request.stream(), current_user.username)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Internal server error: {str(e)}"
+        )
+
+
+@router.get(
+    "/resolve",
+    summary="Get Several Environments",
+    description="Resolved variables of every requested environment in one request: "
+                "`{\"environments\": {name: {\"revision\": ..., \"variables\": {...}}}}`, in the requested order.",
+    response_model=dict,
+    responses={404: {"description": "Some of the environments do not exist"}},
+)
+async def resolve_environments(
+    name: List[str] = Query(..., description="Environment to include (repeatable)"),
+    accept_encoding: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_active_user),
+):
+    try:
+        names = list(dict.fromkeys(name))
+        if len(names) > settings.RESOLVE_MAX_ENVIRONMENTS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"At most {settings.RESOLVE_MAX_ENVIRONMENTS} environments per request",
+            )
+        # Un solo IN para todos los entornos, con sus variables resueltas y su revision
+        rows = (await session.exec(
+            select(Environment.name, Environment.revision, ResolvedVariable.name, ResolvedVariable.value)
+            .select_from(Environment)
+            .outerjoin(ResolvedVariable, and_(
+                ResolvedVariable.environment_id == Environment.id, ResolvedVariable.deleted.is_(False)
+            ))
+            .where(Environment.name.in_(names))
+            .order_by(Environment.id, ResolvedVariable.name)
+        )).all()
+
+        found = {}
+        values = await unseal_values(session, [row[3] for row in rows])
+        for (env_name, revision, var_name, _), value in zip(rows, values):
+            environment = found.setdefault(env_name, {"revision": revision, "variables": {}})
+            if var_name is not None:
+                environment["variables"][var_name] = value
+        missing = [env_name for env_name in names if env_name not in found]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Environments not found: {', '.join(missing)}")
+
+        body = orjson.dumps({"environments": {env_name: found[env_name] for env_name in names}})
+        headers = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        encoding = negotiate_encoding(accept_encoding)
+        if encoding and len(body) >= COMPRESS_MIN_SIZE:
+            body = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type="application/json", headers=headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Internal server error: {str(e)}"
+        )
+
 
 @router.get(
     "/{env_name}/",
-    response_model=EnvironmentResponse,
+    response_model=EnvironmentRead,
     summary="Get Environment",
     description="Retrieve details of a specific environment by its name."
 )
-def get_environment(
+async def get_environment(
     env_name: str = Path(..., description="Name of the environment to retrieve"),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_active_user),
 ):
     try:
-        environment = session.exec(
+        environment = (await session.exec(
             select(Environment).where(Environment.name == env_name)
-        ).first()
+        )).first()
         if not environment:
             raise HTTPException(status_code=404, detail="Environment not found")
         return environment
@@ -140,31 +314,21 @@ def get_environment(
 
 @router.put(
     "/{env_name}/",
-    response_model=EnvironmentResponse,
+    response_model=EnvironmentRead,
     summary="Update Environment",
     description="Update an existing environment with the provided details."
 )
-def update_environment(
+async def update_environment(
     env_name: str = Path(..., description="Name of the environment to update"),
     payload: EnvironmentUpdate = Body(...),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_active_user),
 ):
     try:
-        environment = session.exec(
-            select(Environment).where(Environment.name == env_name)
-        ).first()
+        environment = await update_environment_by_name(session, env_name, payload)
         if not environment:
             raise HTTPException(status_code=404, detail="Environment not found")
-
-        data = payload.model_dump(exclude_unset=True)
-        if "description" in data:
-            environment.description = data["description"]
-
-        environment.updated_at = datetime.utcnow()
-        session.add(environment)
-        session.commit()
-        session.refresh(environment)
+        await session.commit()
         return environment
     except HTTPException:
         raise
@@ -177,31 +341,21 @@ def update_environment(
 
 @router.patch(
     "/{env_name}/",
-    response_model=EnvironmentResponse,
+    response_model=EnvironmentRead,
     summary="Partially Update Environment",
     description="Partially update an existing environment with the provided details."
 )
-def patch_environment(
+async def patch_environment(
     env_name: str = Path(..., description="Name of the environment to update"),
     payload: EnvironmentUpdate = Body(...),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_active_user),
 ):
     try:
-        environment = session.exec(
-            select(Environment).where(Environment.name == env_name)
-        ).first()
+        environment = await update_environment_by_name(session, env_name, payload)
         if not environment:
             raise HTTPException(status_code=404, detail="Environment not found")
-
-        data = payload.model_dump(exclude_unset=True)
-        if "description" in data:
-            environment.description = data["description"]
-
-        environment.updated_at = datetime.utcnow()
-        session.add(environment)
-        session.commit()
-        session.refresh(environment)
+        await session.commit()
         return environment
     except HTTPException:
         raise
@@ -211,35 +365,222 @@ def patch_environment(
             detail=f"Internal server error: {str(e)}"
         )
 
+async def render_environment(
+    session: AsyncSession,
+    env_name: str,
+    output_format: str,
+    if_none_match: Optional[str],
+    accept_encoding: Optional[str],
+) -> Response:
+    """Rendered variables of an environment, cached per revision, format and content coding."""
+    encoding = negotiate_encoding(accept_encoding)
+    fmt = FORMATS[output_format]
+    fmt_variant = None if output_format == "json" else output_format
+
+    # Solo la revision: las consultas sin cambios terminan aqui
+    current = (await session.exec(
+        select(Environment.id, Environment.revision).where(Environment.name == env_name)
+    )).first()
+
+    if not current:
+        raise HTTPException(status_code=404, detail="Environment not found")
+
+    environment_id, revision = current
+    headers = {"Cache-Control": "no-cache", "Vary": "Accept, Accept-Encoding"}
+    # La codificacion solo entra en el ETag si el cuerpo va comprimido; en una misma revision el tamano
+    # no cambia, asi que el cliente tiene uno de los dos y ambos valen sin renderizar nada
+    candidates = [make_etag(environment_id, revision, fmt_variant)]
+    if encoding:
+        candidates.append(make_etag(environment_id, revision, fmt_variant, encoding))
+    for etag in candidates:
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, **headers})
+
+    body = render_cache.get((environment_id, revision, output_format))
+    if body is None:
+        # Revision y variables ya combinadas con las heredadas, en una sola consulta
+        rows = (await session.exec(
+            select(Environment.revision, ResolvedVariable.name, ResolvedVariable.value)
+            .select_from(Environment)
+            .outerjoin(ResolvedVariable, and_(
+                ResolvedVariable.environment_id == Environment.id, ResolvedVariable.deleted.is_(False)
+            ))
+            .where(Environment.id == environment_id)
+            .order_by(ResolvedVariable.name)
+        )).all()
+        if not rows:
+            raise HTTPException(status_code=404, detail="Environment not found")
+
+        revision = rows[0][0]
+        rows = [(name, value) for _, name, value in rows if name is not None]
+        # Los valores sensibles se abren en un solo lote: una busqueda de clave por entorno de origen
+        values = await unseal_values(session, [value for _, value in rows])
+        body = fmt.render(zip([name for name, _ in rows], values)).encode("utf-8")
+        render_cache.set((environment_id, revision, output_format), body)
+
+    headers["ETag"] = make_etag(environment_id, revision, fmt_variant)
+    if encoding and len(body) >= COMPRESS_MIN_SIZE:
+        compressed = render_cache.get((environment_id, revision, output_format, encoding))
+        if compressed is None:
+            compressed = compress(body, encoding)
+            render_cache.set((environment_id, revision, output_format, encoding), compressed)
+        body = compressed
+        headers["Content-Encoding"] = encoding
+        headers["ETag"] = make_etag(environment_id, revision, fmt_variant, encoding)
+
+    return Response(content=body, media_type=fmt.media_type, headers=headers)
+
+async def render_delta(session: AsyncSession, env_name: str, since: int, accept_encoding: Optional[str]) -> Response:
+    """Variables whose resolved value changed after `since` and tombstones of the removed ones.
+
+    Falls back to every variable (`full: true`) when `since` is older than the
+    DELTA_MAX_REVISIONS tombstones are kept for, or newer than the environment.
+    """
+    current = (await session.exec(
+        select(Environment.id, Environment.revision).where(Environment.name == env_name)
+    )).first()
+    if not current:
+        raise HTTPException(status_code=404, detail="Environment not found")
+
+    environment_id, revision = current
+    full = since > revision or since < revision - settings.DELTA_MAX_REVISIONS
+    changed = ResolvedVariable.deleted.is_(False) if full else ResolvedVariable.revision > since
+    # Revision y cambios en una sola consulta: el cliente guarda una revision coherente con el delta
+    rows = (await session.exec(
+        select(Environment.revision, ResolvedVariable.name, ResolvedVariable.value, ResolvedVariable.deleted)
+        .select_from(Environment)
+        .outerjoin(ResolvedVariable, and_(ResolvedVariable.environment_id == Environment.id, changed))
+        .where(Environment.id == environment_id)
+        .order_by(ResolvedVariable.name)
+    )).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="Environment not found")
+
+    changed_rows = [(name, value) for _, name, value, deleted in rows if name is not None and not deleted]
+    values = await unseal_values(session, [value for _, value in changed_rows])
+    body = orjson.dumps({
+        "revision": rows[0][0],
+        "since": since,
+        "full": full,
+        "variables": dict(zip([name for name, _ in changed_rows], values)),
+        "deleted": [name for _, name, _, deleted in rows if deleted],
+    })
+    headers = {"Cache-Control": "no-cache", "Vary": "Accept, Accept-Encoding"}
+    encoding = negotiate_encoding(accept_encoding)
+    if encoding and len(body) >= COMPRESS_MIN_SIZE:
+        body = compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @router.get(
     "/{env_name}/.json",
     summary="Get Environment JSON Schema",
-    description="Retrieve the JSON schema of a specific environment by its name.",
+    description="Retrieve the variables of a specific environment by its name. JSON by default; "
+                "dotenv, YAML, Java properties and shell `export` lines through `?format=` or `Accept`. "
+                "Supports conditional requests through ETag / If-None-Match and gzip / brotli. "
+                "With `since` (JSON only) the response is a delta: `variables` changed after that revision, "
+                "`deleted` names and the new `revision`; `full` is true when the delta fell back to everything.",
     response_model=dict,
+    responses={
+        200: {"content": {fmt.media_type.split(";")[0]: {} for fmt in FORMATS.values()}},
+        304: {"description": "Environment unchanged since the given ETag"},
+        406: {"description": "None of the accepted media types is supported"},
+    },
 )
-def get_environment_json_schema(
+async def get_environment_json_schema(
     env_name: str = Path(..., description="Name of the environment to retrieve schema for"),
-    session: Session = Depends(get_session),
+    output_format: Optional[str] = Query(None, alias="format", description="json, dotenv, yaml, properties or shell"),
+    since: Optional[int] = Query(None, ge=0, description="Only return what changed after this revision"),
+    accept: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_active_user),
 ):
     try:
-        environment = session.exec(
-            select(Environment).where(Environment.name == env_name)
-        ).first()
-        
-        if not environment:
-            raise HTTPException(status_code=404, detail="Environment not found")
+        output_format = negotiate_format(output_format, accept)
+        if since is not None:
+            if output_format != "json":
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="`since` is only supported for JSON")
+            return await render_delta(session, env_name, since, accept_encoding)
+        return await render_environment(session, env_name, output_format, if_none_match, accept_encoding)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Internal server error: {str(e)}"
+        )
+
+@router.get(
+    "/{env_name}/.{extension}",
+    summary="Get Environment Config File",
+    description="Same as `.json` with the format taken from the extension: "
+                "`.env`, `.yaml` / `.yml`, `.properties` or `.sh` (ready to `source`).",
+    response_class=Response,
+    responses={304: {"description": "Environment unchanged since the given ETag"}},
+)
+async def get_environment_config_file(
+    env_name: str = Path(..., description="Name of the environment"),
+    extension: str = Path(..., description="env, yaml, yml, properties or sh"),
+    accept_encoding: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_active_user),
+):
+    if extension not in EXTENSIONS:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    try:
+        return await render_environment(session, env_name, EXTENSIONS[extension], if_none_match, accept_encoding)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Internal server error: {str(e)}"
+        )
 
-        variables = session.exec(
-            select(Variable).where(Variable.environment_id == environment.id)
-        ).all()
+@router.get(
+    "/{env_name}/history/.json",
+    summary="Get Environment JSON at a Point in Time",
+    description="The variables defined in the environment as they were at `revision` or at the timestamp `at` "
+                "(exactly one of them). Inherited variables are not included: every environment keeps its own history.",
+    response_model=dict,
+    responses={304: {"description": "Unchanged since the given ETag"}},
+)
+async def get_environment_json_at(
+    env_name: str = Path(..., description="Name of the environment"),
+    revision: Optional[int] = Query(None, ge=0, description="Environment revision to read"),
+    at: Optional[datetime] = Query(None, description="Read the state at this ISO timestamp (UTC when naive)"),
+    if_none_match: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_active_user),
+):
+    try:
+        if (revision is None) == (at is None):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Pass exactly one of `revision` or `at`")
+        current = (await session.exec(
+            select(Environment.id, Environment.revision).where(Environment.name == env_name)
+        )).first()
+        if not current:
+            raise HTTPException(status_code=404, detail="Environment not found")
 
+        environment_id, current_revision = current
+        if at is not None:
+            # Las fechas se guardan en UTC sin zona
+            if at.tzinfo is not None:
+                at = at.astimezone(timezone.utc).replace(tzinfo=None)
+            revision = await revision_at(session, environment_id, at)
+        elif revision > current_revision:
+            raise HTTPException(status_code=404, detail="Revision not found")
 
-        resp={}
-        for var in variables:
-            resp[var.name] = var.value
-        return resp
-    
+        # Una revision pasada no cambia: el ETag basta para revalidar
+        headers = {"ETag": make_etag(environment_id, revision, "history")}
+        if etag_matches(if_none_match, headers["ETag"]):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        variables = sorted((await variables_as_of(session, environment_id, revision)).items())
+        values = await unseal_values(session, [value for _, value in variables])
+        return ORJSONResponse(dict(zip([name for name, _ in variables], values)), headers=headers)
     except HTTPException:
         raise
     except Exception as e:
@@ -247,27 +588,146 @@ def get_environment_json_schema(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Internal server error: {str(e)}"
         )
-    
+
+@router.get(
+    "/{env_name}/watch",
+    response_model=EnvironmentChange,
+    summary="Watch Environment (long-poll)",
+    description="Hold the request until the environment revision differs from `since` "
+                "or the timeout expires. Returns immediately when `since` is omitted or stale."
+)
+async def watch_environment(
+    env_name: str = Path(..., description="Name of the environment to watch"),
+    since: Optional[int] = Query(None, ge=0, description="Last revision known by the client"),
+    timeout: int = Query(30, ge=1, le=settings.WATCH_MAX_TIMEOUT, description="Seconds to wait for a change"),
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_active_user),
+):
+    # Registrado antes de leer la revision: un cambio entre medias tambien despierta al waiter.
+    # Un nombre desconocido da 404 y sale del bloque sin dejar nada registrado
+    with change_hub.watching(env_name) as waiter:
+        revision = await get_revision_and_release(session, env_name)
+        if since is None or since != revision:
+            return EnvironmentChange(environment=env_name, revision=revision, changed=since is not None)
+        deadline = asyncio.get_running_loop().time() + timeout
+        while True:
+            try:
+                await asyncio.wait_for(waiter.wait(), deadline - asyncio.get_running_loop().time())
+            except asyncio.TimeoutError:
+                return EnvironmentChange(environment=env_name, revision=since, changed=False)
+            waiter = change_hub.waiter(env_name)
+            # Solo se lee `latest` tras despertar: lo anterior al registro (un borrado de un entorno
+            # con el mismo nombre, por ejemplo) no es de este entorno
+            change = change_hub.latest.get(env_name)
+            if change is None:
+                # Reconexion del listener o parada: sin cambio conocido
+                return EnvironmentChange(environment=env_name, revision=since, changed=False)
+            if change["deleted"]:
+                raise HTTPException(status_code=404, detail="Environment not found")
+            if change["revision"] != since:
+                return EnvironmentChange(environment=env_name, revision=change["revision"], changed=True)
+            # El cambio ya estaba en la revision leida: se sigue esperando
+
+
+def format_sse(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+@router.get(
+    "/{env_name}/watch/events",
+    summary="Watch Environment (Server-Sent Events)",
+    description="Stream a `revision` event every time the environment changes. "
+                "Resumes from `since` or the `Last-Event-ID` header.",
+    response_class=StreamingResponse,
+)
+async def stream_environment_changes(
+    env_name: str = Path(..., description="Name of the environment to watch"),
+    since: Optional[int] = Query(None, ge=0, description="Last revision known by the client"),
+    last_event_id: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_active_user),
+):
+    if since is None and last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+
+    # El 404 sale antes de empezar el stream, sin registrar nada
+    await get_revision_and_release(session, env_name)
+
+    async def events():
+        # El registro dura lo que el stream, tambien si el cliente se desconecta. Ya registrado se
+        # relee la revision: un cambio desde la primera lectura tambien cuenta
+        with change_hub.watching(env_name) as waiter:
+            revision = await read_revision_and_release(session, env_name)
+            if revision is None:
+                yield format_sse("deleted", {"environment": env_name})
+                return
+            sent = since
+            if sent != revision:
+                sent = revision
+                yield format_sse("revision", {"environment": env_name, "revision": revision}, revision)
+            while True:
+                try:
+                    await asyncio.wait_for(waiter.wait(), settings.WATCH_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                waiter = change_hub.waiter(env_name)
+                # Solo se lee `latest` tras despertar: lo anterior al registro no es de este entorno
+                change = change_hub.latest.get(env_name)
+                if change is None:
+                    continue
+                if change["deleted"]:
+                    yield format_sse("deleted", {"environment": env_name})
+                    return
+                if change["revision"] == sent:
+                    continue
+                sent = change["revision"]
+                yield format_sse("revision", {"environment": env_name, "revision": sent}, sent)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.delete(
     "/{env_name}/",
     status_code=status.HTTP_204_NO_CONTENT,
     summary="Delete Environment",
     description="Delete a specific environment by its name."
 )
-def delete_environment(
+async def delete_environment(
     env_name: str = Path(..., description="Name of the environment to delete"),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_active_user),
 ):
     try:
-        environment = session.exec(
-            select(Environment).where(Environment.name == env_name)
-        ).first()
-        if not environment:
+        # Los hijos heredan de este entorno: hay que moverlos o borrarlos antes
+        child = (await session.exec(
+            select(Environment.name)
+            .where(Environment.parent_id == select(Environment.id).where(Environment.name == env_name).scalar_subquery())
+            .limit(1)
+        )).first()
+        if child is not None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Environment '{child}' inherits from this environment",
+            )
+
+        deleted = (await session.exec(
+            delete(Environment).where(Environment.name == env_name).returning(Environment.revision)
+        )).first()
+        if deleted is None:
             raise HTTPException(status_code=404, detail="Environment not found")
 
-        session.delete(environment)
-        session.commit()
+        await change_hub.publish(session, env_name, deleted[0], deleted=True)
+        await session.commit()
+        forget_environment(env_name)
         return
     except HTTPException:
         raise
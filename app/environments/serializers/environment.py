@@ -0,0 +1,16 @@
+from datetime import datetime
+from typing import Optional
+from pydantic import ConfigDict
+from sqlmodel import SQLModel
+
+
+class EnvironmentRead(SQLModel):
+    """Response schema of an environment, read straight from ORM attributes."""
+
+    id: int
+    name: str
+    description: Optional[str] = None
+    parent_id: Optional[int] = None
+    created_at: datetime
+    updated_at: datetime
+    model_config = ConfigDict(from_attributes=True)
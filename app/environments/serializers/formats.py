@@ -0,0 +1,157 @@
+import gzip
+import json
+import re
+from typing import Callable, Iterable, Optional
+from fastapi import HTTPException, status
+
+try:
+    # Opcional: pip install brotli
+    import brotli
+except ImportError:
+    brotli = None
+
+Pairs = Iterable[tuple[str, str]]
+
+# Por debajo de este tamaño la compresion no compensa
+COMPRESS_MIN_SIZE = 500
+
+_SAFE_VALUE = re.compile(r"^[A-Za-z0-9_./:@%+,=-]*$")
+_SHELL_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def render_json(pairs: Pairs) -> str:
+    return json.dumps(dict(pairs), ensure_ascii=False, separators=(",", ":"))
+
+def render_dotenv(pairs: Pairs) -> str:
+    lines = []
+    for name, value in pairs:
+        if not _SAFE_VALUE.match(value):
+            if "'" not in value and "\n" not in value and "\r" not in value:
+                # Comillas simples: sin escapes ni interpolacion
+                value = f"'{value}'"
+            else:
+                # Comillas dobles: los loaders de dotenv interpretan \n, \" y \\ dentro de ellas, y
+                # expanden ${VAR}, asi que tambien se escapa el $
+                value = '"' + (value.replace("\\", "\\\\").replace('"', '\\"').replace("$", "\\$")
+                               .replace("\n", "\\n").replace("\r", "\\r")) + '"'
+        lines.append(f"{name}={value}\n")
+    return "".join(lines)
+
+def render_yaml(pairs: Pairs) -> str:
+    # Un escalar JSON entre comillas dobles tambien es un escalar YAML valido
+    lines = [f"{json.dumps(name, ensure_ascii=False)}: {json.dumps(value, ensure_ascii=False)}\n" for name, value in pairs]
+    return "".join(lines) or "{}\n"
+
+def _escape_properties(text: str, is_key: bool) -> str:
+    escaped = []
+    for index, char in enumerate(text):
+        if char == "\\":
+            escaped.append("\\\\")
+        elif char in "\t\n\r\f":
+            escaped.append({"\t": "\\t", "\n": "\\n", "\r": "\\r", "\f": "\\f"}[char])
+        elif char in "=:#!" or (char == " " and (is_key or index == 0)):
+            escaped.append("\\" + char)
+        elif " " <= char <= "~":
+            escaped.append(char)
+        else:
+            # Properties.load lee ISO-8859-1: el resto va como \uXXXX (pares sustitutos fuera del BMP)
+            encoded = char.encode("utf-16-be")
+            escaped.extend(f"\\u{int.from_bytes(encoded[i:i + 2], 'big'):04x}" for i in range(0, len(encoded), 2))
+    return "".join(escaped)
+
+def render_properties(pairs: Pairs) -> str:
+    return "".join(f"{_escape_properties(name, True)}={_escape_properties(value, False)}\n" for name, value in pairs)
+
+def render_shell(pairs: Pairs) -> str:
+    lines = []
+    for name, value in pairs:
+        if not _SHELL_NAME.match(name):
+            lines.append(f"# skipped {name!r}: not a valid shell variable name\n")
+            continue
+        lines.append(f"export {name}='" + value.replace("'", "'\"'\"'") + "'\n")
+    return "".join(lines)
+
+
+class Format:
+    def __init__(self, media_type: str, render: Callable[[Pairs], str], aliases: tuple = ()):
+        self.media_type = media_type
+        self.render = render
+        self.accepts = (media_type.split(";")[0],) + aliases
+
+
+FORMATS = {
+    "json": Format("application/json", render_json),
+    "dotenv": Format("text/x-dotenv; charset=utf-8", render_dotenv, ("application/x-dotenv",)),
+    "yaml": Format("application/yaml; charset=utf-8", render_yaml, ("application/x-yaml", "text/yaml", "text/x-yaml")),
+    "properties": Format("text/x-java-properties; charset=utf-8", render_properties),
+    "shell": Format("text/x-shellscript; charset=utf-8", render_shell, ("application/x-sh",)),
+}
+
+# Extension de `/{env_name}/.{extension}` -> formato
+EXTENSIONS = {"json": "json", "env": "dotenv", "yaml": "yaml", "yml": "yaml", "properties": "properties", "sh": "shell"}
+
+
+def _parse_accept(header: str) -> list[tuple[str, float]]:
+    """Media ranges of an Accept / Accept-Encoding header with their q values, best first."""
+    ranges = []
+    for position, item in enumerate(header.split(",")):
+        value, *params = [part.strip() for part in item.split(";")]
+        if not value:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, number = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(number)
+                except ValueError:
+                    q = 0.0
+        ranges.append((value.lower(), q, position))
+    ranges.sort(key=lambda item: (-item[1], item[2]))
+    return [(value, q) for value, q, _ in ranges]
+
+def negotiate_format(requested: Optional[str], accept: Optional[str], default: str = "json") -> str:
+    """`?format=` wins; otherwise the best Accept match, or 406 when nothing matches."""
+    if requested:
+        if requested not in FORMATS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown format '{requested}', expected one of: {', '.join(FORMATS)}",
+            )
+        return requested
+    if not accept:
+        return default
+    for media_range, q in _parse_accept(accept):
+        if q <= 0:
+            continue
+        if media_range == "*/*":
+            return default
+        for name, fmt in FORMATS.items():
+            if media_range in fmt.accepts:
+                return name
+        if media_range == "text/*":
+            return "dotenv"
+        if media_range == "application/*":
+            return "json"
+    raise HTTPException(
+        status_code=status.HTTP_406_NOT_ACCEPTABLE,
+        detail=f"Supported media types: {', '.join(fmt.accepts[0] for fmt in FORMATS.values())}",
+    )
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    if not accept_encoding:
+        return None
+    for coding, q in _parse_accept(accept_encoding):
+        if q <= 0:
+            continue
+        if coding == "br" and brotli is not None:
+            return "br"
+        if coding in ("gzip", "*"):
+            return "gzip"
+    return None
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body)
+    # mtime=0: la misma entrada produce siempre los mismos bytes
+    return gzip.compress(body, compresslevel=6, mtime=0)
@@ -0,0 +1,259 @@
+import json
+from datetime import datetime
+from typing import Annotated, AsyncIterator, Literal, Optional, Union
+from fastapi import HTTPException, status
+from pydantic import Field, TypeAdapter, ValidationError
+from sqlalchemy import update
+from sqlalchemy.orm import aliased
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.settings import settings
+from app.environments.inheritance import descendants_cte, refresh_resolved, resolve_parent
+from app.environments.models.environment import Environment
+from app.environments.repository import bump_revision, get_environment_id
+from app.variables.encryption import seal_rows, unseal_values
+from app.variables.history import record_changes
+from app.variables.models.variable import Variable
+from app.variables.repository import UPSERT_DIALECTS
+
+
+class EnvironmentRecord(SQLModel):
+    type: Literal["environment"]
+    name: str
+    description: Optional[str] = None
+    parent: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class VariableRecord(SQLModel):
+    type: Literal["variable"]
+    environment: str
+    name: str
+    value: str
+    description: Optional[str] = None
+    is_sensitive: bool = False
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+Record = TypeAdapter(Annotated[Union[EnvironmentRecord, VariableRecord], Field(discriminator="type")])
+
+class ImportSummary(SQLModel):
+    environments: int
+    variables: int
+    chunks: int
+
+
+def _line(record: dict) -> str:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=datetime.isoformat) + "\n"
+
+async def export_lines(session: AsyncSession, names: Optional[list[str]] = None) -> AsyncIterator[str]:
+    """One `environment` line followed by its `variable` lines, for every environment.
+
+    A single ordered join read through a server-side cursor, EXPORT_BATCH_SIZE rows at a time.
+    Parents come before the environments inheriting from them, so the dump imports in one pass.
+    """
+    tree = descendants_cte()
+    parent = aliased(Environment)
+    statement = (
+        select(
+            Environment.id, Environment.name, Environment.description, parent.name,
+            Environment.created_at, Environment.updated_at,
+            Variable.name, Variable.value, Variable.description, Variable.is_sensitive,
+            Variable.created_at, Variable.updated_at,
+        )
+        .select_from(Environment)
+        .join(tree, tree.c.id == Environment.id)
+        .outerjoin(parent, parent.id == Environment.parent_id)
+        .outerjoin(Variable, Variable.environment_id == Environment.id)
+        .order_by(tree.c.depth, Environment.id, Variable.id)
+    )
+    if names:
+        statement = statement.where(Environment.name.in_(names))
+
+    result = await session.stream(statement.execution_options(yield_per=settings.EXPORT_BATCH_SIZE))
+    current = None
+    async for partition in result.partitions():
+        lines = []
+        # El volcado lleva los valores en claro, como los recibe el import
+        values = await unseal_values(session, [row[7] for row in partition])
+        for (env_id, env_name, env_description, env_parent, env_created, env_updated,
+             name, _, description, is_sensitive, created_at, updated_at), value in zip(partition, values):
+            if env_id != current:
+                current = env_id
+                lines.append(_line({
+                    "type": "environment", "name": env_name, "description": env_description, "parent": env_parent,
+                    "created_at": env_created, "updated_at": env_updated,
+                }))
+            if name is not None:
+                lines.append(_line({
+                    "type": "variable", "environment": env_name, "name": name, "value": value,
+                    "description": description, "is_sensitive": is_sensitive,
+                    "created_at": created_at, "updated_at": updated_at,
+                }))
+        yield "".join(lines)
+
+
+async def ndjson_records(chunks: AsyncIterator[bytes]):
+    """Parse an NDJSON byte stream incrementally, yielding (line number, record)."""
+    buffer = b""
+    number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            number += 1
+            if line.strip():
+                yield number, _parse(number, line)
+    if buffer.strip():
+        yield number + 1, _parse(number + 1, buffer)
+
+def _parse(number: int, line: bytes):
+    try:
+        return Record.validate_json(line)
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Line {}: {}".format(number, "; ".join(
+                ".".join(str(part) for part in error["loc"][1:]) + f": {error['msg']}" if len(error["loc"]) > 1
+                else error["msg"]
+                for error in e.errors(include_url=False)
+            )),
+        )
+
+
+class Importer:
+    """Buffers records and writes them IMPORT_BATCH_SIZE at a time, one commit per chunk."""
+
+    def __init__(self, session: AsyncSession, changed_by: Optional[str] = None):
+        self.session = session
+        self.changed_by = changed_by
+        self.insert = UPSERT_DIALECTS[session.bind.dialect.name]
+        # Solo ids de entorno (no variables), asi la memoria no crece con el volcado
+        self.environment_ids: dict[str, int] = {}
+        self.environments: dict[str, dict] = {}
+        # Padre pedido por cada entorno que trae `parent` en el registro
+        self.parents: dict[str, Optional[str]] = {}
+        self.variables: dict[tuple[str, str], dict] = {}
+        self.summary = ImportSummary(environments=0, variables=0, chunks=0)
+
+    async def add(self, number: int, record: Union[EnvironmentRecord, VariableRecord]):
+        now = datetime.utcnow()
+        if isinstance(record, EnvironmentRecord):
+            if "parent" in record.model_fields_set:
+                if (record.parent is not None and record.parent not in self.environments
+                        and await self.environment_id(record.parent) is None):
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"Line {number}: parent environment '{record.parent}' not found",
+                    )
+                self.parents[record.name] = record.parent
+            self.environments[record.name] = {
+                "name": record.name,
+                "description": record.description,
+                "created_at": record.created_at or now,
+                "updated_at": record.updated_at or now,
+            }
+        else:
+            if record.environment not in self.environments and await self.environment_id(record.environment) is None:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Line {number}: environment '{record.environment}' not found",
+                )
+            self.variables[(record.environment, record.name)] = {
+                "name": record.name,
+                "value": record.value,
+                "description": record.description,
+                "is_sensitive": record.is_sensitive,
+                "created_at": record.created_at or now,
+                "updated_at": record.updated_at or now,
+            }
+        if len(self.environments) + len(self.variables) >= settings.IMPORT_BATCH_SIZE:
+            await self.flush()
+
+    async def environment_id(self, env_name: str) -> Optional[int]:
+        environment_id = self.environment_ids.get(env_name)
+        if environment_id is None:
+            environment_id = await get_environment_id(self.session, env_name)
+            if environment_id is not None:
+                self.environment_ids[env_name] = environment_id
+        return environment_id
+
+    async def flush(self):
+        if not self.environments and not self.variables:
+            return
+        session = self.session
+        if self.environments:
+            statement = self.insert(Environment).values(list(self.environments.values()))
+            statement = statement.on_conflict_do_update(
+                index_elements=[Environment.name],
+                set_={"description": statement.excluded.description, "updated_at": statement.excluded.updated_at},
+            ).returning(Environment.name, Environment.id)
+            self.environment_ids.update(dict((await session.exec(statement)).all()))
+
+        if self.variables:
+            # Se sellan en el propio registro: el historial guarda tambien el valor cifrado
+            for (env_name, _), values in self.variables.items():
+                await seal_rows(session, self.environment_ids[env_name], [values])
+            rows = [
+                {**values, "environment_id": self.environment_ids[env_name]}
+                for (env_name, _), values in self.variables.items()
+            ]
+            statement = self.insert(Variable).values(rows)
+            statement = statement.on_conflict_do_update(
+                index_elements=[Variable.environment_id, Variable.name],
+                set_={
+                    "value": statement.excluded.value,
+                    "description": statement.excluded.description,
+                    "is_sensitive": statement.excluded.is_sensitive,
+                    "updated_at": statement.excluded.updated_at,
+                },
+            )
+            await session.exec(statement)
+
+        # Una revision nueva por entorno tocado invalida caches y avisa a los watchers
+        revisions = {}
+        for env_name in sorted(set(self.environments) | {env_name for env_name, _ in self.variables}):
+            _, revisions[env_name] = await bump_revision(session, env_name)
+
+        # Primero toda la jerarquia y despues las vistas resueltas, que dependen de ella
+        for env_name, parent in self.parents.items():
+            environment_id = self.environment_ids[env_name]
+            await session.exec(
+                update(Environment)
+                .where(Environment.id == environment_id)
+                .values(parent_id=await resolve_parent(session, environment_id, parent))
+                .execution_options(synchronize_session=False)
+            )
+        changed: dict[str, list] = {}
+        for (env_name, _), values in self.variables.items():
+            changed.setdefault(env_name, []).append(values)
+        for env_name, values in changed.items():
+            await record_changes(
+                session, self.environment_ids[env_name], revisions[env_name], values, changed_by=self.changed_by
+            )
+        for env_name in self.parents:
+            await refresh_resolved(session, self.environment_ids[env_name])
+        for env_name, values in changed.items():
+            if env_name not in self.parents:
+                await refresh_resolved(session, self.environment_ids[env_name], {row["name"] for row in values})
+        await session.commit()
+
+        self.summary.environments += len(self.environments)
+        self.summary.variables += len(self.variables)
+        self.summary.chunks += 1
+        self.environments.clear()
+        self.parents.clear()
+        self.variables.clear()
+
+
+async def import_records(session: AsyncSession, chunks: AsyncIterator[bytes], changed_by: Optional[str] = None) -> ImportSummary:
+    importer = Importer(session, changed_by)
+    try:
+        async for number, record in ndjson_records(chunks):
+            await importer.add(number, record)
+        await importer.flush()
+    except HTTPException as e:
+        # Los bloques ya confirmados se quedan; se informa hasta donde se llego
+        await session.rollback()
+        raise HTTPException(status_code=e.status_code, detail={"error": e.detail, "imported": importer.summary.model_dump()})
+    return importer.summary
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import logging
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+from sqlalchemy import event, text
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.dependencies import invalidate_principal, principal_cache
+from app.core.settings import settings, async_engine, async_connect_args
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeHub:
+    """Fan-out of environment changes to the requests waiting in this process.
+
+    With PostgreSQL every process keeps a single LISTEN connection and all
+    waiters share it; on other databases changes are only seen locally. The
+    same channel carries the invalidations of cached principals.
+    """
+
+    def __init__(self, channel: str):
+        self.channel = channel
+        self.latest: dict[str, dict] = {}
+        self._subscribers: list[Callable[[dict], object]] = []
+        self._events: dict[str, asyncio.Event] = {}
+        # Peticiones esperando por entorno: el evento se descarta cuando se va la ultima
+        self._watchers: dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.uses_postgres = async_engine.dialect.name == "postgresql"
+
+    @contextmanager
+    def watching(self, env_name: str) -> Iterator[asyncio.Event]:
+        """Register a waiter on `env_name` for the duration of the block.
+
+        Yields the event set on the next change. Enter it before reading the revision,
+        so that a change made in between is signalled too; `latest` only describes
+        changes seen while someone was watching.
+        """
+        self._watchers[env_name] = self._watchers.get(env_name, 0) + 1
+        try:
+            yield self.waiter(env_name)
+        finally:
+            remaining = self._watchers.pop(env_name) - 1
+            if remaining:
+                self._watchers[env_name] = remaining
+            else:
+                # Con la ultima peticion se va tambien el ultimo cambio (p. ej. un borrado ya entregado)
+                self._events.pop(env_name, None)
+                self.latest.pop(env_name, None)
+
+    def waiter(self, env_name: str) -> asyncio.Event:
+        """Event set on the next change of `env_name`; only inside `watching(env_name)`."""
+        ev = self._events.get(env_name)
+        if ev is None:
+            ev = self._events[env_name] = asyncio.Event()
+        return ev
+
+    def subscribe(self, callback: Callable[[dict], object]):
+        """Call `callback(change)` for every change seen by this process."""
+        self._subscribers.append(callback)
+
+    def dispatch(self, change: dict):
+        if "principal" in change:
+            # Usuario cambiado o borrado: se vuelve a leer de la BD en su proxima peticion
+            invalidate_principal(change["principal"])
+            return
+        if change["environment"] in self._watchers:
+            self.latest[change["environment"]] = change
+        for callback in self._subscribers:
+            callback(change)
+        ev = self._events.pop(change["environment"], None)
+        if ev is not None:
+            ev.set()
+
+    async def publish(self, session: AsyncSession, env_name: str, revision: int, deleted: bool = False):
+        """Queue a change notification; it is only delivered if the transaction commits."""
+        await self._notify(session, {"environment": env_name, "revision": revision, "deleted": deleted})
+
+    async def publish_principal(self, session: AsyncSession, username: str):
+        """Drop `username` from the principal cache of every process once the transaction commits."""
+        await self._notify(session, {"principal": username})
+
+    async def _notify(self, session: AsyncSession, change: dict):
+        if self.uses_postgres:
+            await session.exec(
+                text("SELECT pg_notify(:channel, :payload)").bindparams(
+                    channel=self.channel, payload=json.dumps(change)
+                )
+            )
+        else:
+            event.listen(session.sync_session, "after_commit", lambda _: self.dispatch(change), once=True)
+
+    def _on_notification(self, connection, pid, channel, payload):
+        try:
+            self.dispatch(json.loads(payload))
+        except (ValueError, KeyError):
+            logger.warning("Ignoring malformed change notification: %r", payload)
+
+    async def _listen(self):
+        import asyncpg
+
+        dsn = async_engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        delay = 1
+        while True:
+            try:
+                connection = await asyncpg.connect(dsn, **async_connect_args)
+                try:
+                    await connection.add_listener(self.channel, self._on_notification)
+                    delay = 1
+                    closed = asyncio.Event()
+                    connection.add_termination_listener(lambda _: closed.set())
+                    await closed.wait()
+                finally:
+                    if not connection.is_closed():
+                        await connection.close()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Change listener disconnected (%s), retrying in %ss", e, delay)
+            # Los cambios perdidos durante la desconexion se recuperan con `since`; las
+            # invalidaciones de usuarios no, asi que se vacia la cache entera
+            self._wake_all()
+            principal_cache.clear()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    def _wake_all(self):
+        # Sin cambio en `latest` los que esperan vuelven a leer la revision o responden sin cambios
+        self.latest.clear()
+        events, self._events = self._events, {}
+        for ev in events.values():
+            ev.set()
+
+    async def start(self):
+        if self.uses_postgres and self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._wake_all()
+
+
+change_hub = ChangeHub(settings.WATCH_CHANNEL)
@@ -1,11 +1,18 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from sqlmodel import SQLModel, Session, select
+from fastapi import APIRouter, HTTPException, Depends, Query, status
+from fastapi.responses import ORJSONResponse
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import List, Optional
 from app.users.models.user import User
+from app.users.serializers.user import UserRead
 from app.users.models.auth import LoginRequest, Token, TokenData
 from app.core.settings import engine
 from app.core.jwt import create_access_token, verify_token
-from app.core.dependencies import get_session, get_current_active_user, get_current_user
+from app.core.pagination import CountMode, count_rows, keyset_page, schema_columns
+from app.core.dependencies import (
+    get_async_session, get_current_active_user, get_current_admin_user, get_current_user, invalidate_principal
+)
+from app.environments.watch import change_hub
 from datetime import timedelta
 import hashlib
 
@@ -17,10 +24,10 @@ def get_password_hash(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return get_password_hash(plain_password) == hashed_password
 
-def authenticate_user(session: Session, username: str, password: str):
+async def authenticate_user(session: AsyncSession, username: str, password: str):
     try:
         statement = select(User).where(User.username == username)
-        user = session.exec(statement).first()
+        user = (await session.exec(statement)).first()
         if not user:
             return False
         if not verify_password(password, user.password_hash):
@@ -29,24 +36,23 @@ def authenticate_user(session: Session, username: str, password: str):
     except Exception:
         return False
 
-class UserResponse(User):
-    pass
-
 class PaginatedUserResponse(SQLModel):
-    count: int
+    count: Optional[int]
     next: Optional[str]
     previous: Optional[str]
-    results: List[UserResponse]
+    results: List[UserRead]
+
+USER_COLUMNS = schema_columns(User, UserRead)
 
 #Inicio de sesion, retorna token
 @router.post("/auth/login", response_model=Token, summary="User Login",
           description="Authenticate a user and return a JWT token.")
-def login(
+async def login(
     login_request: LoginRequest,
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     try:
-        user = authenticate_user(session, login_request.username, login_request.password)
+        user = await authenticate_user(session, login_request.username, login_request.password)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -69,29 +75,37 @@ def login(
 # Muestra la lista de usuarios con paginacion
 @router.get("/", response_model=PaginatedUserResponse, summary="List Users", 
          description="Retrieve a paginated list of all users.")
-def list_users(
-    page: int = 1,
-    page_size: int = 10,
-    session: Session = Depends(get_session)
+async def list_users(
+    page: int = Query(1, ge=1, description="Page number (starting from 1), ignored when a cursor is given"),
+    page_size: int = Query(10, ge=1, le=100, description="Number of users per page (1-100)"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor taken from `next` / `previous`"),
+    count: CountMode = Query("exact", description="Total count: exact, estimate (planner statistics) or none"),
+    session: AsyncSession = Depends(get_async_session)
 ):
     try:
-        offset = (page - 1) * page_size
-        count_statement = select(User)
-        total_count = len(session.exec(count_statement).all())
-        statement = select(User).offset(offset).limit(page_size)
-        users = session.exec(statement).all()
-        next_url = None
-        previous_url = None
-        if page * page_size < total_count:
-            next_url = f"/users/?page={page + 1}&page_size={page_size}"
-        if page > 1:
+        total_count = await count_rows(session, User, count)
+        if cursor is None and page > 1:
+            offset = (page - 1) * page_size
+            statement = select(*USER_COLUMNS).order_by(User.id).offset(offset).limit(page_size + 1)
+            users = (await session.exec(statement)).all()
+            next_url = None
             previous_url = f"/users/?page={page - 1}&page_size={page_size}"
-        return PaginatedUserResponse(
-            count=total_count,
-            next=next_url,
-            previous=previous_url,
-            results=users
-        )
+            if len(users) > page_size:
+                next_url = f"/users/?page={page + 1}&page_size={page_size}"
+            users = users[:page_size]
+        else:
+            users, next_cursor, previous_cursor = await keyset_page(session, User, cursor, page_size, USER_COLUMNS)
+            next_url = next_cursor and f"/users/?cursor={next_cursor}&page_size={page_size}"
+            previous_url = previous_cursor and f"/users/?cursor={previous_cursor}&page_size={page_size}"
+        # Filas planas serializadas por orjson, sin objetos ORM ni revalidacion por elemento
+        return ORJSONResponse({
+            "count": total_count,
+            "next": next_url,
+            "previous": previous_url,
+            "results": [row._asdict() for row in users],
+        })
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -99,22 +113,22 @@ def list_users(
         )
 
 #Crear usuario
-@router.post("/", response_model=UserResponse, summary="Create User",
+@router.post("/", response_model=UserRead, summary="Create User",
           description="Create a new user with the provided details.", status_code=status.HTTP_201_CREATED)
-def create_user(
+async def create_user(
     user: User,
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     try:
         statement = select(User).where(User.username == user.username)
-        existing_user = session.exec(statement).first()
+        existing_user = (await session.exec(statement)).first()
         if existing_user:
             raise HTTPException(status_code=400, detail="User with this username already exists")
         user.password_hash = get_password_hash(user.password_hash)
         user.updated_at = user.created_at
         session.add(user)
-        session.commit()
-        session.refresh(user)
+        await session.commit()
+        await session.refresh(user)
         return user
     except HTTPException:
         raise
@@ -125,15 +139,15 @@ def create_user(
         )
 
 #Obtener usuario por id
-@router.get("/{user_id}/", response_model=UserResponse, summary="Get User",
+@router.get("/{user_id}/", response_model=UserRead, summary="Get User",
          description="Retrieve details of a specific user by its ID.")
-def get_user(
+async def get_user(
     user_id: int,
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     try:
         statement = select(User).where(User.id == user_id)
-        user = session.exec(statement).first()
+        user = (await session.exec(statement)).first()
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         return user
@@ -146,29 +160,61 @@ def get_user(
         )
 
 #Actualizar usuario por id
-@router.put("/{user_id}/", response_model=UserResponse, summary="Update User",
+@router.put("/{user_id}/", response_model=UserRead, summary="Update User",
          description="Update an existing user with the provided details.")
-def update_user(
+async def update_user(
     user_id: int,
     user_update: User,
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     try:
         statement = select(User).where(User.id == user_id)
-        user = session.exec(statement).first()
+        user = (await session.exec(statement)).first()
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
+        previous_username = user.username
         user.username = user_update.username
         user.password_hash = get_password_hash(user_update.password_hash)
         user.is_admin = user_update.is_admin
         from datetime import datetime
         user.updated_at = datetime.utcnow()
         session.add(user)
-        session.commit()
-        session.refresh(user)
+        # El resto de workers y replicas descartan su copia al confirmarse
+        await change_hub.publish_principal(session, previous_username)
+        await change_hub.publish_principal(session, user.username)
+        await session.commit()
+        invalidate_principal(previous_username)
+        invalidate_principal(user.username)
+        await session.refresh(user)
         return user
     except HTTPException:
         raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Internal server error: {str(e)}"
+        )
+
+#Eliminar usuario por id
+@router.delete("/{user_id}/", status_code=status.HTTP_204_NO_CONTENT, summary="Delete User",
+            description="Delete a specific user by its ID. Requires an admin user.")
+async def delete_user(
+    user_id: int,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_admin_user)
+):
+    try:
+        statement = select(User).where(User.id == user_id)
+        user = (await session.exec(statement)).first()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        await session.delete(user)
+        await change_hub.publish_principal(session, user.username)
+        await session.commit()
+        invalidate_principal(user.username)
+        return
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -0,0 +1,15 @@
+from datetime import datetime
+from pydantic import ConfigDict
+from sqlmodel import SQLModel
+
+
+class UserRead(SQLModel):
+    """Response schema of a user, read straight from ORM attributes."""
+
+    id: int
+    username: str
+    password_hash: str
+    is_admin: bool
+    created_at: datetime
+    updated_at: datetime
+    model_config = ConfigDict(from_attributes=True)
@@ -0,0 +1,153 @@
+"""Envelope encryption of sensitive variable values at rest.
+
+Each environment has its own AES-256-GCM data key, stored wrapped with the
+master key from ENCRYPTION_MASTER_KEY. Sealed values carry the id of the
+environment whose key sealed them, so the copies kept in resolved_variable,
+variable_history and environment_snapshot are opened the same way as the
+originals. Unwrapped keys are cached for ENCRYPTION_KEY_CACHE_TTL seconds and
+values are opened in batches: a read costs one key lookup per environment in
+the batch, not one per value.
+"""
+import base64
+import binascii
+import os
+from datetime import datetime
+from typing import Iterable, Optional
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.cache import TTLCache
+from app.core.settings import settings
+from app.environments.models.data_key import EnvironmentKey
+from app.variables.repository import UPSERT_DIALECTS
+
+# enc:v1:<id del entorno cuya clave sella el valor>:<nonce + texto cifrado en base64>
+SEALED_PREFIX = "enc:v1:"
+NONCE_SIZE = 12
+
+# Claves de datos ya desenvueltas, por id de entorno
+data_keys = TTLCache(maxsize=settings.ENCRYPTION_KEY_CACHE_SIZE, ttl=settings.ENCRYPTION_KEY_CACHE_TTL)
+
+
+class EncryptionError(Exception):
+    """A value or data key cannot be sealed or opened with the configured master key."""
+
+
+def encryption_enabled() -> bool:
+    return bool(settings.ENCRYPTION_MASTER_KEY)
+
+def master_key() -> AESGCM:
+    try:
+        key = base64.b64decode(settings.ENCRYPTION_MASTER_KEY, validate=True)
+    except binascii.Error:
+        key = b""
+    if len(key) != 32:
+        raise EncryptionError("ENCRYPTION_MASTER_KEY must be 32 bytes encoded in base64")
+    return AESGCM(key)
+
+def _associated_data(environment_id: int) -> bytes:
+    # Una clave envuelta copiada a la fila de otro entorno no se abre
+    return f"environment:{environment_id}".encode()
+
+def wrap_key(environment_id: int, key: bytes) -> str:
+    nonce = os.urandom(NONCE_SIZE)
+    return base64.b64encode(nonce + master_key().encrypt(nonce, key, _associated_data(environment_id))).decode()
+
+def unwrap_key(environment_id: int, wrapped: str) -> AESGCM:
+    raw = base64.b64decode(wrapped)
+    try:
+        return AESGCM(master_key().decrypt(raw[:NONCE_SIZE], raw[NONCE_SIZE:], _associated_data(environment_id)))
+    except InvalidTag:
+        raise EncryptionError(f"Cannot unwrap the data key of environment {environment_id}: wrong master key")
+
+
+def sealed_key_id(value: Optional[str]) -> Optional[int]:
+    """Id of the environment whose data key sealed `value`; None for plain values."""
+    if not value or not value.startswith(SEALED_PREFIX):
+        return None
+    key_id, _, _ = value[len(SEALED_PREFIX):].partition(":")
+    return int(key_id) if key_id.isdigit() else None
+
+def seal(key: AESGCM, key_id: int, value: str) -> str:
+    nonce = os.urandom(NONCE_SIZE)
+    sealed = base64.b64encode(nonce + key.encrypt(nonce, value.encode("utf-8"), None)).decode()
+    return f"{SEALED_PREFIX}{key_id}:{sealed}"
+
+def unseal(keys: dict, value: Optional[str]) -> Optional[str]:
+    key_id = sealed_key_id(value)
+    if key_id is None:
+        return value
+    if key_id not in keys:
+        raise EncryptionError(f"No data key for environment {key_id}")
+    raw = base64.b64decode(value.rpartition(":")[2])
+    try:
+        return keys[key_id].decrypt(raw[:NONCE_SIZE], raw[NONCE_SIZE:], None).decode("utf-8")
+    except InvalidTag:
+        raise EncryptionError(f"Cannot decrypt a value sealed with the data key of environment {key_id}")
+
+
+async def load_keys(session: AsyncSession, key_ids: Iterable[int]) -> dict:
+    """Unwrapped data keys by environment id: from the cache, the rest with a single query."""
+    keys, missing = {}, []
+    for key_id in set(key_ids):
+        key = data_keys.get(key_id)
+        if key is None:
+            missing.append(key_id)
+        else:
+            keys[key_id] = key
+    if missing:
+        rows = (await session.exec(
+            select(EnvironmentKey.environment_id, EnvironmentKey.wrapped_key)
+            .where(EnvironmentKey.environment_id.in_(missing))
+        )).all()
+        for key_id, wrapped in rows:
+            keys[key_id] = unwrap_key(key_id, wrapped)
+            data_keys.set(key_id, keys[key_id])
+    return keys
+
+async def environment_key(session: AsyncSession, environment_id: int) -> AESGCM:
+    """Data key of an environment, created on its first sensitive value."""
+    keys = await load_keys(session, [environment_id])
+    if environment_id not in keys:
+        insert = UPSERT_DIALECTS[session.bind.dialect.name](EnvironmentKey).values(
+            environment_id=environment_id,
+            wrapped_key=wrap_key(environment_id, AESGCM.generate_key(bit_length=256)),
+            created_at=datetime.utcnow(),
+        )
+        # Si otra transaccion la creo a la vez se usa la suya
+        await session.exec(insert.on_conflict_do_nothing(index_elements=[EnvironmentKey.environment_id]))
+        keys = await load_keys(session, [environment_id])
+    return keys[environment_id]
+
+
+async def seal_rows(session: AsyncSession, environment_id: int, rows: Iterable[dict]):
+    """Seal in place the `value` of the sensitive rows about to be written to an environment.
+
+    Without a master key values are written as they come. Plain values that look
+    sealed are sealed too, so every stored value with the prefix can be opened.
+    """
+    if not encryption_enabled():
+        return
+    key = None
+    for row in rows:
+        value = row.get("value")
+        if value is None or not (row.get("is_sensitive") or value.startswith(SEALED_PREFIX)):
+            continue
+        if key is None:
+            key = await environment_key(session, environment_id)
+        row["value"] = seal(key, environment_id, value)
+
+async def seal_value(session: AsyncSession, environment_id: int, value: str, is_sensitive: Optional[bool]) -> str:
+    row = {"value": value, "is_sensitive": is_sensitive}
+    await seal_rows(session, environment_id, [row])
+    return row["value"]
+
+async def unseal_values(session: AsyncSession, values: Iterable[Optional[str]]) -> list:
+    """Open a batch of stored values; plain ones come back unchanged without touching the database."""
+    values = list(values)
+    key_ids = {key_id for key_id in map(sealed_key_id, values) if key_id is not None}
+    if not key_ids:
+        return values
+    keys = await load_keys(session, key_ids)
+    return [unseal(keys, value) for value in values]
@@ -0,0 +1,121 @@
+from datetime import datetime
+from typing import Iterable, Optional
+from sqlalchemy import func, insert
+from sqlalchemy.engine import Connection
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.settings import settings
+from app.environments.models.environment import Environment
+from app.environments.models.snapshot import EnvironmentSnapshot
+from app.variables.models.variable import Variable
+from app.variables.models.variable_history import VariableHistory
+
+INSERT_CHUNK_SIZE = 1000
+
+
+async def record_changes(
+    session: AsyncSession,
+    environment_id: int,
+    revision: int,
+    changed: Iterable[dict] = (),
+    deleted: Iterable[str] = (),
+    changed_by: Optional[str] = None,
+):
+    """Append the history rows of a write, inside the caller's transaction.
+
+    `changed` holds the new state of each written variable (name, value, description,
+    is_sensitive) and `deleted` the names removed. Every HISTORY_SNAPSHOT_INTERVAL
+    revisions the whole environment is snapshotted, which bounds the replay of
+    point-in-time reads.
+    """
+    now = datetime.utcnow()
+    base = {"environment_id": environment_id, "revision": revision, "changed_at": now, "changed_by": changed_by}
+    rows = [
+        {**base, "name": values["name"], "value": values["value"], "description": values.get("description"),
+         "is_sensitive": bool(values.get("is_sensitive")), "deleted": False}
+        for values in changed
+    ]
+    rows.extend(
+        {**base, "name": name, "value": None, "description": None, "is_sensitive": False, "deleted": True}
+        for name in deleted
+    )
+    if not rows:
+        return
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        await session.exec(insert(VariableHistory).values(rows[start:start + INSERT_CHUNK_SIZE]))
+
+    last_snapshot = (await session.exec(
+        select(func.max(EnvironmentSnapshot.revision)).where(EnvironmentSnapshot.environment_id == environment_id)
+    )).first()
+    if revision - (last_snapshot or 0) >= settings.HISTORY_SNAPSHOT_INTERVAL:
+        variables = dict((await session.exec(
+            select(Variable.name, Variable.value).where(Variable.environment_id == environment_id)
+        )).all())
+        await session.exec(insert(EnvironmentSnapshot).values(
+            environment_id=environment_id, revision=revision, variables=variables, created_at=now,
+        ))
+
+
+async def revision_at(session: AsyncSession, environment_id: int, at: datetime) -> int:
+    """Last revision that changed the environment's variables at or before `at` (0 if none)."""
+    changed = (await session.exec(
+        select(func.max(VariableHistory.revision))
+        .where(VariableHistory.environment_id == environment_id, VariableHistory.changed_at <= at)
+    )).first()
+    snapshot = (await session.exec(
+        select(func.max(EnvironmentSnapshot.revision))
+        .where(EnvironmentSnapshot.environment_id == environment_id, EnvironmentSnapshot.created_at <= at)
+    )).first()
+    return max(changed or 0, snapshot or 0)
+
+
+async def variables_as_of(session: AsyncSession, environment_id: int, revision: int) -> dict[str, str]:
+    """Own variables of the environment at `revision`: the nearest snapshot plus the history after it."""
+    snapshot = (await session.exec(
+        select(EnvironmentSnapshot.revision, EnvironmentSnapshot.variables)
+        .where(EnvironmentSnapshot.environment_id == environment_id, EnvironmentSnapshot.revision <= revision)
+        .order_by(EnvironmentSnapshot.revision.desc())
+        .limit(1)
+    )).first()
+    start, variables = (snapshot[0], dict(snapshot[1])) if snapshot else (0, {})
+
+    # Usa el indice (environment_id, revision): a lo sumo HISTORY_SNAPSHOT_INTERVAL revisiones
+    changes = (await session.exec(
+        select(VariableHistory.name, VariableHistory.value, VariableHistory.deleted)
+        .where(
+            VariableHistory.environment_id == environment_id,
+            VariableHistory.revision > start,
+            VariableHistory.revision <= revision,
+        )
+        .order_by(VariableHistory.revision, VariableHistory.id)
+    )).all()
+    for name, value, deleted in changes:
+        if deleted:
+            variables.pop(name, None)
+        else:
+            variables[name] = value
+    return variables
+
+
+def backfill_snapshots(connection: Connection):
+    """Snapshot every environment once for databases created before the history existed.
+
+    Runs inside the caller's transaction (the migration one); a failure rolls all of it back.
+    """
+    if connection.execute(select(EnvironmentSnapshot.id).limit(1)).first() is not None:
+        return
+    if connection.execute(select(VariableHistory.id).limit(1)).first() is not None:
+        return
+    variables: dict[int, dict] = {}
+    for environment_id, name, value in connection.execute(select(Variable.environment_id, Variable.name, Variable.value)):
+        variables.setdefault(environment_id, {})[name] = value
+    if not variables:
+        return
+    now = datetime.utcnow()
+    rows = [
+        {"environment_id": environment_id, "revision": revision, "variables": variables.get(environment_id, {}),
+         "created_at": now}
+        for environment_id, revision in connection.execute(select(Environment.id, Environment.revision))
+    ]
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        connection.execute(insert(EnvironmentSnapshot).values(rows[start:start + INSERT_CHUNK_SIZE]))
@@ -0,0 +1,33 @@
+from typing import Optional
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Column, ForeignKey, Index, Integer, UniqueConstraint
+
+
+class ResolvedVariable(SQLModel, table=True):
+    __tablename__ = "resolved_variable"
+    # Vista materializada: variables del entorno combinadas con las de sus ancestros
+    __table_args__ = (
+        UniqueConstraint("environment_id", "name", name="uq_resolved_variable_environment_name"),
+        # Delta sync: filas cambiadas despues de una revision
+        Index("ix_resolved_variable_environment_revision", "environment_id", "revision"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+
+    environment_id: int = Field(
+        sa_column=Column(Integer, ForeignKey("environments.id", ondelete="CASCADE"), nullable=False),
+        description="Entorno para el que se sirve la variable resuelta."
+    )
+
+    name: str = Field(nullable=False, description="Nombre de la variable.")
+
+    value: str = Field(nullable=False, description="Valor efectivo tras aplicar la herencia.")
+
+    source_environment_id: int = Field(
+        sa_column=Column(Integer, ForeignKey("environments.id", ondelete="CASCADE"), nullable=False),
+        description="Entorno de la cadena que define el valor efectivo."
+    )
+
+    revision: int = Field(default=0, nullable=False, description="Revision del entorno en la que cambio el valor efectivo.")
+
+    deleted: bool = Field(default=False, nullable=False, description="Tombstone: la variable dejo de resolverse en esa revision.")
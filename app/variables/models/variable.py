@@ -2,19 +2,20 @@
 from datetime import datetime
 from typing import Optional, TYPE_CHECKING
 from sqlmodel import SQLModel, Field, Relationship
-from sqlalchemy import Column, ForeignKey, Integer
+from sqlalchemy import Column, ForeignKey, Integer, UniqueConstraint
 
 if TYPE_CHECKING:
     from app.environments.models.environment import Environment
 
 class Variable(SQLModel, table=True):
     __tablename__ = "variable"
+    # El nombre es único dentro de cada entorno (necesario para los upserts por lote)
+    __table_args__ = (UniqueConstraint("environment_id", "name", name="uq_variable_environment_name"),)
 
     id: Optional[int] = Field(default=None, primary_key=True)
 
     name: str = Field(
         index=True,
-        unique=True,
         nullable=False,
         description="Nombre único de la variable en un entorno (slug URL)."
     )
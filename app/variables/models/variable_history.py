@@ -0,0 +1,40 @@
+from datetime import datetime
+from typing import Optional
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Column, ForeignKey, Index, Integer
+
+
+class VariableHistory(SQLModel, table=True):
+    __tablename__ = "variable_history"
+    # Solo se inserta: una fila por variable y revision del entorno que la cambio
+    __table_args__ = (
+        Index("ix_variable_history_environment_revision", "environment_id", "revision"),
+        Index("ix_variable_history_environment_name_revision", "environment_id", "name", "revision"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+
+    environment_id: int = Field(
+        sa_column=Column(Integer, ForeignKey("environments.id", ondelete="CASCADE"), nullable=False),
+        description="Entorno de la variable."
+    )
+
+    revision: int = Field(nullable=False, description="Revision del entorno que produjo el cambio.")
+
+    name: str = Field(nullable=False, description="Nombre de la variable.")
+
+    value: Optional[str] = Field(default=None, description="Valor tras el cambio (nulo si se borro).")
+
+    description: Optional[str] = Field(default=None, description="Descripcion tras el cambio.")
+
+    is_sensitive: bool = Field(default=False, nullable=False, description="Indica si la variable es sensible.")
+
+    deleted: bool = Field(default=False, nullable=False, description="La variable se borro en esta revision.")
+
+    changed_at: datetime = Field(
+        default_factory=datetime.utcnow,
+        nullable=False,
+        description="Fecha del cambio (ISO DateTime)."
+    )
+
+    changed_by: Optional[str] = Field(default=None, description="Usuario que hizo el cambio.")
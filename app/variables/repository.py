@@ -0,0 +1,50 @@
+from typing import Optional
+from fastapi import HTTPException, status
+from sqlalchemy import delete, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.environments.models.environment import Environment
+from app.variables.models.variable import Variable
+
+
+# INSERT ... ON CONFLICT de cada dialecto soportado
+UPSERT_DIALECTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+async def get_variable(session: AsyncSession, env_name: str, var_name: str) -> Optional[Variable]:
+    """Resolve (env_name, var_name) with a single joined query."""
+    return (await session.exec(
+        select(Variable)
+        .join(Environment, Variable.environment_id == Environment.id)
+        .where(Environment.name == env_name, Variable.name == var_name)
+    )).first()
+
+async def insert_variable(session: AsyncSession, environment_id: int, values: dict) -> Variable:
+    return (await session.exec(
+        insert(Variable).values(environment_id=environment_id, **values).returning(Variable)
+    )).scalar_one()
+
+async def update_variable(session: AsyncSession, environment_id: int, var_name: str, values: dict) -> Optional[Variable]:
+    return (await session.exec(
+        update(Variable)
+        .where(Variable.environment_id == environment_id, Variable.name == var_name)
+        .values(**values)
+        .returning(Variable)
+        .execution_options(synchronize_session=False)
+    )).scalar_one_or_none()
+
+async def delete_variable(session: AsyncSession, environment_id: int, var_name: str) -> bool:
+    deleted = (await session.exec(
+        delete(Variable)
+        .where(Variable.environment_id == environment_id, Variable.name == var_name)
+        .returning(Variable.id)
+        .execution_options(synchronize_session=False)
+    )).first()
+    return deleted is not None
+
+async def raise_not_found(session: AsyncSession, env_name: str, detail: str = "Variable not found"):
+    """Slow path after a miss: tell a missing environment apart from a missing variable."""
+    environment_id = (await session.exec(select(Environment.id).where(Environment.name == env_name))).first()
+    if environment_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Environment not found")
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=detail)
@@ -1,179 +1,434 @@
+import orjson
 from datetime import datetime
+from urllib.parse import quote, urlencode
 from fastapi import APIRouter, Depends, HTTPException, Path, Query, status
-from sqlmodel import Session, select
-from typing import List, Optional
-from app.core.dependencies import get_session, get_current_active_user
-from app.environments.models.environment import Environment
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Literal, Optional
+from app.core.settings import settings
+from app.core.dependencies import get_async_session, get_current_active_user
+from app.core.pagination import decode_cursor, encode_cursor, schema_columns
+from app.environments.inheritance import refresh_resolved
+from app.environments.repository import bump_revision, get_environment_id
+from app.variables import repository
+from app.variables.encryption import encryption_enabled, seal_rows, sealed_key_id, unseal_values
+from app.variables.history import record_changes
 from app.variables.models.variable import Variable
+from app.variables.models.variable_history import VariableHistory
+from app.variables.serializers.variable import VariableHistoryRead, VariableRead
 from app.users.models.user import User
 from sqlmodel import SQLModel
 
 router = APIRouter()
 
+async def read_variable(session: AsyncSession, variable: Variable) -> VariableRead:
+    """Response of a stored variable, with a sealed value opened."""
+    read = VariableRead.model_validate(variable)
+    read.value = (await unseal_values(session, [read.value]))[0]
+    return read
+
 # Listar variables de un entorno
-@router.post("/", response_model=Variable, summary="Create a Variable in an Environment", status_code=status.HTTP_201_CREATED)
-def create_variable_for_environment(
+@router.post("/", response_model=VariableRead, summary="Create a Variable in an Environment", status_code=status.HTTP_201_CREATED)
+async def create_variable_for_environment(
     variable: Variable,
     env_name: str = Path(..., description="Name of the environment"), 
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Crea una nueva variable y la asocia a un entorno existente.
     """
-    # Busca si el entorno existe
-    env_statement = select(Environment).where(Environment.name == env_name)
-    environment = session.exec(env_statement).first()
-    if not environment:
+    # El bump de revision valida el entorno y bloquea su fila hasta el commit
+    bumped = await bump_revision(session, env_name)
+    if bumped is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Environment not found")
+    environment_id, revision = bumped
 
-    # Verifica que no exista ya una variable con ese nombre en este entorno
-    var_statement = select(Variable).where(Variable.name == variable.name, Variable.environment_id == environment.id)
-    existing_variable = session.exec(var_statement).first()
-    if existing_variable:
+    values = variable.model_dump(exclude={"id", "environment_id"})
+    await seal_rows(session, environment_id, [values])
+    # La restricción única (environment_id, name) detecta los duplicados
+    try:
+        created = await repository.insert_variable(session, environment_id, values)
+        await record_changes(session, environment_id, revision, [created.model_dump()], changed_by=current_user.username)
+        await refresh_resolved(session, environment_id, [created.name])
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Variable '{variable.name}' already exists in this environment.")
 
-    # Asocia la variable con el ID del entorno encontrado
-    variable.environment_id = environment.id
-    
-    session.add(variable)
-    session.commit()
-    session.refresh(variable)
-    
-    return variable
-
-@router.get("/", response_model=List[Variable], summary="List Variables for an Environment")
-def list_variables_for_environment(
+    return VariableRead.model_validate(created).model_copy(update={"value": variable.value})
+
+class VariableOperation(SQLModel):
+    op: Literal["create", "update", "upsert", "delete"]
+    name: str
+    value: Optional[str] = None
+    description: Optional[str] = None
+    # Sin indicar, update / upsert conservan el valor guardado; create usa False
+    is_sensitive: Optional[bool] = None
+
+class VariableBatchRequest(SQLModel):
+    operations: List[VariableOperation]
+    all_or_nothing: bool = False
+
+class VariableOperationResult(SQLModel):
+    name: str
+    op: str
+    status: Literal["created", "updated", "deleted", "error"]
+    detail: Optional[str] = None
+
+class VariableBatchResponse(SQLModel):
+    revision: int
+    results: List[VariableOperationResult]
+
+@router.post("/batch", response_model=VariableBatchResponse, summary="Create, Update or Delete Variables in Bulk")
+async def batch_variables(
+    batch: VariableBatchRequest,
     env_name: str = Path(..., description="Name of the environment"),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_active_user)
 ):
     """
-    Obtiene todas las variables para un entorno específico.
+    Aplica un lote de operaciones en una sola transacción: un upsert para las altas y
+    modificaciones y un DELETE para las bajas. Devuelve el resultado de cada operación.
     """
-    environment = session.exec(select(Environment).where(Environment.name == env_name)).first()
-    if not environment:
+    if len(batch.operations) > settings.BATCH_MAX_OPERATIONS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"At most {settings.BATCH_MAX_OPERATIONS} operations per batch.")
+
+    bumped = await bump_revision(session, env_name)
+    if bumped is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Environment not found")
-    
-    # Devuelve solo las variables asociadas a ese entorno
-    return environment.variables
+    environment_id, revision = bumped
+
+    names = {operation.name for operation in batch.operations}
+    # Nombre -> is_sensitive de las variables que ya existen
+    existing = dict((await session.exec(
+        select(Variable.name, Variable.is_sensitive)
+        .where(Variable.environment_id == environment_id, Variable.name.in_(names))
+    )).all())
+
+    # Valida cada operación contra el estado actual, sin tocar la BD
+    now = datetime.utcnow()
+    results, upserts, deletes, seen = [], {}, set(), set()
+    for operation in batch.operations:
+        error = None
+        if operation.name in seen:
+            error = "Duplicated variable name in this batch."
+        elif operation.op == "create" and operation.name in existing:
+            error = f"Variable '{operation.name}' already exists in this environment."
+        elif operation.op in ("update", "delete") and operation.name not in existing:
+            error = "Variable not found"
+        elif operation.op != "delete" and operation.value is None:
+            error = "A value is required."
+        seen.add(operation.name)
+
+        if error:
+            results.append(VariableOperationResult(name=operation.name, op=operation.op, status="error", detail=error))
+            continue
+        if operation.op == "delete":
+            deletes.add(operation.name)
+            results.append(VariableOperationResult(name=operation.name, op=operation.op, status="deleted"))
+            continue
+        is_sensitive = operation.is_sensitive
+        if is_sensitive is None:
+            is_sensitive = existing.get(operation.name, False)
+        upserts[operation.name] = {
+            "environment_id": environment_id,
+            "name": operation.name,
+            "value": operation.value,
+            "description": operation.description,
+            "is_sensitive": is_sensitive,
+            "created_at": now,
+            "updated_at": now,
+        }
+        results.append(VariableOperationResult(
+            name=operation.name, op=operation.op,
+            status="updated" if operation.name in existing else "created",
+        ))
 
-@router.get("/{var_name}", response_model=Variable, summary="Get a Specific Variable")
-def get_variable(
+    failed = any(result.status == "error" for result in results)
+    if failed and batch.all_or_nothing:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=[result.model_dump() for result in results if result.status == "error"],
+        )
+    if not upserts and not deletes:
+        # Nada que escribir: se deshace el bump de revision
+        await session.rollback()
+        return VariableBatchResponse(revision=revision - 1, results=results)
+
+    if upserts:
+        await seal_rows(session, environment_id, upserts.values())
+        insert = repository.UPSERT_DIALECTS[session.bind.dialect.name](Variable)
+        statement = insert.values(list(upserts.values()))
+        statement = statement.on_conflict_do_update(
+            index_elements=[Variable.environment_id, Variable.name],
+            set_={
+                "value": statement.excluded.value,
+                "description": statement.excluded.description,
+                "is_sensitive": statement.excluded.is_sensitive,
+                "updated_at": statement.excluded.updated_at,
+            },
+        )
+        await session.exec(statement)
+    if deletes:
+        await session.exec(
+            delete(Variable).where(Variable.environment_id == environment_id, Variable.name.in_(deletes))
+        )
+    await record_changes(session, environment_id, revision, upserts.values(), deletes, current_user.username)
+    await refresh_resolved(session, environment_id, set(upserts) | deletes)
+
+    await session.commit()
+
+    return VariableBatchResponse(revision=revision, results=results)
+
+# Columnas que se pueden pedir con `fields=`
+VARIABLE_FIELDS = ("id", "name", "value", "description", "is_sensitive", "created_at", "updated_at", "environment_id")
+
+def parse_fields(fields: Optional[str]) -> list[str]:
+    if not fields:
+        return list(VARIABLE_FIELDS)
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in VARIABLE_FIELDS]
+    if unknown or not requested:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(VARIABLE_FIELDS)}",
+        )
+    return requested
+
+def encode_row(row) -> bytes:
+    # orjson serializa datetime en ISO 8601 sin pasar por un dict intermedio de strings
+    return orjson.dumps(dict(row))
+
+@router.get("/", response_model=List[VariableRead], summary="List Variables for an Environment")
+async def list_variables_for_environment(
+    env_name: str = Path(..., description="Name of the environment"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Maximum number of variables to return"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor taken from the `Link: rel=next` header"),
+    prefix: Optional[str] = Query(None, description="Only variables whose name starts with this prefix"),
+    is_sensitive: Optional[bool] = Query(None, description="Filter by the is_sensitive flag"),
+    fields: Optional[str] = Query(None, description="Comma separated list of fields to return"),
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Obtiene las variables de un entorno, ordenadas por id. La respuesta se envía en streaming
+    y solo se leen de la BD las columnas pedidas en `fields`.
+    """
+    columns = [getattr(Variable, field) for field in parse_fields(fields)]
+    environment_id = await get_environment_id(session, env_name)
+    if environment_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Environment not found")
+
+    conditions = [Variable.environment_id == environment_id]
+    if cursor:
+        direction, last_id = decode_cursor(cursor)
+        if direction != "a":
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        conditions.append(Variable.id > last_id)
+    if prefix:
+        conditions.append(Variable.name.startswith(prefix, autoescape=True))
+    if is_sensitive is not None:
+        conditions.append(Variable.is_sensitive == is_sensitive)
+
+    headers = {}
+    statement = select(*columns).where(*conditions).order_by(Variable.id)
+    if limit:
+        # Sondeo por índice: id de la última fila de la página y si existe una más
+        probe = (await session.exec(
+            select(Variable.id).where(*conditions).order_by(Variable.id).offset(limit - 1).limit(2)
+        )).all()
+        if len(probe) == 2:
+            query = urlencode({k: v for k, v in (
+                ("limit", limit), ("cursor", encode_cursor("a", probe[0])), ("prefix", prefix),
+                ("is_sensitive", None if is_sensitive is None else str(is_sensitive).lower()), ("fields", fields),
+            ) if v is not None})
+            headers["Link"] = f'</environments/{quote(env_name, safe="")}/variables/?{query}>; rel="next"'
+        statement = statement.limit(limit)
+
+    async def rows():
+        result = await session.stream(statement.execution_options(yield_per=500))
+        yield b"["
+        first = True
+        async for partition in result.mappings().partitions():
+            if "value" in partition[0]:
+                values = [row["value"] for row in partition]
+                if any(sealed_key_id(value) is not None for value in values):
+                    # Los valores sellados del lote se abren juntos, con una sola busqueda de clave
+                    values = await unseal_values(session, values)
+                    partition = [{**row, "value": value} for row, value in zip(partition, values)]
+            chunk = b",".join(encode_row(row) for row in partition)
+            yield chunk if first else b"," + chunk
+            first = False
+        yield b"]"
+
+    return StreamingResponse(rows(), media_type="application/json", headers=headers)
+
+@router.get("/{var_name}", response_model=VariableRead, summary="Get a Specific Variable")
+async def get_variable(
     env_name: str = Path(..., description="Name of the environment"),
     var_name: str = Path(..., description="Name of the variable"),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Obtiene los detalles de una variable específica dentro de un entorno.
     """
-    # asegurar que el entorno existe
-    environment = session.exec(select(Environment).where(Environment.name == env_name)).first()
-    if not environment:
+    # entorno y variable en una sola consulta; el 404 exacto solo se calcula si falla
+    variable = await repository.get_variable(session, env_name, var_name)
+    if not variable:
+        await repository.raise_not_found(session, env_name, "Variable not found in this environment")
+
+    return await read_variable(session, variable)
+
+HISTORY_COLUMNS = schema_columns(VariableHistory, VariableHistoryRead)
+
+@router.get("/{var_name}/history", response_model=List[VariableHistoryRead], summary="List the History of a Variable")
+async def list_variable_history(
+    env_name: str = Path(..., description="Name of the environment"),
+    var_name: str = Path(..., description="Name of the variable"),
+    limit: int = Query(50, ge=1, le=1000, description="Maximum number of entries to return"),
+    before: Optional[int] = Query(None, ge=1, description="Only entries older than this revision"),
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Devuelve los cambios de una variable, del más reciente al más antiguo. Incluye los
+    borrados, así que sirve también para variables que ya no existen.
+    """
+    environment_id = await get_environment_id(session, env_name)
+    if environment_id is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Environment not found")
 
-    # busca la variable por su nombre en ese entorno
-    statement = select(Variable).where(Variable.name == var_name, Variable.environment_id == environment.id)
-    variable = session.exec(statement).first()
-    if not variable:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Variable not found in this environment")
-    
-    return variable
+    conditions = [VariableHistory.environment_id == environment_id, VariableHistory.name == var_name]
+    if before is not None:
+        conditions.append(VariableHistory.revision < before)
+    # Índice (environment_id, name, revision): la página se lee sin ordenar en memoria
+    entries = (await session.exec(
+        select(*HISTORY_COLUMNS).where(*conditions).order_by(VariableHistory.revision.desc()).limit(limit)
+    )).all()
+
+    headers = {}
+    if len(entries) == limit:
+        query = urlencode({"limit": limit, "before": entries[-1].revision})
+        # Los nombres pueden llevar /, ?, # o espacios: se codifican igual que el cursor
+        headers["Link"] = (
+            f'</environments/{quote(env_name, safe="")}/variables/{quote(var_name, safe="")}/history?{query}>; rel="next"'
+        )
+    values = await unseal_values(session, [entry.value for entry in entries])
+    return ORJSONResponse(
+        [{**entry._asdict(), "value": value} for entry, value in zip(entries, values)], headers=headers
+    )
 
 class VariableUpdate(SQLModel):
     value: str
     description: Optional[str] = None
     is_sensitive: Optional[bool] = None
 
-@router.put("/{var_name}", response_model=Variable, summary="Update a Variable")
-def update_variable(
+@router.put("/{var_name}", response_model=VariableRead, summary="Update a Variable")
+async def update_variable(
     variable_update: VariableUpdate,
     env_name: str = Path(..., description="Name of the environment"),
     var_name: str = Path(..., description="Name of the variable to update"),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Actualiza completamente una variable existente en un entorno.
     """
-    environment = session.exec(select(Environment).where(Environment.name == env_name)).first()
-    if not environment:
+    bumped = await bump_revision(session, env_name)
+    if bumped is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Environment not found")
 
-    statement = select(Variable).where(Variable.name == var_name, Variable.environment_id == environment.id)
-    db_variable = session.exec(statement).first()
+    values = {
+        "value": variable_update.value,
+        "description": variable_update.description,
+        "updated_at": datetime.utcnow(),
+    }
+    if variable_update.is_sensitive is not None:
+        values["is_sensitive"] = variable_update.is_sensitive
+    elif encryption_enabled():
+        # Sin is_sensitive se conserva el de la fila, y de el depende sellar el valor
+        values["is_sensitive"] = (await session.exec(
+            select(Variable.is_sensitive).where(Variable.environment_id == bumped[0], Variable.name == var_name)
+        )).first()
+    await seal_rows(session, bumped[0], [values])
+    # UPDATE ... RETURNING con los datos del payload
+    db_variable = await repository.update_variable(session, bumped[0], var_name, values)
     if not db_variable:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Variable not found")
 
-    # Actualiza los campos del objeto de la BD con los datos del payload
-    db_variable.value = variable_update.value
-    db_variable.description = variable_update.description
-    db_variable.is_sensitive = variable_update.is_sensitive
-    db_variable.updated_at = datetime.utcnow()
-
-    session.add(db_variable)
-    session.commit()
-    session.refresh(db_variable)
-    
-    return db_variable
+    await record_changes(session, *bumped, [db_variable.model_dump()], changed_by=current_user.username)
+    await refresh_resolved(session, bumped[0], [var_name])
+    await session.commit()
+    return VariableRead.model_validate(db_variable).model_copy(update={"value": variable_update.value})
 
 class VariablePatch(SQLModel):
     value: Optional[str] = None
     description: Optional[str] = None
     is_sensitive: Optional[bool] = None
 
-@router.patch("/{var_name}", response_model=Variable, summary="Partially Update a Variable")
-def patch_variable(
+@router.patch("/{var_name}", response_model=VariableRead, summary="Partially Update a Variable")
+async def patch_variable(
     variable_patch: VariablePatch,
     env_name: str = Path(..., description="Name of the environment"),
     var_name: str = Path(..., description="Name of the variable to update"),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Actualiza parcialmente una variable existente. Solo los campos proporcionados se modificarán.
     """
-    environment = session.exec(select(Environment).where(Environment.name == env_name)).first()
-    if not environment:
+    bumped = await bump_revision(session, env_name)
+    if bumped is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Environment not found")
 
-    db_variable = session.exec(select(Variable).where(Variable.name == var_name, Variable.environment_id == environment.id)).first()
+    # Solo se actualizan los campos proporcionados
+    patch_data = variable_patch.model_dump(exclude_unset=True)
+    patch_data["updated_at"] = datetime.utcnow()
+    if encryption_enabled() and patch_data.keys() & {"value", "is_sensitive"}:
+        # Sellar depende del valor y de is_sensitive: lo que no trae el parche se toma de la fila
+        if not patch_data.keys() >= {"value", "is_sensitive"}:
+            current = (await session.exec(
+                select(Variable.value, Variable.is_sensitive)
+                .where(Variable.environment_id == bumped[0], Variable.name == var_name)
+            )).first()
+            if current is not None:
+                patch_data.setdefault("value", (await unseal_values(session, [current[0]]))[0])
+                patch_data.setdefault("is_sensitive", current[1])
+        await seal_rows(session, bumped[0], [patch_data])
+    db_variable = await repository.update_variable(session, bumped[0], var_name, patch_data)
     if not db_variable:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Variable not found")
 
-    # Itera sobre los datos proporcionados y actualiza solo si no son None
-    patch_data = variable_patch.model_dump(exclude_unset=True)
-    for key, value in patch_data.items():
-        setattr(db_variable, key, value)
-    
-    db_variable.updated_at = datetime.utcnow()
-
-    session.add(db_variable)
-    session.commit()
-    session.refresh(db_variable)
-
-    return db_variable
+    await record_changes(session, *bumped, [db_variable.model_dump()], changed_by=current_user.username)
+    await refresh_resolved(session, bumped[0], [var_name])
+    response = await read_variable(session, db_variable)
+    await session.commit()
+    return response
 
 @router.delete("/{var_name}", status_code=status.HTTP_204_NO_CONTENT, summary="Delete a Variable")
-def delete_variable(
+async def delete_variable(
     env_name: str = Path(..., description="Name of the environment"),
     var_name: str = Path(..., description="Name of the variable to delete"),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Elimina una variable específica de un entorno.
     """
-    environment = session.exec(select(Environment).where(Environment.name == env_name)).first()
-    if not environment:
+    bumped = await bump_revision(session, env_name)
+    if bumped is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Environment not found")
 
-    variable_to_delete = session.exec(select(Variable).where(Variable.name == var_name, Variable.environment_id == environment.id)).first()
-    if not variable_to_delete:
+    if not await repository.delete_variable(session, bumped[0], var_name):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Variable not found")
 
-    session.delete(variable_to_delete)
-    session.commit()
-    
-    return
\ No newline at end of file
+    await record_changes(session, *bumped, deleted=[var_name], changed_by=current_user.username)
+    await refresh_resolved(session, bumped[0], [var_name])
+    await session.commit()
+
+    return
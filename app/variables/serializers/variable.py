@@ -0,0 +1,30 @@
+from datetime import datetime
+from typing import Optional
+from pydantic import ConfigDict
+from sqlmodel import SQLModel
+
+
+class VariableRead(SQLModel):
+    """Response schema of a variable, read straight from ORM attributes or RETURNING rows."""
+
+    id: int
+    name: str
+    value: str
+    description: Optional[str] = None
+    is_sensitive: bool
+    created_at: datetime
+    updated_at: datetime
+    environment_id: Optional[int] = None
+    model_config = ConfigDict(from_attributes=True)
+
+
+class VariableHistoryRead(SQLModel):
+    """One entry of a variable's history: its state after the given environment revision."""
+
+    revision: int
+    value: Optional[str] = None
+    description: Optional[str] = None
+    is_sensitive: bool
+    deleted: bool
+    changed_at: datetime
+    changed_by: Optional[str] = None
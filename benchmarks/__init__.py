@@ -0,0 +1,16 @@
+import os
+import tempfile
+
+DEFAULT_DATABASE_URL = f"sqlite:///{os.path.join(tempfile.gettempdir(), 'config_service_bench.db')}"
+
+
+def configure(database_url: str):
+    """Point the app settings at the benchmark database; call before importing `app`."""
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("JWT_SECRET", "benchmark-secret")
+    os.environ.setdefault("ENV", "benchmark")
+    os.environ.setdefault("DEBUG", "False")
+    # Se mide capacidad, no la politica de limites: se activan exportando estas variables
+    os.environ.setdefault("RATE_LIMIT_READ_RATE", "0")
+    os.environ.setdefault("RATE_LIMIT_WRITE_RATE", "0")
+    os.environ.setdefault("ADMISSION_MAX_IN_FLIGHT", "-1")
@@ -0,0 +1,82 @@
+"""Cost of a `.json` fetch when sensitive values are sealed at rest, against the same data in plain text.
+
+One environment with --variables sensitive variables is written through the
+API with encryption off and another one with ENCRYPTION_MASTER_KEY set. Each
+fetch clears the render cache first, so every run reads and renders the
+variables instead of serving cached bytes:
+
+- plain: values stored in plain text;
+- sealed, warm: the environment's data key is already in the key cache;
+- sealed, cold: the key cache is cleared too, so the fetch also unwraps the key.
+
+    python -m benchmarks.encryption --variables 500 --repeat 50
+"""
+import argparse
+import base64
+import os
+import tempfile
+
+from benchmarks import configure
+from benchmarks.seed import PASSWORD, seed, user_name, variable_name
+from benchmarks.serialization import measure
+
+DEFAULT_DATABASE_URL = f"sqlite:///{os.path.join(tempfile.gettempdir(), 'config_service_encryption_bench.db')}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL,
+                        help="Database to use (its tables are dropped first)")
+    parser.add_argument("--variables", type=int, default=500, help="Sensitive variables in the environment")
+    parser.add_argument("--repeat", type=int, default=50, help="Fetches per case; the best one is reported")
+    args = parser.parse_args(argv)
+    configure(args.database_url)
+    os.environ.setdefault("ENCRYPTION_MASTER_KEY", base64.b64encode(os.urandom(32)).decode())
+
+    from fastapi.testclient import TestClient
+    from app.core.settings import settings
+    from app.environments.revisions import render_cache
+    from app.variables.encryption import data_keys
+    from main import app
+
+    seed(environments=0, variables=0, users=1)
+    master_key = settings.ENCRYPTION_MASTER_KEY
+    with TestClient(app) as client:
+        token = client.post("/users/auth/login", json={"username": user_name(0), "password": PASSWORD}).json()
+        headers = {"Authorization": f"Bearer {token['access_token']}"}
+        for env_name, key in (("plain", ""), ("sealed", master_key)):
+            # La clave maestra solo decide como se guardan las variables de este entorno
+            settings.ENCRYPTION_MASTER_KEY = key
+            client.post("/environments/", json={"name": env_name}, headers=headers).raise_for_status()
+            operations = [
+                {"op": "create", "name": variable_name(i), "value": os.urandom(24).hex(), "is_sensitive": True}
+                for i in range(args.variables)
+            ]
+            for start in range(0, len(operations), settings.BATCH_MAX_OPERATIONS):
+                client.post(f"/environments/{env_name}/variables/batch", headers=headers, json={
+                    "operations": operations[start:start + settings.BATCH_MAX_OPERATIONS],
+                }).raise_for_status()
+        settings.ENCRYPTION_MASTER_KEY = master_key
+
+        def fetch(env_name: str, cold: bool):
+            def run():
+                render_cache.clear()
+                if cold:
+                    data_keys.clear()
+                response = client.get(f"/environments/{env_name}/.json", headers=headers)
+                response.raise_for_status()
+                assert len(response.json()) == args.variables
+            return run
+
+        plain = measure(fetch("plain", cold=False), args.repeat)
+        for label, env_name, cold in (("plain", "plain", False), ("sealed, warm", "sealed", False),
+                                      ("sealed, cold", "sealed", True)):
+            misses = data_keys.misses
+            seconds = measure(fetch(env_name, cold), args.repeat)
+            unwraps = (data_keys.misses - misses) / (args.repeat + 1)
+            print(f"{label:<14} {seconds * 1e3:8.2f} ms/fetch   {seconds / args.variables * 1e6:6.2f} us/variable"
+                  f"   x{seconds / plain:.2f}   {unwraps:.0f} key unwraps/fetch")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Synthetic dataset for the benchmarks: N environments x M variables x U users.
+
+    python -m benchmarks.seed --environments 200 --variables 100 --users 1000
+"""
+import argparse
+import random
+import time
+from datetime import datetime
+
+from benchmarks import DEFAULT_DATABASE_URL, configure
+
+PASSWORD = "benchmark"
+
+
+def environment_name(index: int) -> str:
+    return f"bench-env-{index:05d}"
+
+def variable_name(index: int) -> str:
+    return f"BENCH_VAR_{index:05d}"
+
+def user_name(index: int) -> str:
+    return f"bench-user-{index:05d}"
+
+
+def seed(environments: int, variables: int, users: int, seed: int = 0, chunk_size: int = 5000) -> dict:
+    """Recreate the schema and bulk insert the dataset through the app models."""
+    from sqlalchemy import insert, select
+    from sqlmodel import Session, SQLModel
+    from app.core.settings import engine, init_db
+    from app.environments.models.environment import Environment
+    from app.users.models.user import User
+    from app.users.routers.views import get_password_hash
+    from app.variables.models.variable import Variable
+
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+    now = datetime.utcnow()
+
+    def chunks(rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    with Session(engine) as session:
+        password_hash = get_password_hash(PASSWORD)
+        for batch in chunks({
+            "username": user_name(i), "password_hash": password_hash, "is_admin": i == 0,
+            "created_at": now, "updated_at": now,
+        } for i in range(users)):
+            session.execute(insert(User), batch)
+
+        for batch in chunks({
+            "name": environment_name(i), "description": f"Synthetic environment {i}", "revision": 0,
+            "created_at": now, "updated_at": now,
+        } for i in range(environments)):
+            session.execute(insert(Environment), batch)
+        environment_ids = session.execute(select(Environment.id).order_by(Environment.id)).scalars().all()
+
+        for batch in chunks({
+            "environment_id": environment_id,
+            "name": variable_name(i),
+            "value": "".join(rng.choices("abcdefghijklmnopqrstuvwxyz0123456789", k=rng.randint(8, 64))),
+            "description": None if i % 3 else f"Synthetic variable {i}",
+            "is_sensitive": i % 10 == 0,
+            "created_at": now, "updated_at": now,
+        } for environment_id in environment_ids for i in range(variables)):
+            session.execute(insert(Variable), batch)
+        session.commit()
+    # Vistas resueltas e instantaneas, como al arrancar sobre una BD existente
+    init_db()
+
+    return {
+        "environments": environments,
+        "variables": environments * variables,
+        "users": users,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL,
+                        help="Database to seed (its tables are dropped first)")
+    parser.add_argument("--environments", type=int, default=50)
+    parser.add_argument("--variables", type=int, default=100, help="Variables per environment")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the generated values")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    configure(args.database_url)
+    print(seed(args.environments, args.variables, args.users, args.seed))
+
+
+if __name__ == "__main__":
+    main()
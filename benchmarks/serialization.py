@@ -0,0 +1,113 @@
+"""Per-item cost of building the list responses, before and after the fast serialization path.
+
+Each case fetches the same page from an in-memory SQLite database and turns it
+into response bytes the way the endpoint does:
+
+- before: ORM objects through FastAPI's `serialize_response` with the table
+  class as response model, rendered by the stdlib JSONResponse;
+- after: plain column rows rendered by orjson, which is what
+  `list_variables_for_environment` and `list_environments` do now.
+
+    python -m benchmarks.serialization --items 1000 --repeat 20
+"""
+import argparse
+import asyncio
+import time
+from typing import List, Optional
+
+from benchmarks import configure
+from benchmarks.seed import seed
+
+
+def build_cases(items: int) -> dict:
+    from fastapi.responses import JSONResponse, ORJSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_model_field
+    from sqlmodel import Session, SQLModel, select
+    from app.core.pagination import schema_columns
+    from app.core.settings import engine
+    from app.environments.models.environment import Environment
+    from app.environments.serializers.environment import EnvironmentRead
+    from app.variables.models.variable import Variable
+    from app.variables.routers.views import VARIABLE_FIELDS, encode_row
+
+    # Un entorno con `items` variables y `items` entornos en total
+    seed(environments=items, variables=0, users=1)
+    seed_variables = [{"environment_id": 1, "name": f"VAR_{i}", "value": "x" * 32, "is_sensitive": i % 10 == 0}
+                      for i in range(items)]
+    with Session(engine) as session:
+        for values in seed_variables:
+            session.add(Variable(**values))
+        session.commit()
+
+    # Esquema paginado de antes: resultados validados contra la clase de tabla
+    class PaginatedTableResponse(SQLModel):
+        count: Optional[int]
+        next: Optional[str]
+        previous: Optional[str]
+        results: List[Environment]
+
+    loop = asyncio.new_event_loop()
+    variables_field = create_model_field("Response", List[Variable], mode="serialization")
+    environments_field = create_model_field("Response", PaginatedTableResponse, mode="serialization")
+    variable_columns = [getattr(Variable, field) for field in VARIABLE_FIELDS]
+    environment_columns = schema_columns(Environment, EnvironmentRead)
+
+    def variables_before():
+        with Session(engine) as session:
+            rows = session.exec(select(Variable).where(Variable.environment_id == 1).order_by(Variable.id)).all()
+            content = loop.run_until_complete(serialize_response(field=variables_field, response_content=rows))
+        return JSONResponse(content).body
+
+    def variables_after():
+        with Session(engine) as session:
+            result = session.execute(
+                select(*variable_columns).where(Variable.environment_id == 1).order_by(Variable.id)
+            )
+            return b"[" + b",".join(encode_row(row) for row in result.mappings()) + b"]"
+
+    def environments_before():
+        with Session(engine) as session:
+            rows = session.exec(select(Environment).order_by(Environment.id).limit(items)).all()
+            page = {"count": items, "next": None, "previous": None, "results": rows}
+            content = loop.run_until_complete(serialize_response(field=environments_field, response_content=page))
+        return JSONResponse(content).body
+
+    def environments_after():
+        with Session(engine) as session:
+            rows = session.execute(select(*environment_columns).order_by(Environment.id).limit(items)).all()
+            return ORJSONResponse({
+                "count": items, "next": None, "previous": None, "results": [row._asdict() for row in rows],
+            }).body
+
+    return {
+        "list_variables_for_environment": {"before": variables_before, "after": variables_after},
+        "list_environments": {"before": environments_before, "after": environments_after},
+    }
+
+
+def measure(run, repeat: int) -> float:
+    run()
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=1000, help="Items per response")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per case; the best one is reported")
+    args = parser.parse_args(argv)
+    configure("sqlite://")
+
+    for endpoint, cases in build_cases(args.items).items():
+        before = measure(cases["before"], args.repeat) / args.items * 1e6
+        after = measure(cases["after"], args.repeat) / args.items * 1e6
+        print(f"{endpoint:<32} before {before:8.2f} us/item   after {after:8.2f} us/item   x{before / after:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+"""Python client for the config service; standard library only."""
+from config_client.client import ConfigClient, ConfigError
+from config_client.snapshots import SnapshotStore, write_atomic
+from config_client.transport import Response, Transport, UrllibTransport
+
+__all__ = [
+    "ConfigClient", "ConfigError", "Response", "SnapshotStore", "Transport", "UrllibTransport", "write_atomic",
+]
@@ -0,0 +1,216 @@
+"""Keep environments materialized as files for processes that only read files.
+
+    python -m config_client.agent --url http://config:8000 --username svc --password secret \\
+        --target prod:dotenv:/run/config/app.env --target shared:json:/run/config/shared.json \\
+        --pid-file /run/app.pid --signal HUP
+
+Replaces the `curl` of `.json` in container entrypoints: `--once` waits for the
+service with backoff, writes every target and exits, so the entrypoint can run
+it before `exec`. Without `--once` it keeps the files current with one polling
+loop for all the targets; a file is only rewritten (write plus rename) when its
+content changes, and then the application process can be signalled.
+"""
+import argparse
+import logging
+import os
+import random
+import signal
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional
+from urllib.parse import quote
+
+from config_client.client import ConfigClient, ConfigError
+from config_client.snapshots import write_atomic
+
+logger = logging.getLogger("config_client.agent")
+
+# Valores de ?format= que entiende /environments/{name}/.json
+FORMATS = ("json", "dotenv", "yaml", "properties", "shell")
+
+
+@dataclass
+class Target:
+    """One environment rendered in one format into one file."""
+
+    environment: str
+    format: str
+    path: str
+    etag: Optional[str] = None
+
+    @classmethod
+    def parse(cls, value: str) -> "Target":
+        """`ENVIRONMENT:FORMAT:PATH`; the path may contain colons."""
+        parts = value.split(":", 2)
+        if len(parts) != 3 or not all(parts):
+            raise ValueError(f"Expected ENVIRONMENT:FORMAT:PATH, got '{value}'")
+        environment, output_format, path = parts
+        if output_format not in FORMATS:
+            raise ValueError(f"Unknown format '{output_format}', expected one of: {', '.join(FORMATS)}")
+        return cls(environment, output_format, path)
+
+
+def read_file(path: str) -> Optional[bytes]:
+    try:
+        with open(path, "rb") as source:
+            return source.read()
+    except OSError:
+        return None
+
+
+class Agent:
+    """Polls every target with If-None-Match from a single loop.
+
+    Failures back off for all the targets at once: when the service is down or
+    answers 429 / 503 the whole round waits, doubling up to `max_backoff`, or
+    what Retry-After asks for.
+    """
+
+    def __init__(
+        self,
+        client: ConfigClient,
+        targets: Iterable[Target],
+        interval: float = 10.0,
+        max_backoff: float = 300.0,
+        mode: int = 0o600,
+        on_change: Optional[Callable[[list[Target]], None]] = None,
+    ):
+        self.client = client
+        self.targets = list(targets)
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.mode = mode
+        self.on_change = on_change
+        self.failures = 0
+        self.stop = threading.Event()
+
+    def sync(self, target: Target) -> bool:
+        """Fetch one target; True when its file was rewritten."""
+        # Si alguien borro el fichero se vuelve a pedir entero
+        headers = {"If-None-Match": target.etag} if target.etag and os.path.exists(target.path) else {}
+        response = self.client.request(
+            "GET", f"/environments/{quote(target.environment, safe='')}/.json?format={target.format}", headers,
+        )
+        if response.status == 304:
+            return False
+        if response.status != 200:
+            raise ConfigError.from_response(response)
+        target.etag = response.header("etag")
+        if read_file(target.path) == response.body:
+            return False
+        write_atomic(target.path, response.body, self.mode)
+        logger.info("Wrote %s (%s) to %s", target.environment, target.format, target.path)
+        return True
+
+    def sync_all(self) -> list[Target]:
+        """One round over every target; raises on the first failure so the round backs off."""
+        changed = []
+        try:
+            for target in self.targets:
+                if self.sync(target):
+                    changed.append(target)
+        finally:
+            # Lo ya escrito antes del fallo tambien se notifica
+            if changed and self.on_change:
+                self.on_change(changed)
+        return changed
+
+    def backoff(self, error: Exception) -> float:
+        self.failures += 1
+        delay = min(self.max_backoff, self.interval * 2 ** (self.failures - 1))
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after:
+            delay = max(delay, retry_after)
+        return delay
+
+    def run(self, once: bool = False, timeout: Optional[float] = None) -> bool:
+        """Sync until stopped; with `once`, until every target has been written.
+
+        Returns False when `timeout` runs out or the agent is stopped first.
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        while not self.stop.is_set():
+            try:
+                self.sync_all()
+                self.failures = 0
+                if once:
+                    return True
+                delay = self.interval
+            except (ConfigError, OSError) as e:
+                delay = self.backoff(e)
+                logger.warning("Sync failed (%s), retrying in %.1fs", e, delay)
+            # Reparto aleatorio: los agentes de muchos hosts no sondean todos a la vez
+            delay *= random.uniform(0.9, 1.1)
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                delay = min(delay, remaining)
+            self.stop.wait(delay)
+        return not once
+
+
+def signal_process(pid_file: Optional[str], pid: Optional[int], signum: int):
+    """Signal the application, reading the pid file each time since the process may have restarted."""
+    if pid_file:
+        try:
+            with open(pid_file) as source:
+                pid = int(source.read().strip())
+        except (OSError, ValueError) as e:
+            logger.warning("Cannot read pid file %s: %s", pid_file, e)
+            return
+    try:
+        os.kill(pid, signum)
+    except OSError as e:
+        logger.warning("Cannot signal process %s: %s", pid, e)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write environments to files and keep them current.")
+    parser.add_argument("--url", default=os.environ.get("CONFIG_SERVICE_URL", "http://localhost:8000"))
+    parser.add_argument("--token", default=os.environ.get("CONFIG_SERVICE_TOKEN"),
+                        help="Bearer token; otherwise --username / --password are used to log in")
+    parser.add_argument("--username", default=os.environ.get("CONFIG_SERVICE_USERNAME"))
+    parser.add_argument("--password", default=os.environ.get("CONFIG_SERVICE_PASSWORD"))
+    parser.add_argument("-t", "--target", action="append", default=[], required=True,
+                        help=f"ENVIRONMENT:FORMAT:PATH (repeatable); FORMAT is one of {', '.join(FORMATS)}")
+    parser.add_argument("--interval", type=float, default=10.0, help="Seconds between polls (default: 10)")
+    parser.add_argument("--max-backoff", type=float, default=300.0,
+                        help="Longest wait between attempts while the service fails (default: 300)")
+    parser.add_argument("--mode", type=lambda value: int(value, 8), default=0o600,
+                        help="Permissions of the written files, in octal (default: 600)")
+    parser.add_argument("--once", action="store_true", help="Write every target once and exit")
+    parser.add_argument("--timeout", type=float, help="With --once, give up after this many seconds")
+    parser.add_argument("--signal", default="HUP", help="Signal sent on changes (default: HUP)")
+    process = parser.add_mutually_exclusive_group()
+    process.add_argument("--pid", type=int, help="Process to signal when a file changes")
+    process.add_argument("--pid-file", help="File holding the pid of the process to signal")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if not args.token and not (args.username and args.password):
+        parser.error("either --token or --username and --password are required")
+    try:
+        targets = [Target.parse(value) for value in args.target]
+        signum = signal.Signals["SIG" + args.signal.upper().removeprefix("SIG")]
+    except (ValueError, KeyError) as e:
+        parser.error(str(e))
+
+    # Sin hilo de refresco propio: el bucle del agente es el unico que consulta el servicio
+    client = ConfigClient(args.url, args.username, args.password, args.token, refresh_interval=None)
+    on_change = None
+    if args.pid or args.pid_file:
+        on_change = lambda changed: signal_process(args.pid_file, args.pid, signum)
+    agent = Agent(client, targets, args.interval, args.max_backoff, args.mode, on_change)
+    for stop_signal in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(stop_signal, lambda *_: agent.stop.set())
+
+    if not agent.run(once=args.once, timeout=args.timeout):
+        print("Error: not every target could be written", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+import base64
+import json
+import logging
+import threading
+import time
+from typing import Callable, Iterable, Optional
+from urllib.parse import quote, urlencode
+
+from config_client.snapshots import SnapshotStore
+from config_client.transport import Response, Transport, UrllibTransport
+
+logger = logging.getLogger("config_client")
+
+# Vida de los tokens de /users/auth/login (ACCESS_TOKEN_EXPIRE_MINUTES); solo si el token no trae `exp`
+TOKEN_LIFETIME = 30 * 60
+
+
+class ConfigError(Exception):
+    """The service answered with an error status."""
+
+    def __init__(self, status: int, detail, retry_after: Optional[float] = None):
+        super().__init__(f"{status}: {detail}")
+        self.status = status
+        self.detail = detail
+        # Segundos de Retry-After en los 429 / 503
+        self.retry_after = retry_after
+
+    @classmethod
+    def from_response(cls, response: Response) -> "ConfigError":
+        try:
+            detail = json.loads(response.body)["detail"]
+        except (ValueError, KeyError, TypeError):
+            detail = response.body.decode(errors="replace")
+        try:
+            retry_after = float(response.header("retry-after"))
+        except (TypeError, ValueError):
+            retry_after = None
+        return cls(response.status, detail, retry_after)
+
+
+def token_expiry(token: str) -> float:
+    """`exp` of a JWT, read without verifying it: only used to refresh before it runs out."""
+    try:
+        payload = token.split(".")[1]
+        return float(json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))["exp"])
+    except (IndexError, ValueError, KeyError, TypeError):
+        return time.time() + TOKEN_LIFETIME
+
+
+class ConfigClient:
+    """Reads environments from the config service and keeps them fresh.
+
+    - Logs in once and reuses the token until `token_leeway` seconds before it expires.
+    - Keeps every environment read in memory and revalidates it every
+      `refresh_interval` seconds from a background thread, with If-None-Match.
+    - With `cache_dir`, persists the last known good variables of each environment;
+      `get` answers from them at once when the service is slow or down, and the
+      background thread catches up.
+
+        client = ConfigClient("http://config:8000", username="svc", password="...", cache_dir="/var/cache/config")
+        database_url = client.get("prod")["DATABASE_URL"]
+    """
+
+    def __init__(
+        self,
+        url: str,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        token: Optional[str] = None,
+        transport: Optional[Transport] = None,
+        cache_dir: Optional[str] = None,
+        refresh_interval: Optional[float] = 30.0,
+        timeout: float = 10.0,
+        token_leeway: float = 60.0,
+    ):
+        self.url = url.rstrip("/")
+        self.username = username
+        self.password = password
+        self.transport = transport or UrllibTransport()
+        self.snapshots = SnapshotStore(cache_dir) if cache_dir else None
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+        self.token_leeway = token_leeway
+        self._token = token
+        self._token_expires = token_expiry(token) if token else 0.0
+        self._cache: dict[str, dict] = {}
+        self._listeners: list[Callable[[str, dict], None]] = []
+        self._lock = threading.RLock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Autenticacion
+
+    def token(self) -> str:
+        with self._lock:
+            if self._token and time.time() < self._token_expires - self.token_leeway:
+                return self._token
+            if not (self.username and self.password):
+                if self._token:
+                    # Token dado por el usuario: no hay con que renovarlo
+                    return self._token
+                raise ConfigError(401, "Neither a token nor credentials to log in")
+            response = self.transport(
+                "POST", f"{self.url}/users/auth/login", {"Content-Type": "application/json"},
+                json.dumps({"username": self.username, "password": self.password}).encode(), self.timeout,
+            )
+            if response.status != 200:
+                raise ConfigError.from_response(response)
+            self._token = json.loads(response.body)["access_token"]
+            self._token_expires = token_expiry(self._token)
+            return self._token
+
+    def request(self, method: str, path: str, headers: Optional[dict] = None, body: Optional[bytes] = None) -> Response:
+        """Authenticated request; on 401 logs in again and retries once."""
+        response = None
+        for attempt in range(2):
+            response = self.transport(
+                method, self.url + path, {"Authorization": f"Bearer {self.token()}", **(headers or {})}, body, self.timeout,
+            )
+            if response.status != 401 or attempt or not (self.username and self.password):
+                break
+            with self._lock:
+                self._token = None
+        return response
+
+    # Entornos
+
+    def on_change(self, callback: Callable[[str, dict], None]):
+        """Call `callback(env_name, variables)` whenever a refresh brings different variables."""
+        self._listeners.append(callback)
+
+    def get(self, env_name: str) -> dict:
+        """Variables of an environment: from memory, else the on-disk snapshot, else the service."""
+        with self._lock:
+            entry = self._cache.get(env_name)
+        if entry is None and self.snapshots:
+            entry = self.snapshots.load(env_name)
+            if entry is not None:
+                with self._lock:
+                    entry = self._cache.setdefault(env_name, entry)
+                # La copia en disco puede ser vieja: se revalida ya, sin bloquear al llamante
+                self.start()
+                self._wake.set()
+        if entry is None:
+            entry = self.refresh(env_name)
+            self.start()
+        return dict(entry["variables"])
+
+    def preload(self, env_names: Iterable[str]):
+        """Fetch every environment not yet at hand with a single request to /environments/resolve."""
+        with self._lock:
+            missing = [name for name in dict.fromkeys(env_names) if name not in self._cache]
+        if self.snapshots:
+            missing = [name for name in missing if self.snapshots.load(name) is None]
+        if not missing:
+            return
+        response = self.request("GET", "/environments/resolve?" + urlencode([("name", name) for name in missing]))
+        if response.status != 200:
+            raise ConfigError.from_response(response)
+        for env_name, environment in json.loads(response.body)["environments"].items():
+            # Sin ETag: la primera revalidacion trae la representacion completa
+            self._store(env_name, {"variables": environment["variables"], "etag": None, "fetched_at": time.time()})
+        self.start()
+
+    def refresh(self, env_name: str) -> dict:
+        """Revalidate one environment with If-None-Match; returns its cache entry."""
+        with self._lock:
+            current = self._cache.get(env_name)
+        headers = {"Accept": "application/json"}
+        if current and current.get("etag"):
+            headers["If-None-Match"] = current["etag"]
+        response = self.request("GET", f"/environments/{quote(env_name, safe='')}/.json", headers)
+        if response.status == 304 and current is not None:
+            return current
+        if response.status != 200:
+            raise ConfigError.from_response(response)
+        entry = {"variables": json.loads(response.body), "etag": response.header("etag"), "fetched_at": time.time()}
+        self._store(env_name, entry, current)
+        return entry
+
+    def _store(self, env_name: str, entry: dict, current: Optional[dict] = None):
+        with self._lock:
+            self._cache[env_name] = entry
+        if self.snapshots:
+            try:
+                self.snapshots.save(env_name, entry)
+            except OSError as e:
+                logger.warning("Cannot persist the snapshot of %s: %s", env_name, e)
+        if current is None or current["variables"] != entry["variables"]:
+            for callback in self._listeners:
+                try:
+                    callback(env_name, dict(entry["variables"]))
+                except Exception:
+                    logger.exception("on_change callback failed for %s", env_name)
+
+    # Refresco en segundo plano
+
+    def start(self):
+        if not self.refresh_interval or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="config-client-refresh", daemon=True)
+                self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(self.timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.refresh_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            with self._lock:
+                env_names = list(self._cache)
+            for env_name in env_names:
+                try:
+                    self.refresh(env_name)
+                except ConfigError as e:
+                    logger.warning("Refreshing %s failed: %s", env_name, e)
+                    if e.status in (429, 503):
+                        # El servicio pide bajar el ritmo: el resto espera a la proxima vuelta
+                        break
+                except Exception as e:
+                    logger.warning("Refreshing %s failed: %s", env_name, e)
@@ -0,0 +1,43 @@
+import json
+import os
+import tempfile
+from typing import Optional
+from urllib.parse import quote
+
+
+def write_atomic(path: str, data: bytes, mode: int = 0o600):
+    """Replace `path` with `data` so readers see either the old or the new file, never a partial one."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(descriptor, "wb") as output:
+            output.write(data)
+            output.flush()
+            os.fsync(output.fileno())
+        os.chmod(temporary, mode)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+class SnapshotStore:
+    """Last known good variables of each environment, one JSON file per environment."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def path(self, env_name: str) -> str:
+        return os.path.join(self.directory, quote(env_name, safe="") + ".json")
+
+    def load(self, env_name: str) -> Optional[dict]:
+        try:
+            with open(self.path(env_name), "rb") as source:
+                return json.load(source)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, env_name: str, entry: dict):
+        # Contiene valores sensibles: solo legible por el usuario del proceso
+        write_atomic(self.path(env_name), json.dumps(entry, ensure_ascii=False).encode())
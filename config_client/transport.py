@@ -0,0 +1,39 @@
+import gzip
+from dataclasses import dataclass, field
+from typing import Optional, Protocol
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+
+@dataclass
+class Response:
+    status: int
+    headers: dict = field(default_factory=dict)
+    body: bytes = b""
+
+    def header(self, name: str) -> Optional[str]:
+        return self.headers.get(name.lower())
+
+
+class Transport(Protocol):
+    """Anything that performs one HTTP request: urllib by default, an in-process app in tests."""
+
+    def __call__(self, method: str, url: str, headers: dict, body: Optional[bytes], timeout: float) -> Response:
+        ...
+
+
+class UrllibTransport:
+    """Standard library transport; asks for gzip and decodes it."""
+
+    def __call__(self, method: str, url: str, headers: dict, body: Optional[bytes], timeout: float) -> Response:
+        request = Request(url, data=body, method=method, headers={"Accept-Encoding": "gzip", **headers})
+        try:
+            with urlopen(request, timeout=timeout) as response:
+                status, raw_headers, content = response.status, response.headers, response.read()
+        except HTTPError as e:
+            # 304, 4xx y 5xx llegan como excepcion en urllib
+            status, raw_headers, content = e.code, e.headers, e.read()
+        headers = {name.lower(): value for name, value in raw_headers.items()}
+        if headers.get("content-encoding") == "gzip":
+            content = gzip.decompress(content)
+        return Response(status, headers, content)
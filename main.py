@@ -1,38 +1,51 @@
-from contextlib import asynccontextmanager
-from fastapi import FastAPI
-from fastapi.security import OAuth2PasswordBearer
-from app.environments.routes.views import router as environments_router
-from app.users.routers.views import router as users_router
-from app.core.settings import init_db
-from app.variables.routers.views import router as variables_router
+import os
+from app.core.settings import init_db, settings
+
+
+def worker_count() -> int:
+    if settings.WEB_WORKERS > 0:
+        return settings.WEB_WORKERS
+    # Respeta el limite de CPUs del contenedor / afinidad del proceso
+    if hasattr(os, "process_cpu_count"):
+        return os.process_cpu_count() or 1
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+def server_options() -> dict:
+    """uvicorn options: a single reloading process in development, N workers otherwise."""
+    options = {
+        "host": settings.SERVER_HOST,
+        "port": settings.SERVER_PORT,
+        # uvloop / httptools si estan instalados, asyncio / h11 si no
+        "loop": "auto",
+        "http": "auto",
+        "timeout_keep_alive": settings.KEEP_ALIVE_TIMEOUT,
+        "limit_concurrency": settings.LIMIT_CONCURRENCY,
+        "limit_max_requests": settings.LIMIT_MAX_REQUESTS,
+        "backlog": settings.BACKLOG,
+        # Con SIGTERM deja de aceptar conexiones y espera a las que estan en curso
+        "timeout_graceful_shutdown": settings.GRACEFUL_SHUTDOWN_TIMEOUT,
+        "proxy_headers": True,
+    }
+    if settings.ENV == "development" or settings.DEBUG:
+        options["reload"] = True
+    else:
+        options["workers"] = worker_count()
+    return options
+
+
+def __getattr__(name: str):
+    # La app y sus routers solo se importan en los procesos que atienden peticiones;
+    # `main:app` sigue valiendo para uvicorn y los benchmarks
+    if name == "app":
+        from app.asgi import app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    init_db()
-    yield
-    print("App shutting down...")
-
-app = FastAPI(
-    title="Config Service API",
-    description="A configuration management service API for managing environments and variables",
-    version="1.0.0",
-    swagger_ui_parameters={"syntaxHighlight": False},
-    lifespan=lifespan,
-)
-
-security = OAuth2PasswordBearer(tokenUrl="users/auth/login")
-
-@app.get("/status/", tags=["Health"], summary="Health Check",
-         description="Simple health check endpoint that responds with 'pong'")
-def status():
-    return {"message": "pong"}
-
-
-app.include_router(environments_router, prefix="/environments", tags=["Environments"])
-app.include_router(variables_router, prefix="/environments/{env_name}/variables", tags=["Variables"])
-app.include_router(users_router, prefix="/users", tags=["Users"])
-
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    # Migra una vez antes de lanzar los workers; cada worker solo comprueba la version del esquema
+    init_db()
+    uvicorn.run("app.asgi:app", **server_options())
@@ -0,0 +1,75 @@
+import os
+import tempfile
+from itertools import count
+from urllib.parse import urlsplit
+
+import pytest
+
+from config_client import Response
+
+# La app lee la configuracion al importarse: SQLite temporal y sin rate limit
+_DATA_DIR = tempfile.mkdtemp(prefix="config_service_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DATA_DIR, 'tests.db')}"
+os.environ.setdefault("JWT_SECRET", "tests")
+os.environ["RATE_LIMIT_READ_RATE"] = "0"
+os.environ["RATE_LIMIT_WRITE_RATE"] = "0"
+os.environ["ENCRYPTION_MASTER_KEY"] = ""
+
+USERNAME = "client-tests"
+PASSWORD = "client-tests-password"
+
+
+@pytest.fixture(scope="session")
+def service():
+    from fastapi.testclient import TestClient
+    from main import app
+
+    with TestClient(app) as client:
+        client.post("/users/", json={"username": USERNAME, "password_hash": PASSWORD, "is_admin": True})
+        yield client
+
+
+@pytest.fixture(scope="session")
+def admin_headers(service):
+    response = service.post("/users/auth/login", json={"username": USERNAME, "password": PASSWORD})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+_names = count()
+
+@pytest.fixture
+def new_environment(service, admin_headers):
+    """Returns a function that creates an environment with a unique name and returns the name."""
+    def create(prefix: str = "env", **fields) -> str:
+        name = f"{prefix}-{next(_names)}"
+        service.post("/environments/", json={"name": name, **fields}, headers=admin_headers).raise_for_status()
+        return name
+    return create
+
+
+class AppTransport:
+    """Transport that sends the client's requests to the app in-process through TestClient."""
+
+    def __init__(self, service):
+        self.service = service
+        self.requests = []
+        self.down = False
+
+    def __call__(self, method, url, headers, body, timeout):
+        path = urlsplit(url).path
+        if self.down:
+            self.requests.append((method, path, None))
+            raise OSError("Connection refused")
+        response = self.service.request(method, url, headers=headers, content=body)
+        self.requests.append((method, path, response.status_code))
+        return Response(response.status_code, {name.lower(): value for name, value in response.headers.items()},
+                        response.content)
+
+    def logins(self) -> int:
+        return sum(1 for method, path, _ in self.requests if path == "/users/auth/login")
+
+
+@pytest.fixture
+def transport(service):
+    return AppTransport(service)
@@ -0,0 +1,45 @@
+import pytest
+
+from config_client import ConfigClient, ConfigError
+from config_client.agent import Agent, Target
+from tests.conftest import PASSWORD, USERNAME
+
+
+def make_agent(transport, targets, **kwargs) -> Agent:
+    client = ConfigClient("http://testserver", username=USERNAME, password=PASSWORD, transport=transport,
+                          refresh_interval=None)
+    return Agent(client, targets, interval=0.01, **kwargs)
+
+def test_targets_are_written_once_and_revalidated(service, admin_headers, new_environment, transport, tmp_path):
+    name = new_environment("agent")
+    service.post(f"/environments/{name}/variables/", json={"name": "A", "value": "1"}, headers=admin_headers)
+    dotenv = Target(name, "dotenv", str(tmp_path / "app.env"))
+    json_file = Target(name, "json", str(tmp_path / "app.json"))
+    changes = []
+    agent = make_agent(transport, [dotenv, json_file], on_change=changes.append)
+
+    assert agent.run(once=True, timeout=5)
+    assert (tmp_path / "app.env").read_text() == "A=1\n"
+    assert (tmp_path / "app.json").read_text() == '{"A":"1"}'
+    assert (tmp_path / "app.env").stat().st_mode & 0o777 == 0o600
+    assert changes == [[dotenv, json_file]]
+
+    assert agent.sync_all() == []
+    assert [status for _, _, status in transport.requests[-2:]] == [304, 304]
+
+    service.put(f"/environments/{name}/variables/A", json={"value": "2"}, headers=admin_headers)
+    assert agent.sync_all() == [dotenv, json_file]
+    assert (tmp_path / "app.env").read_text() == "A=2\n"
+
+def test_missing_environment_fails_the_round(transport, tmp_path):
+    agent = make_agent(transport, [Target("agent-missing", "json", str(tmp_path / "missing.json"))])
+    with pytest.raises(ConfigError):
+        agent.sync_all()
+    assert not agent.run(once=True, timeout=0.2)
+    assert not (tmp_path / "missing.json").exists()
+
+def test_target_parsing():
+    assert Target.parse("prod:dotenv:/run/config/a:b.env") == Target("prod", "dotenv", "/run/config/a:b.env")
+    for value in ("prod:dotenv", "prod:xml:/tmp/a", "::/tmp/a"):
+        with pytest.raises(ValueError):
+            Target.parse(value)
@@ -0,0 +1,29 @@
+import argparse
+
+import pytest
+
+from benchmarks.load import compare, parse_mix, percentile, summarize
+
+
+def test_percentile_is_nearest_rank():
+    values = [float(value) for value in range(1, 101)]
+    assert percentile(values, 0.50) == 50.0
+    assert percentile(values, 0.95) == 95.0
+    assert percentile(values, 0.99) == 99.0
+    assert percentile([], 0.5) == 0.0
+
+def test_summary_and_regressions_against_a_baseline():
+    report = summarize({"GET /a": [0.001, 0.002, 0.004], "GET /b": [0.010]}, {"GET /a": 1, "GET /b": 0}, 2.0)
+    assert report["requests"] == 4
+    assert report["errors"] == 1
+    assert report["rps"] == 2.0
+    assert report["endpoints"]["GET /a"]["p50_ms"] == 2.0
+
+    baseline = {"rps": 2.0, "endpoints": {"GET /a": {"p95_ms": 4.0}, "GET /b": {"p95_ms": 5.0}}}
+    assert compare(report, baseline, max_regression=0.1) == ["GET /b: p95 5.0ms -> 10.0ms"]
+    assert compare(report, report, max_regression=0.1) == []
+
+def test_mix_accepts_known_scenarios_only():
+    assert parse_mix("login=2,environment_json") == {"login": 2.0, "environment_json": 1.0}
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_mix("unknown=1")
@@ -0,0 +1,100 @@
+import queue
+import time
+from itertools import count
+
+import pytest
+
+from config_client import ConfigClient, ConfigError
+from tests.conftest import PASSWORD, USERNAME
+
+URL = "http://testserver"
+_environments = count()
+
+
+@pytest.fixture
+def environment(service, admin_headers):
+    """A new environment with one variable; returns a function that sets variables in it."""
+    name = f"client-{next(_environments)}"
+    service.post("/environments/", json={"name": name}, headers=admin_headers).raise_for_status()
+
+    def set_variable(variable: str, value: str):
+        response = service.put(f"/environments/{name}/variables/{variable}",
+                               json={"value": value, "is_sensitive": False}, headers=admin_headers)
+        if response.status_code == 404:
+            response = service.post(f"/environments/{name}/variables/",
+                                    json={"name": variable, "value": value}, headers=admin_headers)
+        response.raise_for_status()
+
+    set_variable("DATABASE_URL", "postgres://db/app")
+    set_variable.name = name
+    return set_variable
+
+def make_client(transport, **kwargs) -> ConfigClient:
+    kwargs.setdefault("refresh_interval", None)
+    return ConfigClient(URL, username=USERNAME, password=PASSWORD, transport=transport, **kwargs)
+
+
+def test_token_is_reused_across_requests(transport, environment):
+    with make_client(transport) as client:
+        assert client.get(environment.name) == {"DATABASE_URL": "postgres://db/app"}
+        client.refresh(environment.name)
+        client.refresh(environment.name)
+    assert transport.logins() == 1
+
+def test_token_is_renewed_before_it_expires(transport, environment):
+    with make_client(transport, token_leeway=60) as client:
+        client.get(environment.name)
+        first = client.token()
+        # A 30 s del `exp`, dentro del margen: la siguiente peticion vuelve a entrar
+        client._token_expires = time.time() + 30
+        time.sleep(1)
+        client.refresh(environment.name)
+        assert transport.logins() == 2
+        assert client.token() != first
+
+def test_unchanged_environment_is_revalidated_with_304(transport, environment):
+    with make_client(transport) as client:
+        client.get(environment.name)
+        entry = client.refresh(environment.name)
+        assert transport.requests[-1] == ("GET", f"/environments/{environment.name}/.json", 304)
+        assert entry["variables"] == {"DATABASE_URL": "postgres://db/app"}
+
+        environment("DATABASE_URL", "postgres://db/other")
+        assert client.refresh(environment.name)["variables"] == {"DATABASE_URL": "postgres://db/other"}
+        assert transport.requests[-1][2] == 200
+
+def test_background_refresh_notifies_changes(transport, environment):
+    changes = queue.Queue()
+    with make_client(transport, refresh_interval=0.05) as client:
+        client.get(environment.name)
+        client.on_change(lambda env_name, variables: changes.put((env_name, variables)))
+        environment("DATABASE_URL", "postgres://db/new")
+        env_name, variables = changes.get(timeout=5)
+        assert env_name == environment.name
+        assert variables == {"DATABASE_URL": "postgres://db/new"}
+        assert client.get(environment.name) == variables
+
+def test_snapshot_is_used_while_the_service_is_down(transport, environment, tmp_path):
+    with make_client(transport, cache_dir=str(tmp_path)) as client:
+        client.get(environment.name)
+
+    transport.down = True
+    with make_client(transport, cache_dir=str(tmp_path), refresh_interval=0.05) as client:
+        assert client.get(environment.name) == {"DATABASE_URL": "postgres://db/app"}
+        with pytest.raises(OSError):
+            client.refresh(environment.name)
+
+def test_unknown_environment_raises(transport):
+    with make_client(transport) as client, pytest.raises(ConfigError) as error:
+        client.get("client-missing")
+    assert error.value.status == 404
+
+def test_rejected_token_logs_in_again_and_retries(transport, environment):
+    with make_client(transport, token="not-a-jwt") as client:
+        assert client.get(environment.name) == {"DATABASE_URL": "postgres://db/app"}
+    statuses = [(path, status) for _, path, status in transport.requests]
+    assert statuses == [
+        (f"/environments/{environment.name}/.json", 401),
+        ("/users/auth/login", 200),
+        (f"/environments/{environment.name}/.json", 200),
+    ]
@@ -0,0 +1,40 @@
+from app.core.settings import settings
+
+
+def delta(service, admin_headers, name: str, since: int) -> dict:
+    response = service.get(f"/environments/{name}/.json", params={"since": since}, headers=admin_headers)
+    assert response.status_code == 200
+    return response.json()
+
+def test_delta_returns_changes_and_tombstones_since_a_revision(service, admin_headers, new_environment):
+    name = new_environment("delta")
+    url = f"/environments/{name}/variables/"
+    service.post(url, json={"name": "A", "value": "1"}, headers=admin_headers)
+    service.post(url, json={"name": "B", "value": "1"}, headers=admin_headers)
+    service.put(url + "A", json={"value": "2"}, headers=admin_headers)
+    service.delete(url + "B", headers=admin_headers)
+
+    assert delta(service, admin_headers, name, 2) == {
+        "revision": 4, "since": 2, "full": False, "variables": {"A": "2"}, "deleted": ["B"],
+    }
+    assert delta(service, admin_headers, name, 4) == {
+        "revision": 4, "since": 4, "full": False, "variables": {}, "deleted": [],
+    }
+
+def test_delta_falls_back_to_everything(service, admin_headers, new_environment, monkeypatch):
+    name = new_environment("delta")
+    url = f"/environments/{name}/variables/"
+    for index in range(3):
+        service.post(url, json={"name": f"V{index}", "value": "1"}, headers=admin_headers)
+
+    full = {"revision": 3, "full": True, "variables": {"V0": "1", "V1": "1", "V2": "1"}, "deleted": []}
+    # Una revision futura (p. ej. de un entorno recreado) no puede ser un delta
+    assert delta(service, admin_headers, name, 9) == {**full, "since": 9}
+    monkeypatch.setattr(settings, "DELTA_MAX_REVISIONS", 1)
+    assert delta(service, admin_headers, name, 1) == {**full, "since": 1}
+    assert delta(service, admin_headers, name, 2)["full"] is False
+
+def test_delta_is_json_only(service, admin_headers, new_environment):
+    name = new_environment("delta")
+    response = service.get(f"/environments/{name}/.json", params={"since": 0, "format": "yaml"}, headers=admin_headers)
+    assert response.status_code == 400
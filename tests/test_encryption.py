@@ -0,0 +1,57 @@
+import base64
+import os
+
+import pytest
+from sqlmodel import Session, select
+
+from app.core.settings import engine, settings
+from app.variables.encryption import EncryptionError, SEALED_PREFIX, data_keys, unwrap_key, wrap_key
+from app.variables.models.variable import Variable
+
+
+@pytest.fixture
+def master_key(monkeypatch):
+    key = base64.b64encode(os.urandom(32)).decode()
+    monkeypatch.setattr(settings, "ENCRYPTION_MASTER_KEY", key)
+    yield key
+    data_keys.clear()
+
+def stored(name: str, variable: str) -> str:
+    from app.environments.models.environment import Environment
+    with Session(engine) as session:
+        return session.exec(
+            select(Variable.value).join(Environment, Environment.id == Variable.environment_id)
+            .where(Environment.name == name, Variable.name == variable)
+        ).one()
+
+def test_sensitive_values_are_sealed_at_rest(service, admin_headers, new_environment, master_key):
+    name = new_environment("sealed")
+    url = f"/environments/{name}/variables/"
+    response = service.post(url, json={"name": "TOKEN", "value": "s3cret", "is_sensitive": True}, headers=admin_headers)
+    assert response.json()["value"] == "s3cret"
+    service.post(url, json={"name": "HOST", "value": "db"}, headers=admin_headers)
+
+    assert stored(name, "TOKEN").startswith(SEALED_PREFIX)
+    assert "s3cret" not in stored(name, "TOKEN")
+    assert stored(name, "HOST") == "db"
+    assert service.get(url + "TOKEN", headers=admin_headers).json()["value"] == "s3cret"
+    assert service.get(f"/environments/{name}/.json", headers=admin_headers).json() == {"HOST": "db", "TOKEN": "s3cret"}
+
+    # Un PUT sin is_sensitive conserva el flag y vuelve a sellar
+    response = service.put(url + "TOKEN", json={"value": "rotated"}, headers=admin_headers)
+    assert response.json()["value"] == "rotated"
+    assert stored(name, "TOKEN").startswith(SEALED_PREFIX)
+    response = service.patch(url + "TOKEN", json={"is_sensitive": False}, headers=admin_headers)
+    assert response.json()["value"] == "rotated"
+    assert stored(name, "TOKEN") == "rotated"
+    assert [entry["value"] for entry in service.get(url + "TOKEN/history", headers=admin_headers).json()] \
+        == ["rotated", "rotated", "s3cret"]
+
+def test_data_keys_only_open_with_their_master_key_and_environment(master_key, monkeypatch):
+    wrapped = wrap_key(1, os.urandom(32))
+    unwrap_key(1, wrapped)
+    with pytest.raises(EncryptionError):
+        unwrap_key(2, wrapped)
+    monkeypatch.setattr(settings, "ENCRYPTION_MASTER_KEY", base64.b64encode(os.urandom(32)).decode())
+    with pytest.raises(EncryptionError):
+        unwrap_key(1, wrapped)
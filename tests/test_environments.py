@@ -0,0 +1,118 @@
+from app.core.settings import settings
+from app.environments.revisions import render_cache
+from app.environments.serializers.environment import EnvironmentRead
+
+
+def test_environment_crud(service, admin_headers, new_environment):
+    name = new_environment("crud", description="first")
+    response = service.get(f"/environments/{name}/", headers=admin_headers)
+    assert response.status_code == 200
+    assert response.json()["description"] == "first"
+
+    response = service.put(f"/environments/{name}/", json={"description": "second"}, headers=admin_headers)
+    assert response.json()["description"] == "second"
+    response = service.patch(f"/environments/{name}/", json={}, headers=admin_headers)
+    assert response.json()["description"] == "second"
+
+    response = service.post("/environments/", json={"name": name}, headers=admin_headers)
+    assert response.status_code == 400
+
+    assert service.delete(f"/environments/{name}/", headers=admin_headers).status_code == 204
+    assert service.get(f"/environments/{name}/", headers=admin_headers).status_code == 404
+    assert service.delete(f"/environments/{name}/", headers=admin_headers).status_code == 404
+
+def test_routes_require_a_token(service):
+    assert service.get("/environments/").status_code == 401
+    assert service.get("/environments/any/variables/").status_code == 401
+
+def test_json_etag_follows_the_revision(service, admin_headers, new_environment):
+    name = new_environment("etag")
+    service.post(f"/environments/{name}/variables/", json={"name": "A", "value": "1"}, headers=admin_headers)
+    first = service.get(f"/environments/{name}/.json", headers=admin_headers)
+    assert first.json() == {"A": "1"}
+    etag = first.headers["etag"]
+
+    hits = render_cache.hits
+    again = service.get(f"/environments/{name}/.json", headers=admin_headers)
+    assert again.headers["etag"] == etag
+    assert render_cache.hits == hits + 1
+    for if_none_match in (etag, f'"other", {etag}', "*"):
+        response = service.get(f"/environments/{name}/.json", headers={"If-None-Match": if_none_match, **admin_headers})
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+
+    service.put(f"/environments/{name}/variables/A", json={"value": "2"}, headers=admin_headers)
+    response = service.get(f"/environments/{name}/.json", headers={"If-None-Match": etag, **admin_headers})
+    assert response.status_code == 200
+    assert response.json() == {"A": "2"}
+    assert response.headers["etag"] != etag
+
+def walk(service, admin_headers, url: str, key: str) -> list:
+    pages = []
+    while url:
+        page = service.get(url, headers=admin_headers).json()
+        pages.append(page)
+        url = page[key]
+    return pages
+
+def test_keyset_pagination_walks_every_environment_both_ways(service, admin_headers, new_environment):
+    for _ in range(5):
+        new_environment("page")
+    total = service.get("/environments/", params={"count": "exact"}, headers=admin_headers).json()["count"]
+
+    pages = walk(service, admin_headers, "/environments/?page_size=2", "next")
+    ids = [environment["id"] for page in pages for environment in page["results"]]
+    assert len(ids) == total
+    assert ids == sorted(set(ids))
+    assert pages[0]["previous"] is None
+
+    backwards = walk(service, admin_headers, pages[-1]["previous"], "previous")
+    assert [environment["id"] for page in reversed(backwards) for environment in page["results"]] \
+        == ids[:-len(pages[-1]["results"])]
+
+def test_count_modes_and_numbered_pages(service, admin_headers, new_environment):
+    new_environment("page")
+    new_environment("page")
+    exact = service.get("/environments/", headers=admin_headers).json()["count"]
+    # Sin estadisticas del planificador (SQLite) estimate cuenta
+    assert service.get("/environments/", params={"count": "estimate"}, headers=admin_headers).json()["count"] == exact
+    assert service.get("/environments/", params={"count": "none"}, headers=admin_headers).json()["count"] is None
+
+    second = service.get("/environments/", params={"page": 2, "page_size": 1}, headers=admin_headers).json()
+    assert second["previous"] == "/environments/?page=1&page_size=1"
+    assert len(second["results"]) == 1
+    assert service.get("/environments/", params={"cursor": "not-a-cursor"}, headers=admin_headers).status_code == 400
+
+def test_list_rows_match_the_read_schema(service, admin_headers, new_environment):
+    name = new_environment("schema")
+    response = service.get("/environments/", params={"page_size": 1, "count": "none"}, headers=admin_headers)
+    assert response.headers["content-type"] == "application/json"
+    pages = walk(service, admin_headers, "/environments/?page_size=100&count=none", "next")
+    row = next(row for page in pages for row in page["results"] if row["name"] == name)
+    assert set(row) == set(EnvironmentRead.model_fields)
+    assert EnvironmentRead.model_validate(row).name == name
+    assert row == service.get(f"/environments/{name}/", headers=admin_headers).json()
+
+def test_resolve_returns_several_environments_in_the_requested_order(service, admin_headers, new_environment,
+                                                                   monkeypatch):
+    shared = new_environment("resolve")
+    service_env = new_environment("resolve", parent=shared)
+    empty = new_environment("resolve")
+    service.post(f"/environments/{shared}/variables/", json={"name": "A", "value": "1"}, headers=admin_headers)
+    service.post(f"/environments/{service_env}/variables/", json={"name": "B", "value": "2"}, headers=admin_headers)
+
+    response = service.get("/environments/resolve", params=[("name", service_env), ("name", empty), ("name", shared),
+                                                             ("name", service_env)], headers=admin_headers)
+    assert response.status_code == 200
+    environments = response.json()["environments"]
+    assert list(environments) == [service_env, empty, shared]
+    assert environments[service_env] == {"revision": 2, "variables": {"A": "1", "B": "2"}}
+    assert environments[empty] == {"revision": 0, "variables": {}}
+
+    response = service.get("/environments/resolve", params=[("name", shared), ("name", "resolve-missing")],
+                           headers=admin_headers)
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Environments not found: resolve-missing"
+    monkeypatch.setattr(settings, "RESOLVE_MAX_ENVIRONMENTS", 1)
+    response = service.get("/environments/resolve", params=[("name", shared), ("name", empty)], headers=admin_headers)
+    assert response.status_code == 400
@@ -0,0 +1,63 @@
+from app.environments.serializers.formats import render_dotenv
+
+
+def test_dotenv_quotes_values_so_loaders_do_not_interpolate_them():
+    rendered = render_dotenv([
+        ("PLAIN", "postgres://db:5432/app"),
+        ("DOLLAR", "pa$$word ${HOME}"),
+        ("QUOTE_AND_DOLLAR", "it's $HOME"),
+        ("MULTILINE", 'a "b"\n$c'),
+    ])
+    assert rendered.splitlines() == [
+        "PLAIN=postgres://db:5432/app",
+        "DOLLAR='pa$$word ${HOME}'",
+        'QUOTE_AND_DOLLAR="it\'s \\$HOME"',
+        'MULTILINE="a \\"b\\"\\n\\$c"',
+    ]
+
+def test_environment_rendered_in_every_format(service, admin_headers, new_environment):
+    name = new_environment("formats")
+    service.post(f"/environments/{name}/variables/", json={"name": "GREETING", "value": "hello world"},
+                 headers=admin_headers).raise_for_status()
+
+    expected = {
+        "env": "GREETING='hello world'\n",
+        "yaml": '"GREETING": "hello world"\n',
+        "properties": "GREETING=hello world\n",
+        "sh": "export GREETING='hello world'\n",
+    }
+    for extension, body in expected.items():
+        response = service.get(f"/environments/{name}/.{extension}", headers=admin_headers)
+        assert response.status_code == 200
+        assert response.text == body
+    response = service.get(f"/environments/{name}/.json", params={"format": "dotenv"}, headers=admin_headers)
+    assert response.text == expected["env"]
+    response = service.get(f"/environments/{name}/.json", headers={"Accept": "text/x-dotenv", **admin_headers})
+    assert response.text == expected["env"]
+    response = service.get(f"/environments/{name}/.json", headers={"Accept": "image/png", **admin_headers})
+    assert response.status_code == 406
+
+def test_etag_revalidation_and_compression(service, admin_headers, new_environment):
+    name = new_environment("formats")
+    service.post(f"/environments/{name}/variables/", json={"name": "SMALL", "value": "1"},
+                 headers=admin_headers).raise_for_status()
+
+    small = service.get(f"/environments/{name}/.json", headers={"Accept-Encoding": "gzip", **admin_headers})
+    assert "content-encoding" not in small.headers
+    plain = service.get(f"/environments/{name}/.json", headers={"Accept-Encoding": "identity", **admin_headers})
+    assert small.headers["etag"] == plain.headers["etag"]
+    response = service.get(f"/environments/{name}/.json",
+                           headers={"If-None-Match": small.headers["etag"], **admin_headers})
+    assert response.status_code == 304
+
+    service.post(f"/environments/{name}/variables/", json={"name": "LARGE", "value": "x" * 2000},
+                 headers=admin_headers).raise_for_status()
+    response = service.get(f"/environments/{name}/.json", headers={"If-None-Match": small.headers["etag"],
+                                                                    "Accept-Encoding": "gzip", **admin_headers})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] != small.headers["etag"]
+    assert response.json() == {"LARGE": "x" * 2000, "SMALL": "1"}
+    response = service.get(f"/environments/{name}/.json", headers={"If-None-Match": response.headers["etag"],
+                                                                    "Accept-Encoding": "gzip", **admin_headers})
+    assert response.status_code == 304
@@ -0,0 +1,34 @@
+import sqlite3
+
+from sqlalchemy.pool import QueuePool
+
+from app.asgi import pool_saturation
+from app.core.settings import TimedQueuePool, build_async_engine_args, pool_args, settings, sync_connect_args
+
+
+def test_liveness_and_readiness(service):
+    assert service.get("/health/live").json() == {"status": "alive"}
+    response = service.get("/health/ready")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ready", "database": "ok", "pool_saturation": 0.0}
+
+def test_pool_saturation_counts_the_overflow_in_the_capacity():
+    pool = QueuePool(lambda: sqlite3.connect(":memory:"), pool_size=2, max_overflow=2)
+    connections = [pool.connect() for _ in range(3)]
+    assert pool_saturation(pool, 2) == 0.75
+    for connection in connections:
+        connection.close()
+    assert pool_saturation(pool, 2) == 0.0
+
+def test_pool_settings_only_apply_to_postgresql(monkeypatch):
+    monkeypatch.setattr(settings, "DB_POOL_SIZE", 7)
+    monkeypatch.setattr(settings, "DB_STATEMENT_TIMEOUT_MS", 1500)
+    postgres = "postgresql://app@db/config?options=-csearch_path%3Dconfig"
+    assert pool_args(postgres, TimedQueuePool)["pool_size"] == 7
+    assert "pool_size" not in pool_args("sqlite:///config.db", TimedQueuePool)
+
+    assert sync_connect_args(postgres) == {"options": "-csearch_path=config -c statement_timeout=1500"}
+    assert sync_connect_args("sqlite:///config.db") == {}
+    url, connect_args = build_async_engine_args(postgres)
+    assert url == "postgresql+asyncpg://app@db/config"
+    assert connect_args == {"server_settings": {"search_path": "config"}}
@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import pytest
+
+from app.core.settings import settings
+from tests.conftest import USERNAME
+
+
+@pytest.mark.parametrize("snapshot_interval", [100, 2])
+def test_point_in_time_reads(service, admin_headers, new_environment, monkeypatch, snapshot_interval):
+    monkeypatch.setattr(settings, "HISTORY_SNAPSHOT_INTERVAL", snapshot_interval)
+    name = new_environment("history")
+    url = f"/environments/{name}/variables/"
+    service.post(url, json={"name": "A", "value": "1"}, headers=admin_headers)
+    service.post(url, json={"name": "B", "value": "1"}, headers=admin_headers)
+    service.put(url + "A", json={"value": "2"}, headers=admin_headers)
+    service.delete(url + "B", headers=admin_headers)
+    service.put(url + "A", json={"value": "3"}, headers=admin_headers)
+
+    states = {
+        0: {}, 1: {"A": "1"}, 2: {"A": "1", "B": "1"}, 3: {"A": "2", "B": "1"}, 4: {"A": "2"}, 5: {"A": "3"},
+    }
+    for revision, variables in states.items():
+        response = service.get(f"/environments/{name}/history/.json", params={"revision": revision},
+                               headers=admin_headers)
+        assert response.json() == variables
+    response = service.get(f"/environments/{name}/history/.json", params={"at": datetime.utcnow().isoformat()},
+                           headers=admin_headers)
+    assert response.json() == states[5]
+    assert service.get(f"/environments/{name}/history/.json", params={"revision": 6},
+                       headers=admin_headers).status_code == 404
+    assert service.get(f"/environments/{name}/history/.json", headers=admin_headers).status_code == 400
+
+def test_variable_history_lists_changes_newest_first(service, admin_headers, new_environment):
+    name = new_environment("history")
+    url = f"/environments/{name}/variables/"
+    service.post(url, json={"name": "A", "value": "1"}, headers=admin_headers)
+    service.put(url + "A", json={"value": "2"}, headers=admin_headers)
+    service.delete(url + "A", headers=admin_headers)
+
+    response = service.get(url + "A/history", headers=admin_headers)
+    entries = [(entry["revision"], entry["value"], entry["deleted"]) for entry in response.json()]
+    assert entries == [(3, None, True), (2, "2", False), (1, "1", False)]
+    assert {entry["changed_by"] for entry in response.json()} == {USERNAME}
+
+    first = service.get(url + "A/history", params={"limit": 2}, headers=admin_headers)
+    next_url = first.headers["link"][1:first.headers["link"].index(">")]
+    assert [entry["revision"] for entry in service.get(next_url, headers=admin_headers).json()] == [1]
+
+def test_history_etag_revalidates(service, admin_headers, new_environment):
+    name = new_environment("history")
+    service.post(f"/environments/{name}/variables/", json={"name": "A", "value": "1"}, headers=admin_headers)
+    url = f"/environments/{name}/history/.json"
+    etag = service.get(url, params={"revision": 1}, headers=admin_headers).headers["etag"]
+    response = service.get(url, params={"revision": 1}, headers={"If-None-Match": etag, **admin_headers})
+    assert response.status_code == 304
@@ -0,0 +1,49 @@
+from app.core.settings import settings
+
+
+def set_variable(service, admin_headers, name: str, variable: str, value: str):
+    service.post(f"/environments/{name}/variables/", json={"name": variable, "value": value},
+                 headers=admin_headers).raise_for_status()
+
+def resolved(service, admin_headers, name: str) -> dict:
+    return service.get(f"/environments/{name}/.json", headers=admin_headers).json()
+
+def test_child_inherits_and_overrides_its_parent(service, admin_headers, new_environment):
+    base = new_environment("base")
+    child = new_environment("child", parent=base)
+    set_variable(service, admin_headers, base, "HOST", "base.example")
+    set_variable(service, admin_headers, base, "PORT", "5432")
+    set_variable(service, admin_headers, child, "HOST", "child.example")
+    assert resolved(service, admin_headers, child) == {"HOST": "child.example", "PORT": "5432"}
+
+    # Un cambio en el padre llega a la vista resuelta del hijo
+    service.put(f"/environments/{base}/variables/PORT", json={"value": "6432"}, headers=admin_headers)
+    service.delete(f"/environments/{child}/variables/HOST", headers=admin_headers)
+    assert resolved(service, admin_headers, child) == {"HOST": "base.example", "PORT": "6432"}
+
+    service.patch(f"/environments/{child}/", json={"parent": None}, headers=admin_headers)
+    assert resolved(service, admin_headers, child) == {}
+
+def test_parent_changes_are_validated(service, admin_headers, new_environment):
+    base = new_environment("base")
+    child = new_environment("child", parent=base)
+    response = service.patch(f"/environments/{base}/", json={"parent": child}, headers=admin_headers)
+    assert response.status_code == 400
+    assert "cycle" in response.json()["detail"]
+    response = service.patch(f"/environments/{base}/", json={"parent": base}, headers=admin_headers)
+    assert response.status_code == 400
+    response = service.patch(f"/environments/{child}/", json={"parent": "base-missing"}, headers=admin_headers)
+    assert response.status_code == 400
+
+    # Un padre con hijos no se puede borrar
+    assert service.delete(f"/environments/{base}/", headers=admin_headers).status_code == 409
+
+def test_inheritance_depth_is_limited(service, admin_headers, new_environment, monkeypatch):
+    monkeypatch.setattr(settings, "INHERITANCE_MAX_DEPTH", 3)
+    chain = [new_environment("depth")]
+    for _ in range(2):
+        chain.append(new_environment("depth", parent=chain[-1]))
+    response = service.post("/environments/", json={"name": f"{chain[-1]}-deeper", "parent": chain[-1]},
+                            headers=admin_headers)
+    assert response.status_code == 400
+    assert "limited to 3" in response.json()["detail"]
@@ -0,0 +1,49 @@
+import logging
+import sys
+
+from app.core import instrumentation
+from app.core.settings import settings
+
+
+def test_responses_report_their_queries(service, admin_headers, new_environment):
+    name = new_environment("timed")
+    response = service.get(f"/environments/{name}/variables/", headers=admin_headers)
+    assert response.status_code == 200
+    assert int(response.headers["x-db-queries"]) > 0
+    db, app = response.headers["server-timing"].split(", ")
+    assert db.startswith("db;dur=") and f'desc="{response.headers["x-db-queries"]} queries"' in db
+    assert app.startswith("app;dur=")
+
+def test_slow_queries_are_logged_without_parameters(service, admin_headers, new_environment, monkeypatch, caplog):
+    name = new_environment("slow")
+    monkeypatch.setattr(settings, "SLOW_QUERY_THRESHOLD_MS", 1e-9)
+    with caplog.at_level(logging.WARNING, logger=instrumentation.__name__):
+        service.post(f"/environments/{name}/variables/", json={"name": "TOKEN", "value": "hidden-value"},
+                     headers=admin_headers)
+    messages = [record.getMessage() for record in caplog.records if record.name == instrumentation.__name__]
+    assert any(f"in POST /environments/{{env_name}}/variables/" in message for message in messages)
+    assert not any("hidden-value" in message for message in messages)
+
+def test_admins_get_the_profile_instead_of_the_response(service, admin_headers, new_environment, monkeypatch):
+    name = new_environment("profiled")
+    monkeypatch.setattr(settings, "PROFILE_SAMPLE_RATE", 1.0)
+    response = service.get(f"/environments/{name}/variables/?profile=1", headers=admin_headers)
+    assert response.status_code == 200
+    assert response.headers["x-profiled-status"] == "200"
+    assert response.headers["content-type"].startswith("text/plain")
+    assert response.text.startswith("GET /environments/{env_name}/variables/ -> 200\n")
+    assert sys.getswitchinterval() == instrumentation.SWITCH_INTERVAL
+
+    # Sin token de admin la peticion sigue su curso normal
+    response = service.get(f"/environments/{name}/variables/?profile=1")
+    assert "x-profiled-status" not in response.headers
+    assert response.status_code == 401
+
+def test_requests_left_out_of_the_sample_are_marked(service, admin_headers, new_environment, monkeypatch):
+    name = new_environment("sampled")
+    monkeypatch.setattr(settings, "PROFILE_SAMPLE_RATE", 0.5)
+    monkeypatch.setattr(instrumentation.random, "random", lambda: 0.9)
+    response = service.get(f"/environments/{name}/variables/?profile=1", headers=admin_headers)
+    assert response.status_code == 200
+    assert response.headers["x-profile"] == "skipped"
+    assert isinstance(response.json(), list)
@@ -0,0 +1,62 @@
+import asyncio
+
+from app.core import limits
+from app.core.limits import AdmissionMiddleware, RateLimiter, rate_limiter
+
+
+def test_token_bucket_allows_a_burst_then_refills(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(limits.time, "monotonic", lambda: now[0])
+    limiter = RateLimiter({"read": (2.0, 3), "write": (0.0, 1)}, maxsize=10)
+
+    assert [limiter.acquire("ana", "read") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.acquire("ana", "read") == 0.5
+    # Cada usuario tiene su propio cubo, y rate 0 lo desactiva
+    assert limiter.acquire("bob", "read") == 0.0
+    assert all(limiter.acquire("ana", "write") == 0.0 for _ in range(10))
+
+    now[0] += 0.5
+    assert limiter.acquire("ana", "read") == 0.0
+
+def test_rate_limited_requests_get_429_with_retry_after(service, admin_headers, new_environment, monkeypatch):
+    name = new_environment("limits")
+    # El limitador de la app se creo desactivado (conftest): sin TTL no guardaria los cubos
+    monkeypatch.setitem(rate_limiter.limits, "write", (0.01, 1))
+    monkeypatch.setattr(rate_limiter.buckets, "ttl", 100.0)
+    url = f"/environments/{name}/variables/"
+    assert service.post(url, json={"name": "A", "value": "1"}, headers=admin_headers).status_code == 201
+    response = service.post(url, json={"name": "B", "value": "1"}, headers=admin_headers)
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "100"
+    # Las lecturas van por otro cubo
+    assert service.get(url, headers=admin_headers).status_code == 200
+
+def test_admission_sheds_requests_over_the_limit():
+    release = asyncio.Event()
+
+    async def app(scope, receive, send):
+        await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def call(middleware, path):
+        statuses = []
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                statuses.append(message["status"])
+
+        await middleware({"type": "http", "method": "GET", "path": path, "headers": []}, None, send)
+        return statuses[0]
+
+    async def scenario():
+        middleware = AdmissionMiddleware(app, limit=1)
+        first = asyncio.create_task(call(middleware, "/environments/"))
+        await asyncio.sleep(0)
+        rejected = await call(middleware, "/environments/")
+        probe = asyncio.create_task(call(middleware, "/health/live"))
+        await asyncio.sleep(0)
+        release.set()
+        return await first, rejected, await probe, middleware.in_flight
+
+    assert asyncio.run(scenario()) == (200, 429, 200, 0)
@@ -0,0 +1,33 @@
+from app.core.metrics import Histogram
+
+
+def sample(body: str, prefix: str) -> float:
+    return next(float(line.rsplit(" ", 1)[1]) for line in body.splitlines() if line.startswith(prefix))
+
+def test_metrics_count_requests_by_route_template(service, admin_headers, new_environment):
+    name = new_environment("metrics")
+    labels = 'method="GET",route="/environments/{env_name}/",status="200"'
+    before = service.get("/metrics").text
+    before_count = sample(before, f"http_requests_total{{{labels}}}") if labels in before else 0.0
+
+    service.get(f"/environments/{name}/", headers=admin_headers)
+    service.get(f"/environments/{name}/", headers=admin_headers)
+    response = service.get("/metrics")
+    assert response.status_code == 200
+    assert sample(response.text, f"http_requests_total{{{labels}}}") == before_count + 2
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/environments/{env_name}/",le="+Inf"}' \
+        in response.text
+    assert 'cache_hits_total{cache="principals"}' in response.text
+    assert 'db_pool_checkedout{engine="async"}' in response.text
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency_seconds", "Test latency.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe("/a", value=value)
+    assert histogram.render()[2:] == [
+        'latency_seconds_bucket{route="/a",le="0.1"} 1',
+        'latency_seconds_bucket{route="/a",le="1.0"} 3',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+        'latency_seconds_sum{route="/a"} 6.05',
+        'latency_seconds_count{route="/a"} 4',
+    ]
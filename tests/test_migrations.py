@@ -0,0 +1,53 @@
+import pytest
+from sqlalchemy import func, insert, select
+from sqlmodel import SQLModel, create_engine
+
+from app.core import migrations
+from app.core.migrations import current_version, migrate
+from app.environments.models.environment import Environment
+from app.environments.models.snapshot import EnvironmentSnapshot
+from app.variables.models.resolved_variable import ResolvedVariable
+from app.variables.models.variable import Variable
+
+
+@pytest.fixture
+def legacy_engine(tmp_path):
+    """A database created by `create_all` before versioning, with data but no derived rows."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as connection:
+        environment_id = connection.execute(
+            insert(Environment).values(name="legacy", revision=3).returning(Environment.id)
+        ).scalar()
+        connection.execute(insert(Variable).values(environment_id=environment_id, name="A", value="1"))
+    yield engine
+    engine.dispose()
+
+def count(engine, model) -> int:
+    with engine.connect() as connection:
+        return connection.execute(select(func.count()).select_from(model)).scalar()
+
+def test_migrate_backfills_once_and_records_the_version(legacy_engine):
+    migrate(legacy_engine)
+    with legacy_engine.connect() as connection:
+        assert current_version(connection) == migrations.SCHEMA_VERSION
+        assert connection.execute(select(ResolvedVariable.name, ResolvedVariable.value, ResolvedVariable.revision)).all() \
+            == [("A", "1", 3)]
+    assert count(legacy_engine, EnvironmentSnapshot) == 1
+
+    migrate(legacy_engine)
+    assert count(legacy_engine, ResolvedVariable) == 1
+
+def test_failed_step_rolls_back_every_pending_step(legacy_engine, monkeypatch):
+    def broken(connection):
+        raise RuntimeError("broken step")
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", migrations.MIGRATIONS + [("broken", broken)])
+    monkeypatch.setattr(migrations, "SCHEMA_VERSION", len(migrations.MIGRATIONS))
+    with pytest.raises(RuntimeError):
+        migrate(legacy_engine)
+    with legacy_engine.connect() as connection:
+        assert current_version(connection) == 0
+    # El backfill de un paso anterior se deshace con el resto
+    assert count(legacy_engine, ResolvedVariable) == 0
+    assert count(legacy_engine, EnvironmentSnapshot) == 0
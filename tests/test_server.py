@@ -0,0 +1,23 @@
+import main
+from app.core.settings import settings
+
+
+def test_development_runs_one_reloading_process(monkeypatch):
+    monkeypatch.setattr(settings, "ENV", "development")
+    options = main.server_options()
+    assert options["reload"] is True
+    assert "workers" not in options
+
+def test_production_runs_workers_with_graceful_shutdown(monkeypatch):
+    monkeypatch.setattr(settings, "ENV", "production")
+    monkeypatch.setattr(settings, "DEBUG", False)
+    monkeypatch.setattr(settings, "WEB_WORKERS", 3)
+    options = main.server_options()
+    assert "reload" not in options
+    assert options["workers"] == 3
+    assert options["timeout_graceful_shutdown"] == settings.GRACEFUL_SHUTDOWN_TIMEOUT
+    assert options["backlog"] == settings.BACKLOG
+
+def test_worker_count_defaults_to_the_available_cpus(monkeypatch):
+    monkeypatch.setattr(settings, "WEB_WORKERS", 0)
+    assert main.worker_count() >= 1
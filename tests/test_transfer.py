@@ -0,0 +1,43 @@
+import json
+
+
+def ndjson(records: list) -> bytes:
+    return b"".join(json.dumps(record).encode() + b"\n" for record in records)
+
+def export(service, admin_headers, *names: str) -> list:
+    response = service.get("/environments/export", params=[("name", name) for name in names], headers=admin_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in response.text.splitlines()]
+
+def test_export_then_import_round_trips(service, admin_headers, new_environment):
+    base = new_environment("transfer")
+    child = new_environment("transfer", parent=base)
+    service.post(f"/environments/{base}/variables/", json={"name": "A", "value": "1"}, headers=admin_headers)
+    service.post(f"/environments/{child}/variables/", json={"name": "B", "value": "2", "is_sensitive": True},
+                 headers=admin_headers)
+
+    records = export(service, admin_headers, child, base)
+    assert [(record["type"], record["name"]) for record in records] == [
+        ("environment", base), ("variable", "A"), ("environment", child), ("variable", "B"),
+    ]
+    assert records[2]["parent"] == base
+
+    renamed = {base: f"{base}-copy", child: f"{child}-copy"}
+    for record in records:
+        for key in ("name", "parent") if record["type"] == "environment" else ("environment",):
+            record[key] = renamed.get(record[key], record[key])
+    response = service.post("/environments/import", content=ndjson(records),
+                            headers={"Content-Type": "application/x-ndjson", **admin_headers})
+    assert response.status_code == 200
+    assert response.json() == {"environments": 2, "variables": 2, "chunks": 1}
+    assert service.get(f"/environments/{child}-copy/.json", headers=admin_headers).json() == {"A": "1", "B": "2"}
+
+def test_invalid_line_is_reported_with_what_was_imported(service, admin_headers):
+    body = ndjson([{"type": "environment", "name": "transfer-invalid"}]) + b'{"type": "variable"}\n'
+    response = service.post("/environments/import", content=body, headers=admin_headers)
+    assert response.status_code == 400
+    detail = response.json()["detail"]
+    assert detail["error"].startswith("Line 2: ")
+    assert detail["imported"] == {"environments": 0, "variables": 0, "chunks": 0}
+    assert service.get("/environments/transfer-invalid/", headers=admin_headers).status_code == 404
@@ -0,0 +1,44 @@
+from itertools import count
+
+from app.core.dependencies import principal_cache
+
+_users = count()
+
+
+def create_user(service, is_admin: bool = False) -> tuple[int, str, dict]:
+    username = f"user-{next(_users)}"
+    user = service.post("/users/", json={"username": username, "password_hash": "secret", "is_admin": is_admin}).json()
+    token = service.post("/users/auth/login", json={"username": username, "password": "secret"}).json()["access_token"]
+    return user["id"], username, {"Authorization": f"Bearer {token}"}
+
+def test_authenticated_user_is_cached_and_dropped_when_deleted(service, admin_headers):
+    user_id, username, headers = create_user(service)
+    assert service.get("/environments/", headers=headers).status_code == 200
+    assert principal_cache.get(username) is not None
+
+    assert service.delete(f"/users/{user_id}/", headers=admin_headers).status_code == 204
+    assert principal_cache.get(username) is None
+    assert service.get("/environments/", headers=headers).status_code == 401
+
+def test_renamed_user_token_stops_working(service):
+    user_id, username, headers = create_user(service)
+    assert service.get("/environments/", headers=headers).status_code == 200
+
+    response = service.put(f"/users/{user_id}/", json={"username": f"{username}-renamed", "password_hash": "secret"})
+    assert response.status_code == 200
+    assert service.get("/environments/", headers=headers).status_code == 401
+
+def test_only_admins_delete_users(service, admin_headers):
+    user_id, _, headers = create_user(service)
+    assert service.delete(f"/users/{user_id}/").status_code == 401
+    assert service.delete(f"/users/{user_id}/", headers=headers).status_code == 403
+    assert service.delete(f"/users/{user_id}/", headers=admin_headers).status_code == 204
+    assert service.get(f"/users/{user_id}/").status_code == 404
+
+def test_users_are_paginated_with_cursors(service):
+    create_user(service)
+    first = service.get("/users/", params={"page_size": 1}).json()
+    assert len(first["results"]) == 1
+    second = service.get(first["next"]).json()
+    assert second["results"][0]["id"] > first["results"][0]["id"]
+    assert service.get(second["previous"]).json()["results"] == first["results"]
@@ -0,0 +1,125 @@
+def test_put_without_is_sensitive_keeps_the_stored_flag(service, admin_headers, new_environment):
+    name = new_environment("variables")
+    service.post(f"/environments/{name}/variables/", json={"name": "TOKEN", "value": "a", "is_sensitive": True},
+                 headers=admin_headers).raise_for_status()
+
+    response = service.put(f"/environments/{name}/variables/TOKEN", json={"value": "b"}, headers=admin_headers)
+    assert response.status_code == 200
+    assert response.json()["value"] == "b"
+    assert response.json()["is_sensitive"] is True
+
+    response = service.put(f"/environments/{name}/variables/TOKEN", json={"value": "c", "is_sensitive": False},
+                           headers=admin_headers)
+    assert response.json()["is_sensitive"] is False
+
+def test_put_of_unknown_variable_is_404(service, admin_headers, new_environment):
+    name = new_environment("variables")
+    response = service.put(f"/environments/{name}/variables/MISSING", json={"value": "x"}, headers=admin_headers)
+    assert response.status_code == 404
+
+def test_variable_crud(service, admin_headers, new_environment):
+    name = new_environment("variables")
+    response = service.post(f"/environments/{name}/variables/", json={"name": "A", "value": "1"}, headers=admin_headers)
+    assert response.status_code == 201
+    response = service.post(f"/environments/{name}/variables/", json={"name": "A", "value": "2"}, headers=admin_headers)
+    assert response.status_code == 400
+
+    response = service.patch(f"/environments/{name}/variables/A", json={"description": "first letter"},
+                             headers=admin_headers)
+    assert response.json()["value"] == "1"
+    assert response.json()["description"] == "first letter"
+    response = service.get(f"/environments/{name}/variables/A", headers=admin_headers)
+    assert response.json()["description"] == "first letter"
+
+    assert service.delete(f"/environments/{name}/variables/A", headers=admin_headers).status_code == 204
+    assert service.get(f"/environments/{name}/variables/A", headers=admin_headers).status_code == 404
+    assert service.delete(f"/environments/{name}/variables/A", headers=admin_headers).status_code == 404
+    assert service.get("/environments/variables-missing/variables/A", headers=admin_headers).status_code == 404
+
+def batch(service, admin_headers, name: str, operations: list, **options):
+    return service.post(f"/environments/{name}/variables/batch", json={"operations": operations, **options},
+                        headers=admin_headers)
+
+def test_batch_applies_every_valid_operation_in_one_revision(service, admin_headers, new_environment):
+    name = new_environment("batch")
+    batch(service, admin_headers, name, [
+        {"op": "create", "name": "KEEP", "value": "1", "is_sensitive": True},
+        {"op": "create", "name": "GONE", "value": "1"},
+    ])
+    response = batch(service, admin_headers, name, [
+        {"op": "update", "name": "KEEP", "value": "2"},
+        {"op": "upsert", "name": "NEW", "value": "3"},
+        {"op": "delete", "name": "GONE"},
+        {"op": "update", "name": "MISSING", "value": "4"},
+        {"op": "create", "name": "KEEP", "value": "5"},
+    ])
+    assert response.status_code == 200
+    assert response.json()["revision"] == 2
+    assert [(result["name"], result["status"]) for result in response.json()["results"]] == [
+        ("KEEP", "updated"), ("NEW", "created"), ("GONE", "deleted"), ("MISSING", "error"), ("KEEP", "error"),
+    ]
+    assert service.get(f"/environments/{name}/.json", headers=admin_headers).json() == {"KEEP": "2", "NEW": "3"}
+    # Sin is_sensitive en la operacion se conserva el guardado
+    assert service.get(f"/environments/{name}/variables/KEEP", headers=admin_headers).json()["is_sensitive"] is True
+
+def test_batch_all_or_nothing_writes_nothing_on_error(service, admin_headers, new_environment):
+    name = new_environment("batch")
+    response = batch(service, admin_headers, name, [
+        {"op": "create", "name": "A", "value": "1"},
+        {"op": "delete", "name": "MISSING"},
+    ], all_or_nothing=True)
+    assert response.status_code == 409
+    assert response.json()["detail"] == [
+        {"name": "MISSING", "op": "delete", "status": "error", "detail": "Variable not found"},
+    ]
+    assert service.get(f"/environments/{name}/.json", headers=admin_headers).json() == {}
+    assert batch(service, admin_headers, "batch-missing", []).status_code == 404
+
+def next_link(response):
+    link = response.headers.get("link")
+    return link and link[1:link.index(">")]
+
+def test_listing_is_paginated_through_link_headers(service, admin_headers, new_environment):
+    name = new_environment("list items")
+    batch(service, admin_headers, name, [{"op": "create", "name": f"V{i}", "value": str(i)} for i in range(5)])
+
+    url, names = f"/environments/{name}/variables/?limit=2&fields=name", []
+    while url:
+        response = service.get(url, headers=admin_headers)
+        assert response.status_code == 200
+        names += [row["name"] for row in response.json()]
+        url = next_link(response)
+    assert names == [f"V{i}" for i in range(5)]
+
+def test_listing_filters_and_projects(service, admin_headers, new_environment):
+    name = new_environment("list")
+    batch(service, admin_headers, name, [
+        {"op": "create", "name": "DB_HOST", "value": "db"},
+        {"op": "create", "name": "DBXPASSWORD", "value": "x", "is_sensitive": True},
+        {"op": "create", "name": "API_KEY", "value": "k", "is_sensitive": True},
+    ])
+    url = f"/environments/{name}/variables/"
+
+    # El _ del prefijo es literal, no el comodin de LIKE
+    response = service.get(url, params={"prefix": "DB_", "fields": "name,value"}, headers=admin_headers)
+    assert response.json() == [{"name": "DB_HOST", "value": "db"}]
+    response = service.get(url, params={"is_sensitive": "true", "fields": "name"}, headers=admin_headers)
+    assert response.json() == [{"name": "DBXPASSWORD"}, {"name": "API_KEY"}]
+    assert set(service.get(url, headers=admin_headers).json()[0]) == {
+        "id", "name", "value", "description", "is_sensitive", "created_at", "updated_at", "environment_id",
+    }
+    assert service.get(url, params={"fields": "name,password"}, headers=admin_headers).status_code == 400
+    assert service.get("/environments/list-missing/variables/", headers=admin_headers).status_code == 404
+
+def test_cached_environment_id_follows_a_recreated_environment(service, admin_headers, new_environment):
+    name = new_environment("ids")
+    service.post(f"/environments/{name}/variables/", json={"name": "OLD", "value": "1"}, headers=admin_headers)
+    assert [row["name"] for row in service.get(f"/environments/{name}/variables/", headers=admin_headers).json()] \
+        == ["OLD"]
+
+    service.delete(f"/environments/{name}/", headers=admin_headers)
+    assert service.get(f"/environments/{name}/variables/", headers=admin_headers).status_code == 404
+    service.post("/environments/", json={"name": name}, headers=admin_headers).raise_for_status()
+    service.post(f"/environments/{name}/variables/", json={"name": "NEW", "value": "2"}, headers=admin_headers)
+    assert [row["name"] for row in service.get(f"/environments/{name}/variables/", headers=admin_headers).json()] \
+        == ["NEW"]
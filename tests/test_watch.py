@@ -0,0 +1,63 @@
+import threading
+import time
+
+from app.environments.watch import change_hub
+
+
+def revision_of(service, admin_headers, name: str) -> int:
+    return service.get(f"/environments/{name}/watch", headers=admin_headers).json()["revision"]
+
+def test_watch_times_out_without_changes(service, admin_headers, new_environment):
+    name = new_environment("watch")
+    revision = revision_of(service, admin_headers, name)
+    response = service.get(f"/environments/{name}/watch", params={"since": revision, "timeout": 1}, headers=admin_headers)
+    assert response.status_code == 200
+    assert response.json() == {"environment": name, "revision": revision, "changed": False}
+
+def test_watch_returns_at_once_for_a_stale_revision(service, admin_headers, new_environment):
+    name = new_environment("watch")
+    service.post(f"/environments/{name}/variables/", json={"name": "A", "value": "1"}, headers=admin_headers)
+    response = service.get(f"/environments/{name}/watch", params={"since": 0, "timeout": 30}, headers=admin_headers)
+    assert response.json() == {"environment": name, "revision": 1, "changed": True}
+
+def test_watch_of_unknown_environment_leaves_nothing_registered(service, admin_headers):
+    response = service.get("/environments/watch-missing/watch", params={"since": 0}, headers=admin_headers)
+    assert response.status_code == 404
+    assert "watch-missing" not in change_hub._watchers
+    assert "watch-missing" not in change_hub.latest
+
+def test_recreated_environment_can_be_watched(service, admin_headers, new_environment):
+    name = new_environment("watch")
+    service.post(f"/environments/{name}/variables/", json={"name": "A", "value": "1"}, headers=admin_headers)
+    assert service.delete(f"/environments/{name}/", headers=admin_headers).status_code == 204
+    service.post("/environments/", json={"name": name}, headers=admin_headers).raise_for_status()
+
+    response = service.get(f"/environments/{name}/watch", params={"since": 0, "timeout": 1}, headers=admin_headers)
+    assert response.status_code == 200
+    assert response.json() == {"environment": name, "revision": 0, "changed": False}
+    assert name not in change_hub.latest
+
+def test_stream_of_unknown_environment_is_404(service, admin_headers):
+    response = service.get("/environments/watch-missing/watch/events", headers=admin_headers)
+    assert response.status_code == 404
+    assert "watch-missing" not in change_hub._watchers
+
+def test_stream_sends_revisions_until_the_environment_is_deleted(service, admin_headers, new_environment):
+    name = new_environment("watch")
+
+    def change_then_delete():
+        time.sleep(0.3)
+        service.post(f"/environments/{name}/variables/", json={"name": "A", "value": "1"}, headers=admin_headers)
+        time.sleep(0.3)
+        service.delete(f"/environments/{name}/", headers=admin_headers)
+
+    writer = threading.Thread(target=change_then_delete)
+    writer.start()
+    response = service.get(f"/environments/{name}/watch/events", params={"since": 0}, headers=admin_headers)
+    writer.join()
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text == (
+        f'event: revision\nid: 1\ndata: {{"environment": "{name}", "revision": 1}}\n\n'
+        f'event: deleted\ndata: {{"environment": "{name}"}}\n\n'
+    )
+    assert name not in change_hub._watchers and name not in change_hub.latest